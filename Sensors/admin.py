@@ -1,7 +1,9 @@
 from django.contrib import admin
-from .models import SensorData, Device, User # Import your model
+from .models import SensorData, Device, User, AlertRule, Alert # Import your model
 
 # Register your models here.
 admin.site.register(SensorData)
 admin.site.register(Device)
-admin.site.register(User)
\ No newline at end of file
+admin.site.register(User)
+admin.site.register(AlertRule)
+admin.site.register(Alert)
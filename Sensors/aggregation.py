@@ -0,0 +1,274 @@
+import math
+import struct
+from datetime import datetime, timezone as dt_timezone
+from django.db.models import Func, IntegerField
+
+
+# ===============================
+# Database-side time bucketing
+# ===============================
+
+METRICS = ('temperature', 'humidity', 'pressure')
+
+DEFAULT_BUCKET_MINUTES = 10
+
+
+class EpochBucket(Func):
+    """
+    Floors a datetime column to a bucket of `width` seconds and returns the
+    bucket start as epoch seconds, so the GROUP BY runs in the database.
+    """
+    output_field = IntegerField()
+
+    def __init__(self, expression, width, **extra):
+        super().__init__(expression, width=int(width), **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        # Integer division on integers truncates in SQLite; epochs are positive.
+        return self.as_sql(
+            compiler, connection,
+            template="((CAST(strftime('%%%%s', %(expressions)s) AS INTEGER) / %(width)d) * %(width)d)",
+            **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="(FLOOR(EXTRACT(EPOCH FROM %(expressions)s) / %(width)d) * %(width)d)::bigint",
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="(FLOOR(UNIX_TIMESTAMP(%(expressions)s) / %(width)d) * %(width)d)",
+            **extra_context
+        )
+
+
+def parse_bucket_minutes(value, default=DEFAULT_BUCKET_MINUTES):
+    """
+    Parses the ?bucket= query parameter (bucket width in minutes).
+    Raises ValueError if it is not a positive integer.
+    """
+    if value in (None, ''):
+        return default
+    minutes = int(value)
+    if minutes <= 0:
+        raise ValueError('bucket must be a positive number of minutes')
+    return minutes
+
+
+# Source buckets per requested point when ?points= widens the buckets, so the
+# downsampling still has a shape to preserve.
+DOWNSAMPLE_OVERSAMPLING = 4
+
+
+def display_bucket_minutes(span, points, minimum=DEFAULT_BUCKET_MINUTES):
+    """
+    Bucket width (minutes) for a chart of `points` points over `span` (a
+    timedelta): about DOWNSAMPLE_OVERSAMPLING buckets per point, never below
+    `minimum`. Widths of an hour or a day and more are rounded up to whole
+    hours / days so they are served by the coarser rollups.
+    """
+    minutes = max(minimum, math.ceil(span.total_seconds() / 60 / (points * DOWNSAMPLE_OVERSAMPLING)))
+    for unit in (1440, 60):
+        if minutes >= unit:
+            return math.ceil(minutes / unit) * unit
+    return minutes
+
+
+def format_bucket(epoch):
+    """Formats a bucket start (epoch seconds) the way the chart endpoints key their data."""
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc).strftime('%Y-%m-%d %H:%M')
+
+
+def _number(value):
+    return None if value is None else round(float(value), 2)
+
+
+def series_from_rows(rows, stats=False, metrics=METRICS, value='avg'):
+    """
+    Converts bucket rows for one device into the chart layout:
+    {"temperature": {"2025-03-06 09:30": 24.0, ...}, "humidity": {...}, "pressure": {...}}
+    With stats=True every bucket value is {"avg", "min", "max", "count"} instead of the average.
+    `value` selects the <metric>_<value> row key to report (engine aggregates).
+    Empty buckets added by the engine's gap filling (count 0) are reported as null.
+    """
+    series = {metric: {} for metric in metrics}
+    for row in rows:
+        bucket_key = format_bucket(row['bucket'])
+        for metric in metrics:
+            if row[f'{metric}_{value}'] is None:
+                if not row['count']:
+                    # Gap filled with null by the engine.
+                    series[metric][bucket_key] = None
+                continue
+            if stats:
+                series[metric][bucket_key] = {
+                    'avg': _number(row[f'{metric}_avg']),
+                    'min': _number(row[f'{metric}_min']),
+                    'max': _number(row[f'{metric}_max']),
+                    'count': row['count'],
+                }
+            else:
+                series[metric][bucket_key] = _number(row[f'{metric}_{value}'])
+    return series
+
+
+# ===============================
+# Compact (columnar / binary) layouts
+# ===============================
+
+SERIES_FORMATS = ('columnar', 'binary')
+
+BINARY_MAGIC = b'SNSR'
+BINARY_VERSION = 1
+
+
+def columns_from_rows(rows, stats=False, metrics=METRICS, value='avg'):
+    """
+    Converts bucket rows for one device into parallel arrays sharing one
+    timestamp column (bucket start, epoch seconds):
+    {"timestamps": [...], "temperature": [...], "humidity": [...], "pressure": [...]}
+    With stats=True the <metric>_min, <metric>_max and count columns are added.
+    `value` selects the <metric>_<value> row key to report (engine aggregates).
+    Buckets without a value for a metric hold None.
+    """
+    names = list(metrics)
+    if stats:
+        names += [f'{metric}_{stat}' for metric in metrics for stat in ('min', 'max')] + ['count']
+    columns = {'timestamps': []}
+    columns.update({name: [] for name in names})
+    for row in rows:
+        columns['timestamps'].append(row['bucket'])
+        for metric in metrics:
+            columns[metric].append(_number(row[f'{metric}_{value}']))
+            if stats:
+                columns[f'{metric}_min'].append(_number(row[f'{metric}_min']))
+                columns[f'{metric}_max'].append(_number(row[f'{metric}_max']))
+        if stats:
+            columns['count'].append(row['count'])
+    return columns
+
+
+def pack_columns(series):
+    """
+    Packs {key: columns_from_rows(...)} into a little-endian binary payload:
+
+      magic "SNSR", uint8 version, uint8 column count,
+      per column: uint8 name length + ASCII name,
+      uint32 series count,
+      per series: uint16 key length + UTF-8 key, uint32 point count n,
+                  uint32[n] timestamps, then float32[n] per column (NaN for missing values).
+
+    All series share the same columns.
+    """
+    names = []
+    for columns in series.values():
+        names = [name for name in columns if name != 'timestamps']
+        break
+
+    parts = [BINARY_MAGIC, struct.pack('<BB', BINARY_VERSION, len(names))]
+    for name in names:
+        encoded = name.encode('ascii')
+        parts.append(struct.pack('<B', len(encoded)) + encoded)
+    parts.append(struct.pack('<I', len(series)))
+    for key, columns in series.items():
+        encoded = str(key).encode('utf-8')
+        count = len(columns['timestamps'])
+        parts.append(struct.pack('<H', len(encoded)) + encoded)
+        parts.append(struct.pack(f'<I{count}I', count, *columns['timestamps']))
+        for name in names:
+            values = [math.nan if value is None else value for value in columns[name]]
+            parts.append(struct.pack(f'<{count}f', *values))
+    return b''.join(parts)
+
+
+# ===============================
+# Downsampling for display
+# ===============================
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+
+def lttb(xs, ys, threshold):
+    """
+    Largest-Triangle-Three-Buckets: indices of at most `threshold` points of
+    the series (xs, ys) that keep its visual shape. The first and last points
+    are always kept; in between, each bucket of points contributes the one
+    forming the largest triangle with the previously kept point and the
+    average of the next bucket.
+    """
+    size = len(xs)
+    if threshold >= size:
+        return list(range(size))
+    if threshold < 3:
+        return [0, size - 1][:threshold]
+    every = (size - 2) / (threshold - 2)
+    selected = [0]
+    previous = 0
+    for i in range(threshold - 2):
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, size)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+
+        ax, ay = xs[previous], ys[previous]
+        best_area = -1.0
+        for j in range(int(i * every) + 1, next_start):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best_area, previous = area, j
+        selected.append(previous)
+    selected.append(size - 1)
+    return selected
+
+
+def minmax(ys, threshold):
+    """
+    Indices of the lowest and highest point of each of threshold // 2 equal
+    slices of the series, in order: every extreme survives the downsampling.
+    """
+    size = len(ys)
+    if threshold >= size:
+        return list(range(size))
+    slices = max(threshold // 2, 1)
+    selected = []
+    for i in range(slices):
+        indices = range(i * size // slices, (i + 1) * size // slices)
+        low = min(indices, key=ys.__getitem__)
+        high = max(indices, key=ys.__getitem__)
+        selected.extend(sorted({low, high})[:threshold])
+    return selected
+
+
+def downsample_rows(rows, points, method='lttb', metrics=METRICS, value='avg'):
+    """
+    Reduces the bucket rows of one series to at most `points` values per
+    metric with `method` (see DOWNSAMPLE_METHODS), each metric on its own.
+    Returns copies of the rows kept for at least one metric, with the
+    <metric>_<value> of the other metrics set to None.
+    """
+    rows = list(rows)
+    kept = {}
+    for metric in metrics:
+        key = f'{metric}_{value}'
+        indices = [index for index, row in enumerate(rows) if row[key] is not None]
+        ys = [rows[index][key] for index in indices]
+        if method == 'minmax':
+            chosen = minmax(ys, points)
+        else:
+            chosen = lttb([rows[index]['bucket'] for index in indices], ys, points)
+        for position in chosen:
+            kept.setdefault(indices[position], set()).add(metric)
+
+    result = []
+    for index in sorted(kept):
+        row = dict(rows[index])
+        for metric in metrics:
+            if metric not in kept[index]:
+                row[f'{metric}_{value}'] = None
+        result.append(row)
+    return result
@@ -0,0 +1,234 @@
+import math
+import threading
+import time
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from .aggregation import METRICS
+from .models import Alert, AlertRule, Device, SensorData
+
+
+# ===============================
+# Alert rules evaluated incrementally on ingest
+# ===============================
+#
+# Every stored reading goes through AlertEngine.evaluate (store_readings and
+# the post_save signal). Per (device, metric) the engine keeps O(1) state: the
+# last value and time (rate of change) and an exponentially weighted moving
+# average and variance (anomalies), so no history is queried on ingest. The
+# state is process-local like the device cache: after a restart each worker
+# warms it up again. 'missing' rules cannot fire on a reading, they are
+# checked by `manage.py check_alerts`.
+
+
+class SeriesState:
+    """Rolling state of one (device, metric) series."""
+
+    __slots__ = ('count', 'mean', 'variance', 'last_value', 'last_time', 'rate_value', 'rate_time')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+        self.last_value = None
+        self.last_time = None
+        # Reading rates are computed from: the latest one at least the rate interval older.
+        self.rate_value = None
+        self.rate_time = None
+
+    def update(self, value, timestamp, alpha, rate_interval=0):
+        if self.count == 0:
+            self.mean = value
+        else:
+            # Incremental EWMA mean and variance (West / Finch).
+            diff = value - self.mean
+            increment = alpha * diff
+            self.mean += increment
+            self.variance = (1 - alpha) * (self.variance + diff * increment)
+        self.count += 1
+        self.last_value = value
+        self.last_time = timestamp
+        if self.rate_time is None or (timestamp - self.rate_time).total_seconds() >= rate_interval:
+            self.rate_value = value
+            self.rate_time = timestamp
+
+
+def violation(rule, value, timestamp, state, warmup, rate_interval=0):
+    """
+    Checks one reading against a threshold, rate or anomaly rule, given the
+    series state before the reading. Returns a message when the rule is
+    violated, None otherwise (including while it cannot be evaluated yet).
+    Rates are only computed over at least `rate_interval` seconds: readings
+    stamped on receipt can be microseconds apart.
+    """
+    if rule.kind == 'threshold':
+        if rule.min_value is not None and value < rule.min_value:
+            return f"{rule.name}: {rule.metric} {value:g} below {rule.min_value:g}"
+        if rule.max_value is not None and value > rule.max_value:
+            return f"{rule.name}: {rule.metric} {value:g} above {rule.max_value:g}"
+    elif rule.kind == 'rate':
+        if rule.max_rate is None or state.rate_time is None:
+            return None
+        seconds = (timestamp - state.rate_time).total_seconds()
+        if seconds <= 0 or seconds < rate_interval:
+            return None
+        rate = (value - state.rate_value) / (seconds / 60)
+        if abs(rate) > rule.max_rate:
+            return f"{rule.name}: {rule.metric} changing by {rate:+.2f}/min (limit {rule.max_rate:g})"
+    elif rule.kind == 'anomaly':
+        if rule.z_score is None or state.count < warmup:
+            return None
+        deviation = math.sqrt(state.variance)
+        if deviation > 0 and abs(value - state.mean) > rule.z_score * deviation:
+            return (f"{rule.name}: {rule.metric} {value:g} is {abs(value - state.mean) / deviation:.1f} "
+                    f"deviations from its average {state.mean:.2f}")
+    return None
+
+
+def _applies(rule, device_pk):
+    return rule.device_id_id is None or rule.device_id_id == device_pk
+
+
+class AlertEngine:
+    """
+    Evaluates the active AlertRules and records Alerts. A rule fires at most
+    once per device until a reading clears it, which resolves the alert.
+    Rules and open alerts are cached for `ttl` seconds (and dropped by the
+    AlertRule / Alert signal handlers); in between, the open alerts are tracked
+    in memory. Alerts fired or resolved by other processes (check_alerts, the
+    other workers) are picked up when the open alerts are reloaded.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._rules = None
+        self._open = None
+        self._states = {}
+
+    def rules(self):
+        with self._lock:
+            cached = self._rules
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        rules = list(AlertRule.objects.filter(is_active=True))
+        with self._lock:
+            self._rules = (rules, time.monotonic() + self.ttl)
+        return rules
+
+    def _open_alerts(self):
+        # Called with the lock held.
+        if self._open is None or self._open[1] <= time.monotonic():
+            self._open = (
+                set(Alert.objects.filter(resolved_at__isnull=True).values_list('rule_id', 'device_id')),
+                time.monotonic() + self.ttl,
+            )
+        return self._open[0]
+
+    def invalidate(self):
+        """Drops the cached rules and open alerts (rules or alerts edited)."""
+        with self._lock:
+            self._rules = None
+            self._open = None
+
+    def clear(self):
+        with self._lock:
+            self._rules = None
+            self._open = None
+            self._states.clear()
+
+    def evaluate(self, readings):
+        """
+        Checks stored SensorData objects against the rules, in time order, and
+        records the alerts fired and resolved. Readings older than the latest
+        one of their device only go through the threshold rules.
+        Returns the new Alert objects.
+        """
+        rules = self.rules()
+        if not rules:
+            return []
+        alpha = getattr(settings, 'SENSOR_ALERT_EWMA_ALPHA', 0.1)
+        warmup = getattr(settings, 'SENSOR_ALERT_WARMUP', 30)
+        rate_interval = getattr(settings, 'SENSOR_ALERT_RATE_INTERVAL', 1)
+
+        created = []
+        fired = {}
+        resolved = {}
+        with self._lock:
+            open_alerts = self._open_alerts()
+            for reading in sorted(readings, key=lambda reading: reading.timestamp):
+                device_pk = reading.device_id_id
+                applicable = [rule for rule in rules if _applies(rule, device_pk)]
+                for rule in applicable:
+                    if rule.kind == 'missing' and (rule.pk, device_pk) in open_alerts:
+                        open_alerts.discard((rule.pk, device_pk))
+                        resolved[(rule.pk, device_pk)] = reading.timestamp
+
+                # Rules saved without a valid metric (before the check constraint) are ignored.
+                for metric in {rule.metric for rule in applicable if rule.kind != 'missing'} & set(METRICS):
+                    value = float(getattr(reading, metric))
+                    state = self._states.setdefault((device_pk, metric), SeriesState())
+                    in_order = state.last_time is None or reading.timestamp > state.last_time
+                    for rule in applicable:
+                        if rule.metric != metric or rule.kind == 'missing':
+                            continue
+                        if not in_order and rule.kind != 'threshold':
+                            continue
+                        key = (rule.pk, device_pk)
+                        message = violation(rule, value, reading.timestamp, state, warmup, rate_interval)
+                        if message is not None:
+                            if key not in open_alerts:
+                                open_alerts.add(key)
+                                fired[key] = Alert(rule_id=rule, device_id_id=device_pk, value=value,
+                                                   message=message, triggered_at=reading.timestamp)
+                                created.append(fired[key])
+                        elif key in open_alerts:
+                            open_alerts.discard(key)
+                            if key in fired:
+                                # Fired and cleared within the same readings.
+                                fired.pop(key).resolved_at = reading.timestamp
+                            else:
+                                resolved[key] = reading.timestamp
+                    if in_order:
+                        state.update(value, reading.timestamp, alpha, rate_interval)
+
+        for (rule_pk, device_pk), resolved_at in resolved.items():
+            Alert.objects.filter(rule_id=rule_pk, device_id=device_pk, resolved_at__isnull=True).update(
+                resolved_at=resolved_at
+            )
+        return Alert.objects.bulk_create(created)
+
+    def check_missing(self, now=None):
+        """
+        Fires the 'missing' rules of the devices whose latest reading is older
+        than the rule's timeout. Returns the new Alert objects.
+        """
+        rules = [rule for rule in self.rules() if rule.kind == 'missing' and rule.timeout]
+        if not rules:
+            return []
+        now = now or timezone.now()
+        with self._lock:
+            # Runs periodically, usually in its own process: start from the stored alerts.
+            self._open = None
+        latest = SensorData.objects.filter(device_id=OuterRef('pk')).order_by('-timestamp').values('timestamp')[:1]
+        devices = Device.objects.annotate(last_seen=Subquery(latest)).filter(last_seen__isnull=False)
+        if all(rule.device_id_id is not None for rule in rules):
+            devices = devices.filter(pk__in={rule.device_id_id for rule in rules})
+        last_seen = dict(devices.values_list('pk', 'last_seen'))
+
+        fired = []
+        with self._lock:
+            open_alerts = self._open_alerts()
+            for rule in rules:
+                for device_pk, seen in last_seen.items():
+                    silent = (now - seen).total_seconds()
+                    key = (rule.pk, device_pk)
+                    if not _applies(rule, device_pk) or silent <= rule.timeout or key in open_alerts:
+                        continue
+                    open_alerts.add(key)
+                    fired.append(Alert(rule_id=rule, device_id_id=device_pk, value=silent, triggered_at=now,
+                                       message=f"{rule.name}: no reading for {int(silent)} s"))
+        return Alert.objects.bulk_create(fired)
+
+
+alert_engine = AlertEngine(ttl=getattr(settings, 'SENSOR_ALERT_RULES_TTL', 60))
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class SensorsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Sensors'
+
+    def ready(self):
+        # Register the signal handlers (device cache, rollups, response cache, live feed,
+        # alerts, query metrics, SQLite pragmas).
+        from . import signals  # noqa: F401
@@ -0,0 +1,354 @@
+import heapq
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+from django.conf import settings
+from .models import Device, SensorData
+from .aggregation import METRICS
+from .partitions import month_start, month_starts, next_month
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, without it nothing is archived.
+    np = None
+
+
+# ===============================
+# Memory-mapped columnar archive of cold sensor history
+# ===============================
+#
+# `manage.py archive_sensor_data` moves the readings of closed days out of
+# SensorData into one file per device and month under SENSOR_ARCHIVE_DIR:
+#
+#   <device pk>/<YYYY-MM>.col
+#
+# A file is a header (magic, month start in epoch milliseconds, row count)
+# followed by one little-endian array per column, rows ordered by time:
+#
+#   id         int64
+#   offset     uint32, milliseconds since the month start (delta encoded)
+#   micros     uint16, microseconds within that millisecond
+#   <metric>   int32, hundredths, as CentiUnitField stores them
+#
+# Files are memory-mapped; a range read is a binary search on the offsets and
+# a slice of the mapped arrays. A segment holds one reading per timestamp,
+# like the unique (device, timestamp) constraint of SensorData. MANIFEST.json
+# holds the archived_until watermark: readings before it are read from the
+# archive only. Readings arriving later for an archived day stay in
+# SensorData, unread, until the next archive run folds them in; resent ones
+# are recognised by store_readings (see contains) and skipped.
+
+MAGIC = b'SNSARCH2'
+# Files written before the micros column; their rows have 0 microseconds.
+MAGIC_V1 = b'SNSARCH1'
+HEADER = struct.Struct('<8sqq')
+MANIFEST = 'MANIFEST.json'
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+# Rows converted to Python objects at a time by rows().
+CHUNK_ROWS = 2000
+# Mapped files kept open (each mapping holds a file descriptor).
+MAX_OPEN_SEGMENTS = 256
+
+
+def available():
+    return np is not None
+
+
+def root():
+    """Archive directory (SENSOR_ARCHIVE_DIR), or None when archiving is disabled."""
+    directory = getattr(settings, 'SENSOR_ARCHIVE_DIR', None)
+    return Path(directory) if directory and np is not None else None
+
+
+def to_ms(ts):
+    return (ts - EPOCH) // timedelta(milliseconds=1)
+
+
+def to_us(ts):
+    return (ts - EPOCH) // timedelta(microseconds=1)
+
+
+def archived_until():
+    """Watermark before which every reading lives in the archive, or None."""
+    directory = root()
+    if directory is None:
+        return None
+    try:
+        with open(directory / MANIFEST) as f:
+            return datetime.fromtimestamp(json.load(f)['archived_until'], tz=dt_timezone.utc)
+    except FileNotFoundError:
+        return None
+
+
+def _set_archived_until(directory, watermark):
+    temporary = directory / f'{MANIFEST}.tmp'
+    temporary.write_text(json.dumps({'archived_until': int(watermark.timestamp())}))
+    os.replace(temporary, directory / MANIFEST)
+
+
+def segment_path(directory, device_pk, month):
+    return directory / str(device_pk) / f'{month:%Y-%m}.col'
+
+
+class Segment:
+    """One archive file. The column arrays are views on the memory mapping."""
+
+    def __init__(self, path):
+        data = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, self.base_ms, count = HEADER.unpack_from(data, 0)
+        if magic not in (MAGIC, MAGIC_V1):
+            raise ValueError(f'{path} is not a sensor archive file')
+        position = HEADER.size
+        self.ids = np.frombuffer(data, '<i8', count, position)
+        position += 8 * count
+        self.offsets = np.frombuffer(data, '<u4', count, position)
+        position += 4 * count
+        if magic == MAGIC:
+            self.micros = np.frombuffer(data, '<u2', count, position)
+            position += 2 * count
+        else:
+            self.micros = np.zeros(count, dtype=np.uint16)
+        self.columns = {}
+        for metric in METRICS:
+            self.columns[metric] = np.frombuffer(data, '<i4', count, position)
+            position += 4 * count
+
+    def __len__(self):
+        return len(self.ids)
+
+    def bounds(self, start_us, end_us):
+        """(low, high) index range of the rows between start_us and end_us (epoch microseconds), both included."""
+        limit = np.iinfo(np.uint32).max
+        start_ms, end_ms = start_us // 1000, end_us // 1000
+        low = int(np.searchsorted(self.offsets, min(max(start_ms - self.base_ms, 0), limit), side='left'))
+        if end_ms < self.base_ms:
+            return low, low
+        high = int(np.searchsorted(self.offsets, min(end_ms - self.base_ms, limit), side='right'))
+        # Trim the rows of the boundary milliseconds that fall outside the range.
+        while low < high and self.base_ms + int(self.offsets[low]) == start_ms and self.micros[low] < start_us % 1000:
+            low += 1
+        while high > low and self.base_ms + int(self.offsets[high - 1]) == end_ms and self.micros[high - 1] > end_us % 1000:
+            high -= 1
+        return low, high
+
+    def epoch_ms(self, low, high):
+        return self.base_ms + self.offsets[low:high].astype(np.int64)
+
+    def epoch_us(self, low, high):
+        return self.epoch_ms(low, high) * 1000 + self.micros[low:high]
+
+
+_segments = OrderedDict()
+_segments_lock = threading.Lock()
+
+
+def open_segment(path):
+    """The Segment of `path`, or None if there is none. Mappings are reused until the file is replaced."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    version = (stat.st_ino, stat.st_mtime_ns)
+    with _segments_lock:
+        cached = _segments.get(path)
+        if cached is not None and cached[0] == version:
+            _segments.move_to_end(path)
+            return cached[1]
+    segment = Segment(path)
+    with _segments_lock:
+        _segments[path] = (version, segment)
+        while len(_segments) > MAX_OPEN_SEGMENTS:
+            _segments.popitem(last=False)
+    return segment
+
+
+def write_segment(path, base_ms, ids, offsets, micros, values):
+    """Writes a segment file atomically (readers keep their mapping of the previous one)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary = path.with_suffix('.tmp')
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, base_ms, len(ids)))
+        f.write(ids.astype('<i8').tobytes())
+        f.write(offsets.astype('<u4').tobytes())
+        f.write(micros.astype('<u2').tobytes())
+        for metric in METRICS:
+            f.write(values[metric].astype('<i4').tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary, path)
+
+
+def append_segment(directory, device_pk, month, ids, epoch_us, values):
+    """Merges readings (NumPy arrays, values in hundredths) into the segment of a device and month."""
+    path = segment_path(directory, device_pk, month)
+    base_ms = to_ms(month)
+    epoch_us = epoch_us - base_ms * 1000
+    existing = open_segment(path)
+    if existing is not None:
+        ids = np.concatenate([existing.ids, ids])
+        epoch_us = np.concatenate([existing.epoch_us(0, len(existing)) - base_ms * 1000, epoch_us])
+        values = {metric: np.concatenate([existing.columns[metric], values[metric]]) for metric in METRICS}
+    order = np.lexsort((ids, epoch_us))
+    # One row per timestamp, the first one stored: a row archived twice (a run
+    # interrupted before deleting it) or a reading resent after its day was
+    # archived is kept once.
+    _, first = np.unique(epoch_us[order], return_index=True)
+    order = order[first]
+    write_segment(path, base_ms, ids[order], epoch_us[order] // 1000, epoch_us[order] % 1000,
+                  {metric: values[metric][order] for metric in METRICS})
+
+
+def archive_before(cutoff, delete=True, batch_size=5000):
+    """
+    Moves the SensorData rows older than `cutoff` into the archive: segments
+    are written first, then the watermark is advanced to `cutoff`, then the
+    rows are deleted (unless delete is False), without delete signals: the
+    rollups of archived readings are kept.
+    Returns {"rows": rows archived, "segments": files written}.
+    """
+    directory = root()
+    directory.mkdir(parents=True, exist_ok=True)
+    expired = SensorData.objects.filter(timestamp__lt=cutoff)
+    archived_ids = []
+    segments = 0
+    device_pks = expired.order_by().values_list('device_id', flat=True).distinct()
+    for device_pk in list(device_pks):
+        readings = expired.filter(device_id=device_pk)
+        oldest = readings.order_by('timestamp').values_list('timestamp', flat=True).first()
+        for month in month_starts(oldest, cutoff - timedelta(microseconds=1)):
+            ids, epoch_us = [], []
+            values = {metric: [] for metric in METRICS}
+            rows = (
+                readings
+                .filter(timestamp__gte=month, timestamp__lt=next_month(month))
+                .order_by()
+                .values_list('id', 'timestamp', *METRICS)
+                .iterator(chunk_size=10000)
+            )
+            for row in rows:
+                ids.append(row[0])
+                epoch_us.append(to_us(row[1]))
+                for metric, value in zip(METRICS, row[2:]):
+                    values[metric].append(round(value * 100))
+            if not ids:
+                continue
+            append_segment(
+                directory, device_pk, month, np.array(ids, dtype=np.int64), np.array(epoch_us, dtype=np.int64),
+                {metric: np.array(column, dtype=np.int32) for metric, column in values.items()}
+            )
+            archived_ids.extend(ids)
+            segments += 1
+
+    watermark = archived_until()
+    if watermark is None or cutoff > watermark:
+        _set_archived_until(directory, cutoff)
+    if delete:
+        for position in range(0, len(archived_ids), batch_size):
+            batch = SensorData.objects.filter(id__in=archived_ids[position:position + batch_size])
+            batch._raw_delete(batch.db)
+    return {'rows': len(archived_ids), 'segments': segments}
+
+
+def contains(device_pk, timestamps):
+    """The timestamps, among `timestamps`, of archived readings of a device."""
+    watermark = archived_until()
+    if watermark is None:
+        return set()
+    directory = root()
+    found = set()
+    for timestamp in timestamps:
+        if timestamp >= watermark:
+            continue
+        segment = open_segment(segment_path(directory, device_pk, month_start(timestamp)))
+        if segment is not None:
+            low, high = segment.bounds(to_us(timestamp), to_us(timestamp))
+            if high > low:
+                found.add(timestamp)
+    return found
+
+
+def device_pks(**device_filter):
+    """Primary keys of the devices matching a SensorData device filter (e.g. device_id__id=3); None for all."""
+    if not device_filter:
+        return None
+    lookups = {key[len('device_id__'):]: value for key, value in device_filter.items()}
+    return list(Device.objects.filter(**lookups).values_list('pk', flat=True))
+
+
+def _slices(start_time, end_time, pks=None):
+    """Yields (device_pk, segment, low, high) for the archived readings between start_time and end_time."""
+    directory = root()
+    if directory is None:
+        return
+    if pks is None:
+        pks = Device.objects.values_list('pk', flat=True)
+    start_us, end_us = to_us(start_time), to_us(end_time)
+    for device_pk in pks:
+        for month in month_starts(start_time, end_time):
+            segment = open_segment(segment_path(directory, device_pk, month))
+            if segment is None:
+                continue
+            low, high = segment.bounds(start_us, end_us)
+            if high > low:
+                yield device_pk, segment, low, high
+
+
+def columns(start_time, end_time, dtype, pks=None, metrics=METRICS):
+    """
+    Archived readings between start_time and end_time as one structured
+    array of `dtype` (device_id, epoch seconds and float metrics, see
+    engine.fetch_columns). Only the sliced range is copied out of the mappings.
+    """
+    parts = []
+    for device_pk, segment, low, high in _slices(start_time, end_time, pks):
+        part = np.empty(high - low, dtype=dtype)
+        part['device_id'] = device_pk
+        part['epoch'] = segment.epoch_ms(low, high) // 1000
+        for metric in metrics:
+            part[metric] = segment.columns[metric][low:high] / 100
+        parts.append(part)
+    return np.concatenate(parts) if parts else np.empty(0, dtype=dtype)
+
+
+def _segment_rows(segment, low, high, device, after):
+    for chunk_low in range(low, high, CHUNK_ROWS):
+        chunk_high = min(chunk_low + CHUNK_ROWS, high)
+        ids = segment.ids[chunk_low:chunk_high].tolist()
+        epoch_us = segment.epoch_us(chunk_low, chunk_high).tolist()
+        values = [(segment.columns[metric][chunk_low:chunk_high] / 100).tolist() for metric in METRICS]
+        for position, reading_id in enumerate(ids):
+            timestamp = EPOCH + timedelta(microseconds=epoch_us[position])
+            if after is not None and (timestamp, reading_id) <= after:
+                continue
+            row = {'id': reading_id, 'timestamp': timestamp}
+            for metric, column in zip(METRICS, values):
+                row[metric] = column[position]
+            row['device_id__mac_address'] = device['mac_address']
+            row['device_id__name'] = device['name']
+            yield row
+
+
+def rows(start_time, end_time, after=None):
+    """
+    Archived readings between start_time and end_time, ordered by (timestamp,
+    id), as dicts with the keys of sensor_data_interval's .values() rows.
+    `after` is an optional (timestamp, id) keyset cursor.
+    """
+    if after is not None and after[0] > start_time:
+        start_time = after[0]
+    slices = list(_slices(start_time, end_time))
+    devices = {
+        device['id']: device
+        for device in Device.objects.filter(pk__in={device_pk for device_pk, _, _, _ in slices})
+        .values('id', 'mac_address', 'name')
+    }
+    streams = [
+        _segment_rows(segment, low, high, devices[device_pk], after)
+        for device_pk, segment, low, high in slices
+        if device_pk in devices
+    ]
+    return heapq.merge(*streams, key=lambda row: (row['timestamp'], row['id']))
@@ -0,0 +1,88 @@
+import os
+import random
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from .device_cache import device_cache
+from .models import Device, SensorData, SensorRollup, User
+from .rollups import RESOLUTIONS, backfill
+
+
+# ===============================
+# Shared helpers of the benchmark management commands
+# ===============================
+
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0..1) of `values`, or None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+@contextmanager
+def temporary_database(database=None, pragmas=None):
+    """
+    Points the default database at a fresh, migrated SQLite file for the
+    duration of the block, with `database` settings (CONN_MAX_AGE, OPTIONS...)
+    and `pragmas` applied. The configured database is never touched.
+    """
+    db = connections.settings['default']
+    saved = {key: db.get(key) for key in ('NAME', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')}
+    saved_pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with tempfile.TemporaryDirectory() as directory:
+        connections.close_all()
+        db.update(database or {}, NAME=os.path.join(directory, 'bench.sqlite3'))
+        settings.SQLITE_PRAGMAS = pragmas or {}
+        # Devices and responses cached from the previous database are stale.
+        device_cache.clear()
+        cache.clear()
+        try:
+            call_command('migrate', verbosity=0, interactive=False)
+            yield
+        finally:
+            connections.close_all()
+            db.update(saved)
+            settings.SQLITE_PRAGMAS = saved_pragmas
+            device_cache.clear()
+            cache.clear()
+
+
+def seed(devices, readings, interval=60, seed_value=42):
+    """
+    Creates `devices` devices with `readings` readings each, one every
+    `interval` seconds up to now, and builds their rollups.
+    Returns the created devices.
+    """
+    rng = random.Random(seed_value)
+    owner = User.objects.create(username='bench', password='bench')
+    Device.objects.bulk_create([
+        Device(mac_address=f'BE:NC:00:00:{i // 256:02X}:{i % 256:02X}', owner_id=owner,
+               name=f'Bench {i}', description='Benchmark device')
+        for i in range(devices)
+    ])
+    created = list(Device.objects.filter(owner_id=owner).order_by('id'))
+    now = datetime.now(dt_timezone.utc)
+    first = now - timedelta(seconds=interval * readings)
+
+    with transaction.atomic():
+        batch = []
+        for device in created:
+            for step in range(readings):
+                batch.append(SensorData(
+                    device_id=device, timestamp=first + timedelta(seconds=interval * step),
+                    temperature=round(rng.uniform(15, 35), 2), humidity=round(rng.uniform(20, 90), 2),
+                    pressure=round(rng.uniform(900, 1100), 2),
+                ))
+                if len(batch) >= 5000:
+                    SensorData.objects.bulk_create(batch)
+                    batch = []
+        SensorData.objects.bulk_create(batch)
+        SensorRollup.objects.all().delete()
+        for resolution in RESOLUTIONS.values():
+            backfill(resolution, SensorData.objects.all())
+    return created
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .models import User, Device
+
+
+# ===============================
+# Process-local MAC -> Device registry
+# ===============================
+
+class DeviceCache:
+    """
+    Bounded LRU cache mapping MAC addresses to Device objects, with a TTL per
+    entry. It also remembers the default user that auto-created devices are
+    assigned to. Entries are dropped by the post_save/post_delete signal
+    handlers in signals.py, the TTL only bounds staleness across processes.
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._default_user = None
+        self._lock = threading.Lock()
+
+    def get(self, mac_address):
+        """Returns the cached Device for mac_address, or None."""
+        with self._lock:
+            entry = self._entries.get(mac_address)
+            if entry is not None:
+                device, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(mac_address)
+                    self.hits += 1
+                    return device
+                del self._entries[mac_address]
+            self.misses += 1
+            return None
+
+    def set(self, device):
+        with self._lock:
+            self._entries[device.mac_address] = (device, time.monotonic() + self.ttl)
+            self._entries.move_to_end(device.mac_address)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_device(self, device):
+        """Drops every entry for this device, under its current or a previous MAC address."""
+        with self._lock:
+            stale = [
+                mac_address for mac_address, (cached, _) in self._entries.items()
+                if cached.pk == device.pk or mac_address == device.mac_address
+            ]
+            for mac_address in stale:
+                del self._entries[mac_address]
+
+    def get_default_user(self):
+        """Returns the user new devices are assigned to (the first user), or None."""
+        with self._lock:
+            cached = self._default_user
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        user = User.objects.first()
+        if user is not None:
+            with self._lock:
+                self._default_user = (user, time.monotonic() + self.ttl)
+        return user
+
+    def invalidate_default_user(self):
+        with self._lock:
+            self._default_user = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._default_user = None
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+device_cache = DeviceCache(
+    max_size=getattr(settings, 'DEVICE_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'DEVICE_CACHE_TTL', 300),
+)
+
+
+def get_device(mac_address):
+    """
+    Cached equivalent of Device.objects.get(mac_address=mac_address).
+    Raises Device.DoesNotExist if no device has this MAC address.
+    """
+    device = device_cache.get(mac_address)
+    if device is None:
+        device = Device.objects.get(mac_address=mac_address)
+        device_cache.set(device)
+    return device
@@ -0,0 +1,188 @@
+import re
+from .models import SensorData
+from .aggregation import METRICS, EpochBucket
+from .rollups import bucket_start
+from . import archive
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional, only the ?agg= reductions need it.
+    np = None
+
+
+# ===============================
+# Vectorized aggregation engine (NumPy)
+# ===============================
+#
+# For reductions the database (and the rollups) cannot express: median,
+# percentiles, standard deviation, first/last value per bucket. Readings are
+# fetched as flat arrays, bucketed with integer division on epoch seconds and
+# reduced per (device, bucket) group without any per-row Python code.
+
+AGGREGATES = ('avg', 'sum', 'min', 'max', 'count', 'median', 'std', 'first', 'last')
+FILL_METHODS = ('null', 'previous')
+
+_PERCENTILE = re.compile(r'^p(\d{1,2}(?:\.\d+)?)$')
+
+
+def available():
+    return np is not None
+
+
+def parse_agg(value):
+    """
+    Parses the ?agg= query parameter: one of AGGREGATES (mean is an alias of
+    avg) or a percentile such as p95. Returns None when absent.
+    Raises ValueError for anything else.
+    """
+    if not value:
+        return None
+    value = value.lower()
+    if value == 'mean':
+        return 'avg'
+    if value in AGGREGATES or _PERCENTILE.match(value):
+        return value
+    raise ValueError(f'Unknown aggregate {value!r}')
+
+
+def column_dtype(metrics=METRICS):
+    return [('device_id', np.int64), ('epoch', np.int64)] + [(metric, np.float64) for metric in metrics]
+
+
+def fetch_columns(queryset, metrics=METRICS):
+    """
+    Loads a SensorData queryset as flat NumPy arrays: device_id and epoch
+    (int64 seconds) plus one float64 array per metric.
+    """
+    dtype = column_dtype(metrics)
+    rows = (
+        queryset
+        .annotate(epoch=EpochBucket('timestamp', 1))
+        .values_list('device_id', 'epoch', *metrics)
+        .iterator(chunk_size=10000)
+    )
+    return np.fromiter(rows, dtype=dtype)
+
+
+def _reduce(values, starts, counts, agg):
+    """Reduces `values` (sorted by group) over the groups given by starts/counts."""
+    if agg == 'avg':
+        return np.add.reduceat(values, starts) / counts
+    if agg == 'sum':
+        return np.add.reduceat(values, starts)
+    if agg == 'min':
+        return np.minimum.reduceat(values, starts)
+    if agg == 'max':
+        return np.maximum.reduceat(values, starts)
+    if agg == 'count':
+        return counts.astype(np.float64)
+    if agg == 'first':
+        return values[starts]
+    if agg == 'last':
+        return values[starts + counts - 1]
+    if agg == 'std':
+        means = np.add.reduceat(values, starts) / counts
+        deviations = values - np.repeat(means, counts)
+        return np.sqrt(np.add.reduceat(deviations * deviations, starts) / counts)
+
+    # Median / percentiles: sort the values inside each group, then
+    # interpolate linearly between the two closest ranks (like np.percentile).
+    q = 0.5 if agg == 'median' else float(agg[1:]) / 100
+    groups = np.repeat(np.arange(len(starts)), counts)
+    ordered = values[np.lexsort((values, groups))]
+    position = starts + q * (counts - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def aggregate(columns, bucket_seconds, agg, per_device=True, metrics=METRICS):
+    """
+    Buckets the arrays returned by fetch_columns and reduces every metric with
+    `agg`. Returns one row per (device, bucket) with keys device_id (if
+    per_device), bucket (epoch seconds), count and <metric>_<agg>, ordered by
+    device then bucket, like rollups.rollup_bucket_rows.
+    """
+    size = len(columns)
+    if size == 0:
+        return []
+    buckets = columns['epoch'] // bucket_seconds * bucket_seconds
+    devices = columns['device_id'] if per_device else np.zeros(size, dtype=np.int64)
+
+    # Sort by device, then bucket, then time (so first/last follow time order).
+    order = np.lexsort((columns['epoch'], buckets, devices))
+    devices = devices[order]
+    buckets = buckets[order]
+    boundary = np.empty(size, dtype=bool)
+    boundary[0] = True
+    boundary[1:] = (devices[1:] != devices[:-1]) | (buckets[1:] != buckets[:-1])
+    starts = np.flatnonzero(boundary)
+    counts = np.diff(np.append(starts, size))
+
+    result = {
+        'bucket': buckets[starts].tolist(),
+        'count': counts.tolist(),
+    }
+    if per_device:
+        result['device_id'] = devices[starts].tolist()
+    for metric in metrics:
+        result[f'{metric}_{agg}'] = _reduce(columns[metric][order], starts, counts, agg).tolist()
+
+    keys = list(result)
+    return [dict(zip(keys, values)) for values in zip(*result.values())]
+
+
+def fill_gaps(rows, start_epoch, end_epoch, bucket_seconds, agg, method, per_device=True, metrics=METRICS):
+    """
+    Adds the missing buckets between start_epoch and end_epoch for every
+    series in `rows`, with a count of 0 and either None ('null') or the last
+    known value ('previous') for every metric.
+    """
+    grid = range(start_epoch, end_epoch + 1, bucket_seconds)
+    series = {}
+    for row in rows:
+        series.setdefault(row.get('device_id'), {})[row['bucket']] = row
+
+    filled = []
+    for device_id, by_bucket in series.items():
+        previous = {metric: None for metric in metrics}
+        for bucket in grid:
+            row = by_bucket.get(bucket)
+            if row is None:
+                row = {'bucket': bucket, 'count': 0}
+                if per_device:
+                    row['device_id'] = device_id
+                for metric in metrics:
+                    row[f'{metric}_{agg}'] = previous[metric] if method == 'previous' else None
+            else:
+                previous = {metric: row[f'{metric}_{agg}'] for metric in metrics}
+            filled.append(row)
+    return filled
+
+
+def engine_rows(start_time, end_time, bucket_minutes, agg, fill=None, per_device=True,
+                metrics=METRICS, **device_filter):
+    """
+    Chart rows for a time range computed from the raw readings with the NumPy
+    engine. device_filter is applied to SensorData (e.g. device_id__id=3).
+    Readings older than the archive watermark are read from the archive.
+    """
+    bucket_seconds = bucket_minutes * 60
+    range_start = bucket_start(start_time, bucket_seconds)
+    readings = SensorData.objects.filter(timestamp__gte=range_start, timestamp__lte=end_time, **device_filter)
+    archived_until = archive.archived_until()
+    if archived_until is not None and archived_until > range_start:
+        archived = archive.columns(
+            range_start, min(end_time, archived_until), column_dtype(metrics),
+            archive.device_pks(**device_filter), metrics=metrics
+        )
+        columns = np.concatenate([archived, fetch_columns(readings.filter(timestamp__gte=archived_until), metrics)])
+    else:
+        columns = fetch_columns(readings, metrics)
+    rows = aggregate(columns, bucket_seconds, agg, per_device=per_device, metrics=metrics)
+    if fill:
+        rows = fill_gaps(
+            rows, int(range_start.timestamp()), int(bucket_start(end_time, bucket_seconds).timestamp()),
+            bucket_seconds, agg, fill, per_device=per_device, metrics=metrics
+        )
+    return rows
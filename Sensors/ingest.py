@@ -0,0 +1,234 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import SensorData, Device
+from .device_cache import device_cache
+from .rollups import apply_readings
+from .response_cache import invalidate_readings
+from .live import broker
+from .alerts import alert_engine
+from . import archive
+
+
+# ===============================
+# Ingest helpers shared by the POST endpoints
+# ===============================
+
+READING_FIELDS = ('temperature', 'humidity', 'pressure')
+
+
+def parse_timestamp(value):
+    """
+    Parses the optional device timestamp of a reading: Unix seconds, or an
+    ISO 8601 string (UTC when it has no offset). Returns an aware datetime, or
+    None when absent. Raises ValueError for malformed values and for instants
+    more than SENSOR_MAX_CLOCK_SKEW seconds in the future.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f'Invalid timestamp: {value!r}')
+    if isinstance(value, (int, float)):
+        try:
+            timestamp = datetime.fromtimestamp(value, tz=dt_timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            raise ValueError(f'Invalid timestamp: {value!r}')
+    else:
+        try:
+            timestamp = parse_datetime(str(value))
+        except ValueError:
+            timestamp = None
+        if timestamp is None:
+            raise ValueError(f'Invalid timestamp: {value!r}')
+        if timezone.is_naive(timestamp):
+            timestamp = timestamp.replace(tzinfo=dt_timezone.utc)
+    skew = getattr(settings, 'SENSOR_MAX_CLOCK_SKEW', 300)
+    if timestamp > timezone.now() + timedelta(seconds=skew):
+        raise ValueError('Timestamp is in the future')
+    return timestamp
+
+
+def clean_reading(data):
+    """
+    Validates one reading dict coming from a device.
+    Returns a dict with the mac_address, the three measurements converted
+    to Decimal and the optional device 'timestamp' (see parse_timestamp), or
+    raises ValueError with a message suitable for the client.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Reading must be a JSON object')
+    values = {}
+    for field in READING_FIELDS:
+        value = data.get(field)
+        if value is None:
+            raise ValueError('Missing temperature, humidity, or pressure data')
+        try:
+            values[field] = Decimal(str(value))
+        except InvalidOperation:
+            raise ValueError(f'Invalid value for {field}: {value!r}')
+        # Decimal and json.loads accept NaN and Infinity, the database does not.
+        if not values[field].is_finite():
+            raise ValueError(f'Invalid value for {field}: {value!r}')
+    mac_address = data.get('mac_address')
+    if not mac_address:
+        raise ValueError('Missing mac_address')
+    values['mac_address'] = mac_address
+    timestamp = parse_timestamp(data.get('timestamp'))
+    if timestamp is not None:
+        values['timestamp'] = timestamp
+    return values
+
+
+def resolve_devices(mac_addresses):
+    """
+    Returns a {mac_address: Device} mapping for the given MAC addresses.
+    Devices in the registry cache cost nothing, the others are fetched with
+    one query; unknown ones are created with one bulk insert and assigned to
+    the default (first) user.
+    Raises ValueError if devices must be created but no user exists.
+    """
+    devices = {}
+    uncached = set()
+    for mac_address in set(mac_addresses):
+        device = device_cache.get(mac_address)
+        if device is None:
+            uncached.add(mac_address)
+        else:
+            devices[mac_address] = device
+    if not uncached:
+        return devices
+
+    # mac_address is not unique, keep the oldest device like Device.objects.get would.
+    for device in Device.objects.filter(mac_address__in=uncached).order_by('-id'):
+        devices[device.mac_address] = device
+
+    missing = uncached - devices.keys()
+    if missing:
+        default_user = device_cache.get_default_user()  # Assumes a default user exists.
+        if not default_user:
+            raise ValueError('No default user found to assign the new device.')
+        Device.objects.bulk_create([
+            Device(
+                mac_address=mac_address,
+                owner_id=default_user,
+                name=f"Device {mac_address}",
+                description="Auto-created device",
+                is_active=1
+            )
+            for mac_address in missing
+        ])
+        # Re-read so every device has its primary key on all backends.
+        for device in Device.objects.filter(mac_address__in=missing).order_by('-id'):
+            devices[device.mac_address] = device
+
+    for mac_address in uncached - missing:
+        device_cache.set(devices[mac_address])
+    # Created devices are cached on commit: a rolled back batch must not leave them behind.
+    for mac_address in missing:
+        transaction.on_commit(lambda device=devices[mac_address]: device_cache.set(device))
+    return devices
+
+
+def store_readings(readings):
+    """
+    Stores a list of cleaned readings (see clean_reading) in a single
+    transaction: one query to resolve devices, one bulk insert for the readings,
+    then one rollup upsert per touched bucket. Readings without a 'timestamp'
+    (aware datetime) are stamped with the current time.
+
+    Readings are unique per (device, timestamp): a reading already stored
+    (in SensorData or the archive), or repeated within the list, is skipped. Readings for past buckets update
+    their rollups and cached closed buckets like any other.
+    The stored readings are then checked against the alert rules (alerts.py).
+    Returns, in input order, the created SensorData object of each reading,
+    or None for the duplicates.
+    """
+    if not readings:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        devices = resolve_devices(reading['mac_address'] for reading in readings)
+        objects = []
+        keys = set()
+        for position, reading in enumerate(readings):
+            device = devices[reading['mac_address']]
+            # Readings stamped here get distinct instants within the batch.
+            timestamp = reading.get('timestamp') or now + timedelta(microseconds=position)
+            if (device.pk, timestamp) in keys:
+                objects.append(None)
+                continue
+            keys.add((device.pk, timestamp))
+            objects.append(SensorData(
+                timestamp=timestamp,
+                temperature=reading['temperature'],
+                humidity=reading['humidity'],
+                pressure=reading['pressure'],
+                device_id=device
+            ))
+
+        # Device-stamped readings may have been sent before (retries, resent batches).
+        stamped = [obj for obj, reading in zip(objects, readings) if obj is not None and reading.get('timestamp')]
+        if stamped:
+            stored = set(
+                SensorData.objects
+                .filter(device_id__in={obj.device_id_id for obj in stamped},
+                        timestamp__in={obj.timestamp for obj in stamped})
+                .values_list('device_id', 'timestamp')
+            )
+            # Resent readings of archived days are no longer in SensorData.
+            timestamps_by_device = {}
+            for obj in stamped:
+                timestamps_by_device.setdefault(obj.device_id_id, set()).add(obj.timestamp)
+            for device_pk, timestamps in timestamps_by_device.items():
+                stored.update((device_pk, timestamp) for timestamp in archive.contains(device_pk, timestamps))
+            objects = [None if obj is not None and (obj.device_id_id, obj.timestamp) in stored else obj
+                       for obj in objects]
+
+        created = [obj for obj in objects if obj is not None]
+        try:
+            with transaction.atomic():
+                SensorData.objects.bulk_create(created)
+            # bulk_create sends no post_save signal, update the rollups here.
+            apply_readings(created)
+        except IntegrityError:
+            # A concurrent request stored some of the same readings meanwhile:
+            # insert the others, the ones it stored are duplicates.
+            created = _store_ignoring_conflicts(created)
+            objects = [obj if obj is not None and obj.pk is not None else None for obj in objects]
+    invalidate_readings(created)
+    broker.publish(created)
+    alert_engine.evaluate(created)
+    return objects
+
+
+def _store_ignoring_conflicts(objects):
+    """
+    Inserts the readings that are not stored yet and folds them into the
+    rollups. Returns the inserted objects; the others are left with pk None.
+    """
+    timestamps_by_device = {}
+    for obj in objects:
+        obj.pk = None
+        timestamps_by_device.setdefault(obj.device_id_id, []).append(obj.timestamp)
+
+    def stored_ids():
+        ids = {}
+        for device_pk, timestamps in timestamps_by_device.items():
+            rows = SensorData.objects.filter(device_id=device_pk, timestamp__in=timestamps)
+            ids.update(((device_pk, timestamp), pk) for pk, timestamp in rows.values_list('id', 'timestamp'))
+        return ids
+
+    existing = stored_ids()
+    SensorData.objects.bulk_create(objects, ignore_conflicts=True)
+    ids = stored_ids()
+    inserted = []
+    for obj in objects:
+        key = (obj.device_id_id, obj.timestamp)
+        if key not in existing and key in ids:
+            obj.pk = ids[key]
+            inserted.append(obj)
+    apply_readings(inserted)
+    return inserted
@@ -0,0 +1,58 @@
+from decimal import Decimal, InvalidOperation
+from .ingest import READING_FIELDS, parse_timestamp
+
+
+# ===============================
+# Line protocol of the UDP / TCP ingest listener
+# ===============================
+#
+# One reading per line, fields separated by spaces or tabs:
+#
+#     <mac_address> <temperature> <humidity> <pressure> [<unix timestamp>]
+#
+# e.g. "4C:11:AE:11:19:0C 23.41 45.2 1013.25 1741253400". Lines starting
+# with # and blank lines are ignored.
+
+
+def parse_line(line):
+    """
+    Parses one line (bytes) into a cleaned reading, the same dict as
+    ingest.clean_reading plus an optional 'timestamp' (checked like the JSON
+    endpoints' with ingest.parse_timestamp). Returns None for blank and
+    comment lines. Raises ValueError for malformed lines.
+    """
+    fields = line.split()
+    if not fields or fields[0].startswith(b'#'):
+        return None
+    if len(fields) not in (4, 5):
+        raise ValueError(f'Expected 4 or 5 fields, got {len(fields)}')
+    try:
+        reading = {'mac_address': fields[0].decode('ascii')}
+        for field, value in zip(READING_FIELDS, fields[1:4]):
+            reading[field] = Decimal(value.decode('ascii'))
+        if len(fields) == 5:
+            reading['timestamp'] = parse_timestamp(float(fields[4]))
+    except (UnicodeDecodeError, InvalidOperation) as e:
+        raise ValueError(f'Invalid line: {e}') from None
+    for field in READING_FIELDS:
+        if not reading[field].is_finite():
+            raise ValueError(f'Invalid value for {field}')
+    return reading
+
+
+def parse_lines(data):
+    """
+    Parses a datagram or buffer holding several lines. Returns the list of
+    readings and the number of rejected lines.
+    """
+    readings = []
+    rejected = 0
+    for line in data.splitlines():
+        try:
+            reading = parse_line(line)
+        except ValueError:
+            rejected += 1
+            continue
+        if reading is not None:
+            readings.append(reading)
+    return readings, rejected
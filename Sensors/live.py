@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from .models import SensorData
+
+
+# ===============================
+# In-process pub/sub for the live reading feed
+# ===============================
+
+class Subscription:
+    """One live feed client: an asyncio queue on the client's event loop, filtered by device ids."""
+
+    def __init__(self, device_ids, max_pending):
+        self.device_ids = device_ids  # None means every device.
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.missed = 0
+
+    def push(self, event):
+        # Runs on the subscriber's loop. Slow clients lose events rather than stall ingest.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.missed += 1
+
+
+class Broker:
+    """
+    Fans out new readings to the subscribed live feed clients. publish() may be
+    called from any thread (sync views, the write buffer flusher); delivery is
+    scheduled on each subscriber's event loop.
+    """
+
+    def __init__(self, max_pending=100):
+        self.max_pending = max_pending
+        self._subscriptions = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, device_ids=None):
+        """Must be called from the event loop the subscription will be read on."""
+        subscription = Subscription(device_ids, self.max_pending)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, readings):
+        """Sends every SensorData object in `readings` to the interested subscribers."""
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        if not subscriptions:
+            return
+        for reading in readings:
+            event = reading_event(reading)
+            for subscription in subscriptions:
+                if subscription.device_ids is None or reading.device_id_id in subscription.device_ids:
+                    try:
+                        subscription.loop.call_soon_threadsafe(subscription.push, event)
+                    except RuntimeError:
+                        # The client's loop is closed, it will never read again.
+                        self.unsubscribe(subscription)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscriptions)
+
+
+def stored_value(reading, metric):
+    """
+    A measurement as read back from the database (a float in hundredths),
+    whatever the ingest path set on the object (int, str, Decimal or float).
+    """
+    field = SensorData._meta.get_field(metric)
+    return field.from_db_value(field.get_prep_value(getattr(reading, metric)), None, None)
+
+
+def reading_event(reading):
+    """Payload of one live feed event, same value layout as device_latest_value."""
+    return {
+        'esp_id': reading.device_id_id,
+        'esp_name': reading.device_id.name,
+        'timestamp': reading.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+        'temperature': stored_value(reading, 'temperature'),
+        'humidity': stored_value(reading, 'humidity'),
+        'pressure': stored_value(reading, 'pressure'),
+    }
+
+
+broker = Broker()
@@ -0,0 +1,36 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+from Sensors import archive
+from Sensors.retention import cutoff
+
+
+class Command(BaseCommand):
+    help = ("Moves the readings of closed days from SensorData into the memory-mapped "
+            "columnar archive (SENSOR_ARCHIVE_DIR), one file per device and month.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=0, metavar='DAYS',
+                            help="Archive the days ending at least DAYS days ago (default: every day before today, UTC).")
+        parser.add_argument('--keep-rows', action='store_true',
+                            help="Write the archive but leave the rows in the database.")
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows deleted per statement.")
+        parser.add_argument('--every', type=float,
+                            help="Keep running and archive every N seconds (in-process scheduler).")
+
+    def handle(self, *args, **options):
+        if not archive.available():
+            raise CommandError("The archive needs NumPy, which is not installed.")
+        if archive.root() is None:
+            raise CommandError("Set SENSOR_ARCHIVE_DIR to enable the archive.")
+        while True:
+            before = cutoff(options['older_than'], timezone.now())
+            report = archive.archive_before(before, delete=not options['keep_rows'], batch_size=options['batch_size'])
+            self.stdout.write(
+                f"Archived {report['rows']} readings older than {before:%Y-%m-%d} into {report['segments']} files."
+            )
+            if not options['every']:
+                return
+            close_old_connections()
+            time.sleep(options['every'])
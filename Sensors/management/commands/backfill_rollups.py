@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from Sensors.models import SensorData, SensorRollup
+from Sensors.rollups import RESOLUTIONS, backfill
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the SensorRollup buckets from the raw SensorData rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--resolution', action='append', choices=list(RESOLUTIONS),
+            help="Resolution to rebuild (repeatable). Defaults to all of them."
+        )
+        parser.add_argument('--device', type=int, help="Only rebuild the rollups of this device id.")
+
+    def handle(self, *args, **options):
+        labels = options['resolution'] or list(RESOLUTIONS)
+        readings = SensorData.objects.all()
+        rollups = SensorRollup.objects.all()
+        if options['device']:
+            readings = readings.filter(device_id__id=options['device'])
+            rollups = rollups.filter(device_id__id=options['device'])
+
+        for label in labels:
+            resolution = RESOLUTIONS[label]
+            with transaction.atomic():
+                rollups.filter(resolution=resolution).delete()
+                created = backfill(resolution, readings)
+            self.stdout.write(f"{label}: {created} rollup rows created")
+        self.stdout.write(self.style.SUCCESS("Rollups rebuilt."))
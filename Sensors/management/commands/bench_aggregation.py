@@ -0,0 +1,95 @@
+import json
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from Sensors import engine
+from Sensors.aggregation import METRICS
+
+
+def bucket_timestamp(ts):
+    floored_minute = (ts.minute // 10) * 10
+    return ts.replace(minute=floored_minute, second=0, microsecond=0)
+
+
+def python_buckets(readings):
+    """The former dict-of-lists loop of sensor_data_get, kept as the baseline."""
+    device_data = defaultdict(lambda: defaultdict(lambda: {
+        'temperature': [],
+        'humidity': [],
+        'pressure': []
+    }))
+    for device_key, timestamp, temperature, humidity, pressure in readings:
+        bucket_key = bucket_timestamp(timestamp).strftime('%Y-%m-%d %H:%M')
+        device_data[device_key][bucket_key]['temperature'].append(temperature)
+        device_data[device_key][bucket_key]['humidity'].append(humidity)
+        device_data[device_key][bucket_key]['pressure'].append(pressure)
+
+    data = {}
+    for device_key, buckets in device_data.items():
+        data[device_key] = {
+            metric: {
+                bucket_key: sum(measurements[metric]) / len(measurements[metric])
+                for bucket_key, measurements in buckets.items()
+            }
+            for metric in METRICS
+        }
+    return data
+
+
+class Command(BaseCommand):
+    help = ("Benchmarks the NumPy aggregation engine against the pure-Python bucketing loop "
+            "on synthetic in-memory readings (no database involved).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help="Number of synthetic readings.")
+        parser.add_argument('--devices', type=int, default=50, help="Number of devices.")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement (best is kept).")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        if not engine.available():
+            raise CommandError("NumPy is not installed.")
+        np = engine.np
+
+        rows, devices = options['rows'], options['devices']
+        rng = random.Random(42)
+        start = datetime(2025, 3, 6, tzinfo=dt_timezone.utc)
+        step = 86400 / max(rows // devices, 1)
+        readings = [
+            (i % devices, start + timedelta(seconds=(i // devices) * step),
+             Decimal(rng.randint(1500, 3500)) / 100, Decimal(rng.randint(2000, 9000)) / 100,
+             Decimal(rng.randint(90000, 110000)) / 100)
+            for i in range(rows)
+        ]
+        dtype = [('device_id', np.int64), ('epoch', np.int64)] + [(metric, np.float64) for metric in METRICS]
+        columns = np.array([
+            (device, int(ts.timestamp()), float(t), float(h), float(p))
+            for device, ts, t, h, p in readings
+        ], dtype=dtype)
+
+        def best(function):
+            timings = []
+            for _ in range(options['repeat']):
+                began = time.perf_counter()
+                function()
+                timings.append(time.perf_counter() - began)
+            return min(timings)
+
+        results = {
+            'rows': rows,
+            'devices': devices,
+            'python_avg_seconds': best(lambda: python_buckets(readings)),
+            'engine_avg_seconds': best(lambda: engine.aggregate(columns, 600, 'avg')),
+            'engine_median_seconds': best(lambda: engine.aggregate(columns, 600, 'median')),
+            'engine_p95_seconds': best(lambda: engine.aggregate(columns, 600, 'p95')),
+        }
+        results['speedup_avg'] = results['python_avg_seconds'] / results['engine_avg_seconds']
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        for name, value in results.items():
+            self.stdout.write(f"{name:24} {value:.4f}" if isinstance(value, float) else f"{name:24} {value}")
@@ -0,0 +1,211 @@
+import json
+import platform
+import time
+import tracemalloc
+from datetime import timedelta
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from Sensors import engine
+from Sensors.benchmark import percentile, seed, temporary_database
+from Sensors.urls import urlpatterns
+from Sensors.write_buffer import write_buffer
+
+API_PREFIX = '/api/'
+
+# Routes that cannot be timed as a request / response exchange.
+SKIPPED_ROUTES = {
+    'get/data/stream': "long-lived server-sent events stream",
+}
+
+
+def scenarios(device):
+    """
+    (label, route, method, query parameters or JSON body) for every measured
+    request. `route` is the pattern in Sensors/urls.py it exercises.
+    """
+    now = timezone.now()
+    day_ago = (now - timedelta(hours=24)).strftime('%Y-%m-%d %H:%M:%S')
+    reading = {'mac_address': device.mac_address, 'temperature': 21.5, 'humidity': 48.2, 'pressure': 1012.3}
+    interval = {'start': day_ago, 'end': now.strftime('%Y-%m-%d %H:%M:%S')}
+    chart = {'id': device.pk}
+
+    requests = [
+        ('get/data', 'get/data', 'GET', {}),
+        ('post/data', 'post/data', 'POST', reading),
+        ('post/data/batch', 'post/data/batch', 'POST', [reading] * 100),
+        ('post/data/async', 'post/data/async', 'POST', reading),
+        ('get/user', 'get/user', 'GET', {}),
+        ('get/device', 'get/device', 'GET', {}),
+        ('get/data/latest', 'get/data/latest', 'GET', {}),
+        ('get/data/intervall', 'get/data/intervall', 'GET', interval),
+        ('get/data/intervall?stream=ndjson', 'get/data/intervall', 'GET', dict(interval, stream='ndjson')),
+        ('get/data/latesthistory', 'get/data/latesthistory', 'GET', chart),
+        ('get/chart/quellechart', 'get/chart/quellechart', 'GET', chart),
+        ('get/chart/quellechart?bucket=60', 'get/chart/quellechart', 'GET', dict(chart, bucket=60)),
+        ('get/chart/quellechart?points=50', 'get/chart/quellechart', 'GET', dict(chart, points=50)),
+        ('get/chart/fleet', 'get/chart/fleet', 'GET', {}),
+        ('get/alerts', 'get/alerts', 'GET', {}),
+        ('metrics', 'metrics', 'GET', {}),
+    ]
+    if engine.available():
+        requests.append(('get/chart/quellechart?agg=p95', 'get/chart/quellechart', 'GET', dict(chart, agg='p95')))
+    return requests
+
+
+class Command(BaseCommand):
+    help = ("Seeds a temporary database with N devices x M readings, then times every route of "
+            "Sensors/urls.py through the Django test client: latency percentiles, throughput, "
+            "queries per request, response size and peak memory, as text or JSON.")
+
+    # The configured database is never touched.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--devices', type=int, default=10, help="Devices to seed.")
+        parser.add_argument('--readings', type=int, default=2000, help="Readings per device (one per minute).")
+        parser.add_argument('--requests', type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per scenario.")
+        parser.add_argument('--warm-cache', action='store_true',
+                            help="Keep the response cache between requests (cleared before each one by default).")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+        parser.add_argument('--output', help="Also write the JSON results to this file.")
+        parser.add_argument('--compare', help="JSON results of a previous run to compare p95 latencies with.")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Relative p95 increase reported as a regression (default 0.2 = 20%%).")
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            began = time.perf_counter()
+            devices = seed(options['devices'], options['readings'])
+            seed_seconds = time.perf_counter() - began
+            try:
+                results = self.run_scenarios(scenarios(devices[0]), options)
+            finally:
+                # Store what the async endpoint queued before the database goes away.
+                write_buffer.stop()
+
+        routes = {str(pattern.pattern) for pattern in urlpatterns}
+        measured = {result['route'] for result in results}
+        report = {
+            'meta': {
+                'devices': options['devices'],
+                'readings_per_device': options['readings'],
+                'requests': options['requests'],
+                'warm_cache': options['warm_cache'],
+                'seed_seconds': round(seed_seconds, 2),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'numpy': engine.available(),
+                'date': timezone.now().isoformat(),
+            },
+            'routes': results,
+            'skipped': {route: SKIPPED_ROUTES[route] for route in sorted(routes & set(SKIPPED_ROUTES))},
+            'unmeasured': sorted(routes - measured - set(SKIPPED_ROUTES)),
+        }
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+        else:
+            self.print_report(report)
+        if options['compare']:
+            self.compare(report, options['compare'], options['threshold'])
+
+    def run_scenarios(self, requests, options):
+        client = Client(raise_request_exception=False)
+        results = []
+        for label, route, method, payload in requests:
+            def send():
+                if method == 'POST':
+                    response = client.post(API_PREFIX + route, json.dumps(payload), content_type='application/json')
+                else:
+                    response = client.get(API_PREFIX + route, payload)
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                return response, len(body)
+
+            for _ in range(options['warmup']):
+                send()
+
+            latencies, queries, sizes, errors = [], [], [], 0
+            for _ in range(options['requests']):
+                if not options['warm_cache']:
+                    cache.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    began = time.perf_counter()
+                    response, size = send()
+                    latencies.append(time.perf_counter() - began)
+                queries.append(len(captured))
+                sizes.append(size)
+                if response.status_code >= 400:
+                    errors += 1
+
+            # Peak memory is measured on one extra request: tracing slows everything down.
+            if not options['warm_cache']:
+                cache.clear()
+            tracemalloc.start()
+            send()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            total = sum(latencies)
+            results.append({
+                'label': label,
+                'route': route,
+                'method': method,
+                'requests': len(latencies),
+                'errors': errors,
+                'p50_ms': round(percentile(latencies, 0.5) * 1000, 3),
+                'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+                'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+                'mean_ms': round(total / len(latencies) * 1000, 3),
+                'requests_per_second': round(len(latencies) / total, 1) if total else None,
+                'queries_per_request': round(sum(queries) / len(queries), 2),
+                'response_bytes': round(sum(sizes) / len(sizes)),
+                'peak_memory_kib': round(peak / 1024, 1),
+            })
+        return results
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"{'scenario':36} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8} "
+            f"{'queries':>8} {'bytes':>9} {'peak KiB':>9} {'errors':>6}"
+        )
+        for result in report['routes']:
+            self.stdout.write(
+                f"{result['method'] + ' ' + result['label']:36} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} "
+                f"{result['p99_ms']:9.2f} {result['requests_per_second']:8.1f} {result['queries_per_request']:8.2f} "
+                f"{result['response_bytes']:9} {result['peak_memory_kib']:9.1f} {result['errors']:6}"
+            )
+        for route, reason in report['skipped'].items():
+            self.stdout.write(f"skipped {route}: {reason}")
+        for route in report['unmeasured']:
+            self.stdout.write(self.style.WARNING(f"no scenario for route {route}"))
+
+    def compare(self, report, baseline_path, threshold):
+        with open(baseline_path) as baseline_file:
+            baseline = {result['label']: result for result in json.load(baseline_file)['routes']}
+        regressions = []
+        for result in report['routes']:
+            previous = baseline.get(result['label'])
+            if previous is None:
+                continue
+            # Sub-millisecond differences are timer noise.
+            slower = result['p95_ms'] - previous['p95_ms']
+            if slower > 1.0 and result['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+                regressions.append(
+                    f"{result['label']}: p95 {previous['p95_ms']} -> {result['p95_ms']} ms"
+                )
+            if result['queries_per_request'] > previous['queries_per_request']:
+                regressions.append(
+                    f"{result['label']}: queries {previous['queries_per_request']} -> {result['queries_per_request']}"
+                )
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS(f"No regression against {baseline_path}."))
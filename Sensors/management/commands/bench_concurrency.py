@@ -0,0 +1,128 @@
+import json
+import random
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from Sensors.benchmark import percentile, seed, temporary_database
+
+READ_URLS = (
+    '/api/get/chart/quellechart?id={device}',
+    '/api/get/data',
+    '/api/get/data/latest',
+)
+
+
+def profiles():
+    """Database settings and pragmas of the compared profiles."""
+    return {
+        'default': ({'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}, {}),
+        'production': (settings.SQLITE_PRODUCTION_DATABASE, settings.SQLITE_PRODUCTION_PRAGMAS),
+    }
+
+
+class Command(BaseCommand):
+    help = ("Measures ingest and read throughput with N writer threads posting readings while "
+            "M reader threads hit the chart endpoints, once per SQLite profile, each on a "
+            "fresh temporary database.")
+
+    # The configured database is never touched.
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help="Writer threads.")
+        parser.add_argument('--readers', type=int, default=4, help="Reader threads.")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per profile.")
+        parser.add_argument('--profile', action='append', choices=['default', 'production'],
+                            help="Profile to run (repeatable). Defaults to both.")
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        available = profiles()
+        results = []
+        for name in options['profile'] or list(available):
+            database, pragmas = available[name]
+            with temporary_database(database, pragmas):
+                device = seed(1, 1)[0]
+                connections.close_all()
+                results.append(self.load(name, device.pk, options))
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['profile']:11} writes/s {result['writes_per_second']:8.1f}  "
+                f"reads/s {result['reads_per_second']:8.1f}  errors {result['errors']:5}  "
+                f"write p95 {result['write_p95_ms']} ms  read p95 {result['read_p95_ms']} ms"
+            )
+
+    def load(self, name, device_pk, options):
+        deadline = time.monotonic() + options['duration']
+        lock = threading.Lock()
+        latencies = {'write': [], 'read': []}
+        counters = {'errors': 0}
+
+        def record(kind, began, ok):
+            with lock:
+                if ok:
+                    latencies[kind].append(time.perf_counter() - began)
+                else:
+                    counters['errors'] += 1
+
+        def writer(index):
+            client = Client(raise_request_exception=False)
+            rng = random.Random(index)
+            body = {'mac_address': f'BENCH:{index + 1:02}'}
+            try:
+                while time.monotonic() < deadline:
+                    body.update(temperature=rng.uniform(15, 35), humidity=rng.uniform(20, 90),
+                                pressure=rng.uniform(900, 1100))
+                    began = time.perf_counter()
+                    response = client.post('/api/post/data', json.dumps(body), content_type='application/json')
+                    record('write', began, response.status_code == 200 and response.json().get('success'))
+            finally:
+                connections.close_all()
+
+        def reader(index):
+            client = Client(raise_request_exception=False)
+            try:
+                step = index
+                while time.monotonic() < deadline:
+                    url = READ_URLS[step % len(READ_URLS)].format(device=device_pk)
+                    step += 1
+                    began = time.perf_counter()
+                    response = client.get(url)
+                    record('read', began, response.status_code == 200)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(options['readers'])]
+        began = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - began
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 2)
+
+        return {
+            'profile': name,
+            'writers': options['writers'],
+            'readers': options['readers'],
+            'seconds': round(elapsed, 2),
+            'writes': len(latencies['write']),
+            'reads': len(latencies['read']),
+            'errors': counters['errors'],
+            'writes_per_second': len(latencies['write']) / elapsed,
+            'reads_per_second': len(latencies['read']) / elapsed,
+            'write_p50_ms': ms(percentile(latencies['write'], 0.5)),
+            'write_p95_ms': ms(percentile(latencies['write'], 0.95)),
+            'read_p50_ms': ms(percentile(latencies['read'], 0.5)),
+            'read_p95_ms': ms(percentile(latencies['read'], 0.95)),
+        }
@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from Sensors.alerts import alert_engine
+
+
+class Command(BaseCommand):
+    help = ("Fires the 'missing' alert rules of the devices that sent no reading within the rule's "
+            "timeout. The other rules are evaluated on ingest.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float,
+                            help="Keep running and check every N seconds (in-process scheduler).")
+
+    def handle(self, *args, **options):
+        while True:
+            for alert in alert_engine.check_missing():
+                self.stdout.write(alert.message)
+            if not options['every']:
+                return
+            close_old_connections()
+            time.sleep(options['every'])
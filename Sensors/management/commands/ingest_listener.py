@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from Sensors.line_protocol import parse_line, parse_lines
+from Sensors.write_buffer import write_buffer
+
+logger = logging.getLogger(__name__)
+
+# How long a TCP connection waits before retrying when the write buffer is full.
+BACKPRESSURE_DELAY = 0.05
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(':')
+    try:
+        return host or '0.0.0.0', int(port)
+    except ValueError:
+        raise CommandError(f"Invalid address {value!r}, expected [host:]port")
+
+
+class Listener:
+    """
+    Receives line protocol readings (see Sensors/line_protocol.py) and queues
+    them in the write-behind buffer, which stores them in batches with
+    ingest.store_readings, like the async HTTP endpoint. Readings without a
+    timestamp are stamped on receipt.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.rejected = 0
+        self.dropped = 0
+
+    def queue(self, reading):
+        if 'timestamp' not in reading:
+            reading['timestamp'] = timezone.now()
+        return write_buffer.offer(reading)
+
+    # UDP: one or more lines per datagram. There is no way to slow a UDP
+    # sender down, readings arriving while the buffer is full are dropped.
+    def connection_made(self, transport):
+        pass
+
+    def datagram_received(self, data, address):
+        readings, rejected = parse_lines(data)
+        self.rejected += rejected
+        for reading in readings:
+            self.received += 1
+            if not self.queue(reading):
+                self.dropped += 1
+
+    def error_received(self, exc):
+        logger.warning("UDP error: %s", exc)
+
+    def connection_lost(self, exc):
+        pass
+
+    # TCP: one reading per line. When the buffer is full the connection stops
+    # being read, so the kernel buffers fill up and the device's send blocks.
+    async def handle_stream(self, reader, writer):
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (asyncio.LimitOverrunError, ValueError):
+                    self.rejected += 1
+                    break
+                if not line:
+                    break
+                try:
+                    reading = parse_line(line)
+                except ValueError:
+                    self.rejected += 1
+                    continue
+                if reading is None:
+                    continue
+                self.received += 1
+                while not self.queue(reading):
+                    await asyncio.sleep(BACKPRESSURE_DELAY)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    def stats(self):
+        return {'received': self.received, 'rejected': self.rejected, 'dropped': self.dropped}
+
+
+class Command(BaseCommand):
+    help = ("Runs a UDP and/or TCP listener for the compact line protocol "
+            "'<mac> <temperature> <humidity> <pressure> [<unix ts>]', one reading per line.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--udp', metavar='[HOST:]PORT', help="UDP address to listen on, e.g. 0.0.0.0:8089.")
+        parser.add_argument('--tcp', metavar='[HOST:]PORT', help="TCP address to listen on, e.g. 0.0.0.0:8089.")
+        parser.add_argument('--stats-interval', type=float, default=60.0,
+                            help="Seconds between two statistics lines (0 disables them).")
+
+    def handle(self, *args, **options):
+        if not options['udp'] and not options['tcp']:
+            raise CommandError("Give at least one of --udp and --tcp.")
+        listener = Listener()
+        try:
+            asyncio.run(self.serve(listener, options))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Store every reading still buffered before exiting.
+            write_buffer.stop()
+            self.stdout.write(f"Stopped: {listener.stats()} buffer: {write_buffer.stats()}")
+
+    async def serve(self, listener, options):
+        loop = asyncio.get_running_loop()
+        servers = []
+        if options['udp']:
+            host, port = parse_address(options['udp'])
+            transport, _ = await loop.create_datagram_endpoint(lambda: listener, local_addr=(host, port))
+            servers.append(transport)
+            self.stdout.write(f"Listening for UDP readings on {host}:{port}")
+        if options['tcp']:
+            host, port = parse_address(options['tcp'])
+            server = await asyncio.start_server(listener.handle_stream, host, port)
+            servers.append(server)
+            self.stdout.write(f"Listening for TCP readings on {host}:{port}")
+
+        try:
+            while True:
+                if options['stats_interval'] > 0:
+                    await asyncio.sleep(options['stats_interval'])
+                    self.stdout.write(f"{listener.stats()} buffer: {write_buffer.stats()}")
+                else:
+                    await asyncio.sleep(3600)
+        finally:
+            for server in servers:
+                server.close()
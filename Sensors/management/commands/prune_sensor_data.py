@@ -0,0 +1,51 @@
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from Sensors import partitions
+from Sensors.retention import apply_policy, retention_policy
+
+
+class Command(BaseCommand):
+    help = ("Applies the SENSOR_RETENTION_DAYS policy: downsamples the expiring raw readings "
+            "into rollups, then deletes the expired rows of every tier in small batches.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Rows deleted per statement.")
+        parser.add_argument('--pause', type=float, default=0.0, help="Seconds to sleep between batches.")
+        parser.add_argument('--no-downsample', action='store_true',
+                            help="Delete raw readings without rebuilding their rollups first.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the expired rows.")
+        parser.add_argument('--every', type=float,
+                            help="Keep running and prune every N seconds (in-process scheduler).")
+        parser.add_argument('--json', action='store_true', help="Print each report as JSON.")
+
+    def handle(self, *args, **options):
+        while True:
+            report = apply_policy(
+                batch_size=options['batch_size'],
+                pause=options['pause'],
+                downsample_raw=not options['no_downsample'],
+                dry_run=options['dry_run'],
+            )
+            self.print_report(report, options)
+            if not options['every']:
+                return
+            close_old_connections()
+            time.sleep(options['every'])
+
+    def print_report(self, report, options):
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        policy = retention_policy()
+        verb = "would delete" if options['dry_run'] else "deleted"
+        for tier, days in policy.items():
+            kept = "forever" if days is None else f"{days} days"
+            self.stdout.write(f"{tier:4} (kept {kept}): {verb} {report['deleted'].get(tier, 0)} rows")
+        if not options['dry_run']:
+            self.stdout.write(f"rollup rows rebuilt before deleting raw readings: {report['downsampled']}")
+            if report['reclaimed_bytes'] is not None:
+                hint = "" if partitions.supported() else " (run VACUUM to shrink the file)"
+                self.stdout.write(f"reclaimed: {report['reclaimed_bytes']} bytes{hint}")
+        self.stdout.write(self.style.SUCCESS("Retention policy applied."))
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.utils import timezone
+from Sensors import partitions
+
+
+class Command(BaseCommand):
+    help = ("Creates the monthly SensorData partitions of the coming months (PostgreSQL) "
+            "and lists every partition with its size.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help="Months to create after the current one.")
+        parser.add_argument('--list', action='store_true', help="Only list the partitions.")
+        parser.add_argument('--every', type=float,
+                            help="Keep running and create partitions every N seconds (in-process scheduler).")
+
+    def handle(self, *args, **options):
+        if not partitions.supported():
+            raise CommandError("SensorData is only partitioned on PostgreSQL.")
+        while True:
+            if not options['list']:
+                created = partitions.ensure_partitions(timezone.now(), months_ahead=options['months_ahead'])
+                for name in created:
+                    self.stdout.write(f"created {name}")
+            for name, rows, size in partitions.partition_stats():
+                self.stdout.write(f"{name}: ~{max(rows, 0)} rows, {size} bytes")
+            if not options['every']:
+                return
+            close_old_connections()
+            time.sleep(options['every'])
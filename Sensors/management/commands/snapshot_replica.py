@@ -0,0 +1,40 @@
+import sqlite3
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connections
+from Sensors.routers import read_database
+
+
+class Command(BaseCommand):
+    help = ("Copies the primary SQLite database into the read replica file "
+            "(DJANGO_READ_REPLICA=/path/to/replica.sqlite3) with the SQLite backup API.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=float, help="Keep running and refresh every N seconds.")
+
+    def handle(self, *args, **options):
+        alias = read_database()
+        if alias == 'default':
+            raise CommandError("No read replica configured (DJANGO_READ_REPLICA).")
+        target = connections[alias].settings_dict['NAME']
+        if str(target).startswith('file:'):
+            raise CommandError("The read replica is a read-only connection to the primary, nothing to copy.")
+
+        while True:
+            began = time.monotonic()
+            self.snapshot(str(target))
+            self.stdout.write(f"Replica {target} refreshed in {time.monotonic() - began:.2f}s")
+            if not options['every']:
+                return
+            close_old_connections()
+            time.sleep(options['every'])
+
+    def snapshot(self, target):
+        primary = connections['default']
+        primary.ensure_connection()
+        # Readers of the replica wait on its lock while the pages are copied.
+        replica = sqlite3.connect(target, timeout=30)
+        try:
+            primary.connection.backup(replica)
+        finally:
+            replica.close()
@@ -0,0 +1,162 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.http import JsonResponse as DjangoJsonResponse
+
+
+# ===============================
+# In-process metrics (Prometheus text exposition)
+# ===============================
+#
+# Histograms have fixed buckets, so recording a value is a bisect and a few
+# additions under a lock, whatever the traffic. Values are per process: with
+# several workers, Prometheus scrapes (and sums) each of them.
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labels = labels
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                self._series[label_values] = series = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {key: list(series) for key, series in self._series.items()}
+        for label_values, series in sorted(snapshot.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{labels.rstrip(",")}}} {series[-2]:g}')
+            lines.append(f'{self.name}_count{{{labels.rstrip(",")}}} {series[-1]}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            snapshot = dict(self._values)
+        for label_values, value in sorted(snapshot.items()):
+            lines.append(f'{self.name}{{{_labels(self.labels, label_values).rstrip(",")}}} {value}')
+        return lines
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+def _labels(names, values):
+    """Label pairs with a trailing comma, ready to be followed by le=."""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for value in values)
+    return ''.join(f'{name}="{value}",' for name, value in zip(names, escaped))
+
+
+REQUESTS = Counter('sensors_http_requests_total', 'Requests by route, method and status.',
+                   ('route', 'method', 'status'))
+REQUEST_DURATION = Histogram('sensors_http_request_duration_seconds', 'Wall time until the response is returned.',
+                             DURATION_BUCKETS, ('route', 'method'))
+DB_QUERIES = Histogram('sensors_http_request_db_queries', 'Database queries per request.',
+                       QUERY_BUCKETS, ('route',))
+DB_DURATION = Histogram('sensors_http_request_db_duration_seconds', 'Time spent in database queries per request.',
+                        DURATION_BUCKETS, ('route',))
+SERIALIZATION_DURATION = Histogram('sensors_http_serialization_duration_seconds',
+                                   'Time spent encoding response bodies per request.',
+                                   DURATION_BUCKETS, ('route',))
+RESPONSE_SIZE = Histogram('sensors_http_response_bytes', 'Response body size (non-streaming responses).',
+                          SIZE_BUCKETS, ('route',))
+
+METRICS = (REQUESTS, REQUEST_DURATION, DB_QUERIES, DB_DURATION, SERIALIZATION_DURATION, RESPONSE_SIZE)
+
+
+def render(extra_lines=()):
+    """The Prometheus text exposition of every metric."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(extra_lines)
+    return '\n'.join(lines) + '\n'
+
+
+def reset():
+    for metric in METRICS:
+        metric.reset()
+
+
+# ===============================
+# Per-request serialization timing
+# ===============================
+
+class RequestStats:
+    """Measurements of the request being served (see middleware.PerformanceMiddleware)."""
+
+    __slots__ = ('queries', 'db_time', 'serialization_time', 'statements')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.statements = []
+
+
+current_request = ContextVar('sensors_request_stats', default=None)
+
+
+@contextmanager
+def serialization():
+    """Adds the time spent in the block to the current request's serialization time."""
+    stats = current_request.get()
+    if stats is None:
+        yield
+        return
+    began = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialization_time += time.perf_counter() - began
+
+
+class JsonResponse(DjangoJsonResponse):
+    """django.http.JsonResponse, with the JSON encoding counted as serialization time."""
+
+    def __init__(self, *args, **kwargs):
+        with serialization():
+            super().__init__(*args, **kwargs)
@@ -0,0 +1,105 @@
+import logging
+import random
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statements kept per request for the slow request log.
+MAX_LOGGED_STATEMENTS = 50
+
+
+# ===============================
+# Per-request performance instrumentation
+# ===============================
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper: adds the query to the stats of the request being served, if any."""
+    stats = metrics.current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    began = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - began
+        stats.queries += 1
+        stats.db_time += elapsed
+        if len(stats.statements) < MAX_LOGGED_STATEMENTS:
+            stats.statements.append((elapsed, sql))
+
+
+def install_query_recorder(connection):
+    """Installs record_query on a connection once (called on connection_created)."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class PerformanceMiddleware:
+    """
+    Records, for every request, the wall time, database queries and query time,
+    serialization time and response size into the histograms of metrics.py,
+    labelled by URL route. Requests slower than SENSOR_SLOW_REQUEST_SECONDS
+    are logged with their SQL (a SENSOR_SLOW_REQUEST_SAMPLE_RATE fraction of them).
+
+    Queries are counted by record_query, an execute wrapper installed on every
+    database connection, not by the DEBUG query log, so the cost per request
+    stays a few function calls per query. It finds the request's stats in a
+    context variable, which asgiref copies into the threads running sync views
+    and sync_to_async calls under ASGI (connections are per thread).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'SENSOR_SLOW_REQUEST_SECONDS', 0.5)
+        self.sample_rate = getattr(settings, 'SENSOR_SLOW_REQUEST_SAMPLE_RATE', 1.0)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        began = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter() - began)
+        return response
+
+    async def __acall__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current_request.set(stats)
+        began = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        self.record(request, response, stats, time.perf_counter() - began)
+        return response
+
+    def record(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+        metrics.REQUESTS.inc(route, request.method, response.status_code)
+        metrics.REQUEST_DURATION.observe(elapsed, route, request.method)
+        metrics.DB_QUERIES.observe(stats.queries, route)
+        metrics.DB_DURATION.observe(stats.db_time, route)
+        metrics.SERIALIZATION_DURATION.observe(stats.serialization_time, route)
+        if not response.streaming:
+            metrics.RESPONSE_SIZE.observe(len(response.content), route)
+
+        if elapsed >= self.slow_seconds and random.random() < self.sample_rate:
+            logger.warning(
+                "Slow request %s %s: %.3fs, %d queries in %.3fs, serialization %.3fs\n%s",
+                request.method, request.get_full_path(), elapsed, stats.queries, stats.db_time,
+                stats.serialization_time,
+                '\n'.join(f'  [{duration:.3f}s] {sql}' for duration, sql in stats.statements),
+            )
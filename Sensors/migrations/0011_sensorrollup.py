@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sensors', '0010_alter_sensordata_humidity_alter_sensordata_pressure_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorRollup',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('resolution', models.IntegerField(choices=[(60, '1m'), (600, '10m'), (3600, '1h'), (86400, '1d')])),
+                ('start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('temperature_sum', models.FloatField(default=0)),
+                ('temperature_min', models.FloatField(null=True)),
+                ('temperature_max', models.FloatField(null=True)),
+                ('humidity_sum', models.FloatField(default=0)),
+                ('humidity_min', models.FloatField(null=True)),
+                ('humidity_max', models.FloatField(null=True)),
+                ('pressure_sum', models.FloatField(default=0)),
+                ('pressure_min', models.FloatField(null=True)),
+                ('pressure_max', models.FloatField(null=True)),
+                ('device_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Sensors.device')),
+            ],
+            options={
+                'unique_together': {('device_id', 'resolution', 'start')},
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sensors', '0011_sensorrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sensordata',
+            index=models.Index(fields=['device_id', 'timestamp'], name='sensordata_device_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensordata',
+            index=models.Index(fields=['timestamp'], name='sensordata_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sensorrollup',
+            index=models.Index(fields=['resolution', 'start'], name='rollup_resolution_start_idx'),
+        ),
+    ]
@@ -0,0 +1,122 @@
+# Converts the SensorData measurements from DecimalField to integer hundredths.
+#
+# On SQLite every AlterField copies the whole table, so the conversion goes
+# through columns that are added, dropped and renamed in place, and only the
+# last operation rebuilds the table, once for the three columns.
+
+import Sensors.models
+from django.db import migrations, models
+
+
+METRICS = ('temperature', 'humidity', 'pressure')
+
+
+def _set_null(apps, schema_editor, names, null):
+    # SQLite applies the change to every column in the table rebuild of the
+    # next operation, other databases alter the columns one by one.
+    if schema_editor.connection.vendor == 'sqlite':
+        return
+    model = apps.get_model('Sensors', 'SensorData')
+    for name in names:
+        old_field = model._meta.get_field(name)
+        _, path, args, kwargs = old_field.deconstruct()
+        new_field = old_field.__class__(*args, **dict(kwargs, null=null))
+        new_field.set_attributes_from_name(name)
+        new_field.model = model
+        schema_editor.alter_field(model, old_field, new_field)
+
+
+def require_values(apps, schema_editor):
+    _set_null(apps, schema_editor, ('humidity', 'pressure'), null=False)
+
+
+def allow_missing_values(apps, schema_editor):
+    _set_null(apps, schema_editor, ('humidity', 'pressure'), null=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sensors', '0012_sensordata_indexes'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name='sensordata',
+                name=f'{metric}_centi',
+                field=Sensors.models.CentiUnitField(null=True),
+            )
+            for metric in METRICS
+        ],
+        # Copy in SQL: a Python loop over every reading would take hours on large tables.
+        migrations.RunSQL(
+            sql='UPDATE "Sensors_sensordata" SET ' + ', '.join(
+                f'"{metric}_centi" = CAST(ROUND("{metric}" * 100) AS INTEGER)' for metric in METRICS
+            ),
+            reverse_sql='UPDATE "Sensors_sensordata" SET ' + ', '.join(
+                f'"{metric}" = "{metric}_centi" / 100.0' for metric in METRICS
+            ),
+        ),
+        # The decimal columns are dropped as they are; when the migration is
+        # reversed they come back nullable, so they can be added without a
+        # table rebuild and filled by the copy above.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='sensordata',
+                    name='temperature',
+                    field=models.DecimalField(decimal_places=2, max_digits=6, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='sensordata',
+                    name='humidity',
+                    field=models.DecimalField(decimal_places=2, max_digits=6, null=True),
+                ),
+                migrations.AlterField(
+                    model_name='sensordata',
+                    name='pressure',
+                    field=models.DecimalField(decimal_places=2, default=0.0, max_digits=6, null=True),
+                ),
+            ],
+        ),
+        *[
+            migrations.RemoveField(
+                model_name='sensordata',
+                name=metric,
+            )
+            for metric in METRICS
+        ],
+        *[
+            migrations.RenameField(
+                model_name='sensordata',
+                old_name=f'{metric}_centi',
+                new_name=metric,
+            )
+            for metric in METRICS
+        ],
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='sensordata',
+                    name='humidity',
+                    field=Sensors.models.CentiUnitField(),
+                ),
+                migrations.AlterField(
+                    model_name='sensordata',
+                    name='pressure',
+                    field=Sensors.models.CentiUnitField(default=0.0),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(require_values, allow_missing_values),
+            ],
+        ),
+        # On SQLite the table rebuild for this field creates humidity and
+        # pressure NOT NULL as well.
+        migrations.AlterField(
+            model_name='sensordata',
+            name='temperature',
+            field=Sensors.models.CentiUnitField(),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:03
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+METRICS = ('temperature', 'humidity', 'pressure')
+RESOLUTIONS = (60, 600, 3600, 86400)
+
+
+def _bucket_start(ts, resolution):
+    return datetime.fromtimestamp(int(ts.timestamp()) // resolution * resolution, tz=dt_timezone.utc)
+
+
+def deduplicate(apps, schema_editor):
+    """
+    Keeps the first stored reading of every (device, timestamp) pair and
+    recomputes the existing rollups that counted the deleted copies.
+    """
+    SensorData = apps.get_model('Sensors', 'SensorData')
+    SensorRollup = apps.get_model('Sensors', 'SensorRollup')
+    duplicated = list(
+        SensorData.objects.values('device_id', 'timestamp')
+        .annotate(copies=Count('id'), first=Min('id'))
+        .filter(copies__gt=1)
+        .values_list('device_id', 'timestamp', 'first')
+    )
+    for device_pk, timestamp, first in duplicated:
+        SensorData.objects.filter(device_id=device_pk, timestamp=timestamp).exclude(id=first).delete()
+
+    aggregates = {'readings': Count('id')}
+    for metric in METRICS:
+        aggregates[f'{metric}_sum'] = Sum(metric)
+        aggregates[f'{metric}_min'] = Min(metric)
+        aggregates[f'{metric}_max'] = Max(metric)
+    for resolution in RESOLUTIONS:
+        buckets = {(device_pk, _bucket_start(timestamp, resolution)) for device_pk, timestamp, _ in duplicated}
+        for device_pk, start in buckets:
+            rollup = SensorRollup.objects.filter(device_id=device_pk, resolution=resolution, start=start).first()
+            if rollup is None:
+                # Buckets never rolled up are left to backfill_rollups.
+                continue
+            values = SensorData.objects.filter(
+                device_id=device_pk, timestamp__gte=start, timestamp__lt=start + timedelta(seconds=resolution)
+            ).aggregate(**aggregates)
+            rollup.count = values.pop('readings')
+            for field, value in values.items():
+                setattr(rollup, field, value)
+            rollup.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sensors', '0013_sensordata_centi_units'),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='sensordata',
+            name='sensordata_device_ts_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='sensordata',
+            constraint=models.UniqueConstraint(fields=('device_id', 'timestamp'), name='sensordata_device_ts_uniq'),
+        ),
+    ]
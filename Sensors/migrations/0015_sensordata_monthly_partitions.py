@@ -0,0 +1,91 @@
+# Partitions Sensors_sensordata by month on PostgreSQL (see Sensors/partitions.py).
+# No-op on other databases.
+
+from datetime import datetime, timezone as dt_timezone
+from django.db import migrations
+
+
+TABLE = 'Sensors_sensordata'
+OLD_TABLE = f'{TABLE}_unpartitioned'
+SEQUENCE = f'{TABLE}_id_seq'
+# Months created ahead of the current one; later ones are added by `manage.py sensor_partitions`.
+MONTHS_AHEAD = 3
+
+
+def _months(first, count):
+    month = first.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for _ in range(count):
+        following = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+        yield month, following
+        month = following
+
+
+def _add_constraints(cursor, primary_key):
+    cursor.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY ({primary_key})')
+    cursor.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "sensordata_device_ts_uniq" UNIQUE ("device_id_id", "timestamp")')
+    cursor.execute(f'CREATE INDEX "sensordata_ts_idx" ON "{TABLE}" ("timestamp")')
+    cursor.execute(f'CREATE INDEX "{TABLE}_device_id_id_idx" ON "{TABLE}" ("device_id_id")')
+    cursor.execute(
+        f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{TABLE}_device_id_id_fk" FOREIGN KEY ("device_id_id") '
+        f'REFERENCES "Sensors_device" ("id") DEFERRABLE INITIALLY DEFERRED'
+    )
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{OLD_TABLE}"')
+        # Partitioned tables cannot have identity columns before PostgreSQL 17: use a sequence.
+        cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}" RENAME TO "{SEQUENCE}_unpartitioned"')
+        cursor.execute(f'CREATE SEQUENCE "{SEQUENCE}"')
+        cursor.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{OLD_TABLE}" INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" SET DEFAULT nextval(\'"{SEQUENCE}"\')')
+
+        cursor.execute(f'SELECT MIN("timestamp") FROM "{OLD_TABLE}"')
+        now = datetime.now(dt_timezone.utc)
+        first = min(cursor.fetchone()[0] or now, now).astimezone(dt_timezone.utc)
+        months = (now.year - first.year) * 12 + now.month - first.month + 1 + MONTHS_AHEAD
+        for start, end in _months(first, months):
+            cursor.execute(
+                f'CREATE TABLE "{TABLE}_p{start:%Y_%m}" PARTITION OF "{TABLE}" '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        cursor.execute(f'CREATE TABLE "{TABLE}_default" PARTITION OF "{TABLE}" DEFAULT')
+
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{OLD_TABLE}"')
+        cursor.execute(f'SELECT setval(\'"{SEQUENCE}"\', COALESCE(MAX("id"), 0) + 1, false) FROM "{TABLE}"')
+        cursor.execute(f'DROP TABLE "{OLD_TABLE}"')
+        cursor.execute(f'ALTER SEQUENCE "{SEQUENCE}" OWNED BY "{TABLE}"."id"')
+        # The partition key must be part of every unique constraint.
+        _add_constraints(cursor, '"id", "timestamp"')
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    partitioned = f'{TABLE}_partitioned'
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{partitioned}"')
+        cursor.execute(f'CREATE TABLE "{TABLE}" (LIKE "{partitioned}")')
+        cursor.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{partitioned}"')
+        cursor.execute(f'DROP TABLE "{partitioned}" CASCADE')
+        cursor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "id" ADD GENERATED BY DEFAULT AS IDENTITY')
+        cursor.execute(
+            f'SELECT setval(pg_get_serial_sequence(\'"{TABLE}"\', \'id\'), COALESCE(MAX("id"), 0) + 1, false) '
+            f'FROM "{TABLE}"'
+        )
+        _add_constraints(cursor, '"id"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sensors', '0014_sensordata_device_ts_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:15
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sensors', '0015_sensordata_monthly_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=50)),
+                ('kind', models.CharField(choices=[('threshold', 'Value below min_value or above max_value'), ('rate', 'Change faster than max_rate per minute'), ('anomaly', 'Value more than z_score deviations away from its moving average'), ('missing', 'No reading for timeout seconds')], max_length=10)),
+                ('metric', models.CharField(blank=True, choices=[('temperature', 'temperature'), ('humidity', 'humidity'), ('pressure', 'pressure')], max_length=20)),
+                ('min_value', models.FloatField(blank=True, null=True)),
+                ('max_value', models.FloatField(blank=True, null=True)),
+                ('max_rate', models.FloatField(blank=True, null=True)),
+                ('z_score', models.FloatField(blank=True, null=True)),
+                ('timeout', models.IntegerField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('device_id', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='Sensors.device')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Alert',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('value', models.FloatField(null=True)),
+                ('message', models.CharField(max_length=200)),
+                ('triggered_at', models.DateTimeField()),
+                ('resolved_at', models.DateTimeField(blank=True, null=True)),
+                ('device_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Sensors.device')),
+                ('rule_id', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Sensors.alertrule')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['triggered_at'], name='alert_triggered_idx')],
+            },
+        ),
+    ]
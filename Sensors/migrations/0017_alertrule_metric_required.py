@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 21:23
+
+from django.db import migrations, models
+
+
+def check_rules(apps, schema_editor):
+    AlertRule = apps.get_model('Sensors', 'AlertRule')
+    invalid = AlertRule.objects.exclude(kind='missing').filter(metric='').count()
+    if invalid:
+        raise RuntimeError(
+            f"{invalid} alert rule(s) have no metric; set one (or delete them) in the admin and migrate again."
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Sensors', '0016_alerts'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_rules, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='alertrule',
+            constraint=models.CheckConstraint(check=models.Q(('kind', 'missing'), models.Q(('metric', ''), _negated=True), _connector='OR'), name='alertrule_metric_required'),
+        ),
+    ]
@@ -1,6 +1,48 @@
+from decimal import Decimal, InvalidOperation
+from django import forms
+from django.core import exceptions
 from django.db import models
 from django.utils import timezone
 
+
+class CentiUnitField(models.IntegerField):
+    """
+    Measurement with two decimals stored as an integer number of hundredths
+    (24.57 is stored as 2457). Python values are floats, so reads and
+    aggregations work on native numbers instead of Decimal.
+    """
+    description = "Two-decimal measurement stored in hundredths"
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else value / 100
+
+    def to_python(self, value):
+        if value is None or isinstance(value, float):
+            return value
+        try:
+            return round(float(value), 2)
+        except (TypeError, ValueError):
+            raise exceptions.ValidationError(
+                self.error_messages['invalid'], code='invalid', params={'value': value}
+            )
+
+    def get_prep_value(self, value):
+        value = models.Field.get_prep_value(self, value)
+        if value is None or hasattr(value, 'resolve_expression'):
+            return value
+        try:
+            return round(Decimal(str(value)) * 100)
+        except (InvalidOperation, ValueError, OverflowError) as e:
+            raise ValueError(f"Field '{self.name}' expected a number but got {value!r}.") from e
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'decimal_places': 2,
+            **kwargs,
+        })
+
+
 class User(models.Model):
     id         = models.AutoField(primary_key=True)
     username   = models.CharField(max_length=50)
@@ -24,10 +66,124 @@ class Device(models.Model):
 class SensorData(models.Model):
     id          = models.AutoField(primary_key=True)
     timestamp   = models.DateTimeField(default=timezone.now, blank=True)
-    temperature = models.DecimalField(max_digits=6, decimal_places=2)
-    humidity    = models.DecimalField(max_digits=6, decimal_places=2)
-    pressure    = models.DecimalField(max_digits=6, decimal_places=2, default=0.0)
+    temperature = CentiUnitField()
+    humidity    = CentiUnitField()
+    pressure    = CentiUnitField(default=0.0)
     device_id   = models.ForeignKey(Device, on_delete=models.CASCADE, default=1)
 
+    class Meta:
+        constraints = [
+            # One reading per device and instant: resent device batches are
+            # deduplicated. Its index also serves per-device history and
+            # latest values (either timestamp direction).
+            models.UniqueConstraint(fields=['device_id', 'timestamp'], name='sensordata_device_ts_uniq'),
+        ]
+        indexes = [
+            # Time-range scans across all devices.
+            models.Index(fields=['timestamp'], name='sensordata_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp}: Temp={self.temperature}°C, Humidity={self.humidity}%, Pressure={self.pressure} hPa"
+
+class SensorRollup(models.Model):
+    """
+    Pre-aggregated readings of one device over one time bucket. Rows are kept
+    up to date on ingest (see rollups.py) and can be rebuilt from SensorData
+    with the backfill_rollups management command.
+    """
+    RESOLUTION_CHOICES = [
+        (60, '1m'),
+        (600, '10m'),
+        (3600, '1h'),
+        (86400, '1d'),
+    ]
+
+    id              = models.AutoField(primary_key=True)
+    device_id       = models.ForeignKey(Device, on_delete=models.CASCADE)
+    resolution      = models.IntegerField(choices=RESOLUTION_CHOICES)  # Bucket width in seconds.
+    start           = models.DateTimeField()                           # Bucket start.
+    count           = models.IntegerField(default=0)
+    temperature_sum = models.FloatField(default=0)
+    temperature_min = models.FloatField(null=True)
+    temperature_max = models.FloatField(null=True)
+    humidity_sum    = models.FloatField(default=0)
+    humidity_min    = models.FloatField(null=True)
+    humidity_max    = models.FloatField(null=True)
+    pressure_sum    = models.FloatField(default=0)
+    pressure_min    = models.FloatField(null=True)
+    pressure_max    = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = ('device_id', 'resolution', 'start')
+        indexes = [
+            # Time-range reads across all devices.
+            models.Index(fields=['resolution', 'start'], name='rollup_resolution_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.start} ({self.get_resolution_display()}): device {self.device_id_id} | {self.count} readings"
+
+
+class AlertRule(models.Model):
+    """
+    Condition checked on every stored reading of one device or, without a
+    device, of all of them (see alerts.py). Only the fields of its kind are used.
+    """
+    KIND_CHOICES = [
+        ('threshold', 'Value below min_value or above max_value'),
+        ('rate', 'Change faster than max_rate per minute'),
+        ('anomaly', 'Value more than z_score deviations away from its moving average'),
+        ('missing', 'No reading for timeout seconds'),
+    ]
+    METRIC_CHOICES = [
+        ('temperature', 'temperature'),
+        ('humidity', 'humidity'),
+        ('pressure', 'pressure'),
+    ]
+
+    id        = models.AutoField(primary_key=True)
+    name      = models.CharField(max_length=50)
+    device_id = models.ForeignKey(Device, on_delete=models.CASCADE, null=True, blank=True)  # None: every device.
+    kind      = models.CharField(max_length=10, choices=KIND_CHOICES)
+    metric    = models.CharField(max_length=20, choices=METRIC_CHOICES, blank=True)     # Unused by 'missing'.
+    min_value = models.FloatField(null=True, blank=True)
+    max_value = models.FloatField(null=True, blank=True)
+    max_rate  = models.FloatField(null=True, blank=True)                                 # Units per minute.
+    z_score   = models.FloatField(null=True, blank=True)
+    timeout   = models.IntegerField(null=True, blank=True)                               # Seconds.
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            # Every kind but 'missing' is evaluated on the rule's metric.
+            models.CheckConstraint(check=models.Q(kind='missing') | ~models.Q(metric=''),
+                                   name='alertrule_metric_required'),
+        ]
+
+    def clean(self):
+        if self.kind != 'missing' and not self.metric:
+            raise exceptions.ValidationError({'metric': f"A {self.kind} rule needs a metric."})
+
+    def __str__(self):
+        return f"{self.name} ({self.kind} {self.metric})".strip()
+
+
+class Alert(models.Model):
+    """A firing of an AlertRule for one device, open until resolved_at is set."""
+    id           = models.AutoField(primary_key=True)
+    rule_id      = models.ForeignKey(AlertRule, on_delete=models.CASCADE)
+    device_id    = models.ForeignKey(Device, on_delete=models.CASCADE)
+    value        = models.FloatField(null=True)   # Offending value, or seconds without readings.
+    message      = models.CharField(max_length=200)
+    triggered_at = models.DateTimeField()
+    resolved_at  = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Newest alerts first, for api/get/alerts.
+            models.Index(fields=['triggered_at'], name='alert_triggered_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.timestamp}: Temp={self.temperature}°C, Humidity={self.humidity}%, Pressure={self.pressure} hPa"
\ No newline at end of file
+        return f"{self.triggered_at}: {self.message}"
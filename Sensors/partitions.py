@@ -0,0 +1,136 @@
+import re
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, transaction
+from .models import SensorData
+
+
+# ===============================
+# Monthly partitions of SensorData (PostgreSQL)
+# ===============================
+#
+# On PostgreSQL, migration 0015 turns Sensors_sensordata into a table
+# partitioned by month on "timestamp" (declarative partitioning), plus a
+# DEFAULT partition catching rows outside the created months. The planner only
+# scans the partitions overlapping the timestamp range of a query, which every
+# range read (interval, engine, backfills) filters on. Expired months are
+# dropped as whole tables. Other databases keep the plain table.
+
+TABLE = SensorData._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+
+_PARTITION_NAME = re.compile(rf'^{re.escape(TABLE)}_p(\d{{4}})_(\d{{2}})$')
+
+
+def supported():
+    return connection.vendor == 'postgresql'
+
+
+def month_start(ts):
+    return ts.astimezone(dt_timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(start):
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def month_starts(first, last):
+    """Start of every month from the one holding `first` to the one holding `last`."""
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = next_month(month)
+
+
+def partition_name(start):
+    return f'{TABLE}_p{start:%Y_%m}'
+
+
+def partitions():
+    """(name, start, end) of the monthly partitions, oldest first. The DEFAULT partition is left out."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE parent.relname = %s',
+            [TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    found = []
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+            found.append((name, start, next_month(start)))
+    return sorted(found, key=lambda partition: partition[1])
+
+
+def partitions_for_range(start_time, end_time):
+    """Names of the partitions a [start_time, end_time] query reads (plus the DEFAULT partition)."""
+    overlapping = [name for name, start, end in partitions() if start <= end_time and end > start_time]
+    return overlapping + [DEFAULT_PARTITION]
+
+
+def create_partition(start):
+    """
+    Creates the partition of the month beginning at `start`. Rows of that
+    month already stored in the DEFAULT partition are moved into it.
+    Returns False if it already exists.
+    """
+    name = partition_name(start)
+    if any(existing == name for existing, _, _ in partitions()):
+        return False
+    end = next_month(start)
+    bounds = f"FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+            f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            [start, end]
+        )
+        cursor.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES {bounds}')
+    return True
+
+
+def ensure_partitions(now, months_ahead=3):
+    """Creates the partitions of the current month and the next `months_ahead` ones. Returns the created names."""
+    created = []
+    month = month_start(now)
+    for _ in range(months_ahead + 1):
+        if create_partition(month):
+            created.append(partition_name(month))
+        month = next_month(month)
+    return created
+
+
+def drop_partitions_before(cutoff):
+    """
+    Drops the monthly partitions holding only readings older than `cutoff`.
+    Returns (rows, bytes) removed.
+    """
+    rows = size = 0
+    for name, start, end in partitions():
+        if end > cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*), pg_total_relation_size(%s) FROM "{name}"', [f'"{name}"'])
+            count, bytes_used = cursor.fetchone()
+            cursor.execute(f'ALTER TABLE "{TABLE}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+        rows += count
+        size += bytes_used
+    return rows, size
+
+
+def partition_stats():
+    """(name, estimated rows, bytes) of every partition, DEFAULT included."""
+    names = [name for name, _, _ in partitions()] + [DEFAULT_PARTITION]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT relname, reltuples::bigint, pg_total_relation_size(oid) FROM pg_class WHERE relname = ANY(%s)',
+            [names]
+        )
+        stats = {name: (rows, size) for name, rows, size in cursor.fetchall()}
+    return [(name,) + stats.get(name, (0, 0)) for name in names]
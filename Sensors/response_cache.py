@@ -0,0 +1,169 @@
+import hashlib
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+from .models import Device
+from .aggregation import parse_bucket_minutes
+from .device_cache import get_device
+from .routers import replica_snapshot
+
+
+# ===============================
+# Response cache for the chart / history endpoints
+# ===============================
+#
+# Cache keys embed a per-device version number that is bumped whenever a new
+# reading of that device is stored, so invalidation never has to enumerate
+# keys. Requests that are not filtered by device use the fleet-wide version.
+# With a snapshot replica the keys also embed the snapshot, so a response
+# computed before the replica caught up with a reading is not served once it has.
+# The cache must be shared between workers (CACHES setting) for ingest in one
+# process to invalidate responses cached by another.
+
+ALL_DEVICES = 'all'
+
+
+def response_ttl():
+    return getattr(settings, 'SENSOR_CACHE_TTL', 60)
+
+
+def closed_buckets_ttl():
+    return getattr(settings, 'SENSOR_CLOSED_BUCKETS_TTL', 3600)
+
+
+def _version_key(device_key):
+    return f'sensors:version:{device_key}'
+
+
+def _history_key(device_key):
+    return f'sensors:history:{device_key}'
+
+
+def device_version(device_key):
+    return cache.get(_version_key(device_key), 0)
+
+
+def history_version(device_key):
+    """Version of a device's past (closed) buckets, see invalidate_history."""
+    return cache.get(_history_key(device_key), 0)
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def invalidate_devices(device_pks):
+    """Invalidates every cached response of these devices (called on ingest)."""
+    for device_pk in set(device_pks):
+        _bump(_version_key(device_pk))
+    _bump(_version_key(ALL_DEVICES))
+
+
+def invalidate_history(device_pks):
+    """
+    Invalidates the cached closed buckets of these devices (cached_rows), for
+    readings stored into the past: late uploads, edits, pruning.
+    """
+    for device_pk in set(device_pks):
+        _bump(_history_key(device_pk))
+    _bump(_history_key(ALL_DEVICES))
+
+
+def invalidate_readings(readings):
+    """
+    Called once readings are stored: invalidates their devices' responses and,
+    for readings older than the current minute (which is always inside the
+    open bucket, whatever the bucket width), their closed buckets as well.
+    """
+    readings = list(readings)
+    invalidate_devices(reading.device_id_id for reading in readings)
+    current_minute = int(time.time()) // 60 * 60
+    late = [reading.device_id_id for reading in readings if reading.timestamp.timestamp() < current_minute]
+    if late:
+        invalidate_history(late)
+
+
+def _hash(*parts):
+    return hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+
+
+def cached_rows(key_parts, compute):
+    """
+    Returns compute() (a list of bucket rows), cached under key_parts. Used for
+    closed buckets, which do not change once their interval is over: the key
+    holds the range itself, so it needs no invalidation on ingest of new
+    readings. key_parts should include the history_version of the devices, so
+    late readings are picked up.
+    """
+    key = 'sensors:rows:' + _hash(*key_parts)
+    rows = cache.get(key)
+    if rows is None:
+        rows = list(compute())
+        cache.set(key, rows, closed_buckets_ttl())
+    return rows
+
+
+def _device_key(request, device_param):
+    # Endpoints spanning several devices (device_param None) use the fleet-wide version.
+    value = request.GET.get(device_param) if device_param else None
+    if not value:
+        return ALL_DEVICES
+    if device_param == 'mac_address':
+        try:
+            return get_device(value).pk
+        except (Device.DoesNotExist, Device.MultipleObjectsReturned):
+            return ALL_DEVICES
+    return value
+
+
+def cache_response(endpoint, device_param, windowed=True):
+    """
+    Caches successful GET responses of a view, keyed by endpoint, device (the
+    `device_param` query parameter), the device's ingest version, the replica
+    snapshot, the current bucket window (when `windowed`) and the query string. Responses carry an
+    ETag derived from that key, and a matching If-None-Match gets a 304.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+
+            window = None
+            if windowed:
+                try:
+                    bucket_seconds = parse_bucket_minutes(request.GET.get('bucket')) * 60
+                except ValueError:
+                    return view(request, *args, **kwargs)
+                window = int(time.time()) // bucket_seconds
+
+            device_key = _device_key(request, device_param)
+            digest = _hash(endpoint, device_key, device_version(device_key), replica_snapshot(), window,
+                           sorted(request.GET.lists()))
+            etag = quote_etag(digest)
+
+            if etag in parse_etags(request.headers.get('If-None-Match', '')):
+                response = HttpResponseNotModified()
+                response['ETag'] = etag
+                return response
+
+            key = f'sensors:response:{endpoint}:{digest}'
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                response = HttpResponse(content, content_type=content_type)
+            else:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming:
+                    return response
+                cache.set(key, (response.content, response['Content-Type']), response_ttl())
+            response['ETag'] = etag
+            return response
+        return wrapper
+    return decorator
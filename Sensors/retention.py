@@ -0,0 +1,172 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Min
+from .models import Device, SensorData, SensorRollup
+from . import archive, partitions
+from .response_cache import invalidate_devices, invalidate_history
+from .rollups import RESOLUTIONS, backfill
+
+
+# ===============================
+# Retention and downsampling of sensor history
+# ===============================
+
+# Days to keep, per storage tier; None keeps the tier forever.
+DEFAULT_RETENTION_DAYS = {
+    'raw': 7,
+    '1m': 30,
+    '10m': 90,
+    '1h': None,
+    '1d': None,
+}
+
+
+def retention_policy():
+    """Returns the {tier: days or None} policy, tiers being 'raw' and the rollup resolutions."""
+    policy = dict(DEFAULT_RETENTION_DAYS)
+    policy.update(getattr(settings, 'SENSOR_RETENTION_DAYS', {}))
+    return policy
+
+
+def cutoff(days, now):
+    """
+    Start of the day `days` days before now. Cutoffs are aligned on whole days,
+    so no bucket of any resolution is ever split by a prune.
+    """
+    day = now.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return day - timedelta(days=days)
+
+
+def raw_floor(now=None):
+    """
+    Start of the readings still complete in SensorData: the later of the raw
+    retention cutoff and the archive watermark, or None if neither applies.
+    Rollups of older buckets cannot be recomputed from SensorData.
+    """
+    floors = [archive.archived_until()]
+    days = retention_policy().get('raw')
+    if days is not None:
+        floors.append(cutoff(days, now or datetime.now(dt_timezone.utc)))
+    return max((floor for floor in floors if floor is not None), default=None)
+
+
+def downsample(raw_cutoff, policy):
+    """
+    Rebuilds, from the raw rows about to expire, the rollups of every
+    resolution kept longer than the raw rows, one day per transaction.
+    Rollups are maintained on ingest; this makes sure readings stored by other
+    means (imports, edits) are not lost with the raw rows.
+    Returns the number of rollup rows written.
+    """
+    raw_days = policy['raw']
+    resolutions = [
+        RESOLUTIONS[label] for label in RESOLUTIONS
+        if policy.get(label) is None or policy[label] > raw_days
+    ]
+    oldest = SensorData.objects.filter(timestamp__lt=raw_cutoff).aggregate(oldest=Min('timestamp'))['oldest']
+    if oldest is None or not resolutions:
+        return 0
+
+    written = 0
+    day = oldest.astimezone(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    archived_until = archive.archived_until()
+    if archived_until is not None:
+        # The raw rows of archived days are gone from SensorData: keep their rollups.
+        day = max(day, archived_until)
+    while day < raw_cutoff:
+        next_day = day + timedelta(days=1)
+        readings = SensorData.objects.filter(timestamp__gte=day, timestamp__lt=next_day)
+        with transaction.atomic():
+            for resolution in resolutions:
+                SensorRollup.objects.filter(resolution=resolution, start__gte=day, start__lt=next_day).delete()
+                written += backfill(resolution, readings)
+        day = next_day
+    return written
+
+
+def delete_in_batches(queryset, batch_size=5000, pause=0.0):
+    """
+    Deletes the rows of `queryset` oldest first, `batch_size` rows per
+    statement (each in its own transaction), so the write lock is only held
+    briefly and ingest can proceed in between. Returns the number of rows deleted.
+    No delete signals are sent: expired readings must not be removed from the
+    rollups that outlive them.
+    """
+    model = queryset.model
+    order = 'timestamp' if model is SensorData else 'start'
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by(order).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        batch = model.objects.filter(id__in=ids)
+        count = batch._raw_delete(batch.db)
+        deleted += count
+        if pause:
+            time.sleep(pause)
+
+
+def free_bytes():
+    """
+    Unused space inside the SQLite database file (free pages), or None on other
+    databases. The growth of this value is what a prune reclaimed; VACUUM
+    returns it to the filesystem.
+    """
+    if connection.vendor != 'sqlite':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA freelist_count')
+        free_pages = cursor.fetchone()[0]
+        cursor.execute('PRAGMA page_size')
+        page_size = cursor.fetchone()[0]
+    return free_pages * page_size
+
+
+def apply_policy(now=None, batch_size=5000, pause=0.0, downsample_raw=True, dry_run=False):
+    """
+    Applies the retention policy once. Returns a report:
+    {"downsampled": rollup rows written, "deleted": {tier: rows}, "reclaimed_bytes": int or None}
+    On PostgreSQL, months of raw readings that are entirely expired are
+    dropped as whole partitions; only the rest is deleted row by row.
+    """
+    now = now or datetime.now(dt_timezone.utc)
+    policy = retention_policy()
+    report = {'downsampled': 0, 'deleted': {}, 'reclaimed_bytes': None}
+    free_before = free_bytes()
+    dropped_bytes = 0
+
+    tiers = [('raw', SensorData.objects.all(), 'timestamp')] + [
+        (label, SensorRollup.objects.filter(resolution=resolution), 'start')
+        for label, resolution in RESOLUTIONS.items()
+    ]
+    for tier, queryset, field in tiers:
+        days = policy.get(tier)
+        if days is None:
+            continue
+        tier_cutoff = cutoff(days, now)
+        expiring = queryset.filter(**{f'{field}__lt': tier_cutoff})
+        if dry_run:
+            report['deleted'][tier] = expiring.count()
+            continue
+        dropped_rows = 0
+        if tier == 'raw':
+            if downsample_raw:
+                report['downsampled'] = downsample(tier_cutoff, policy)
+            if partitions.supported():
+                dropped_rows, dropped_bytes = partitions.drop_partitions_before(tier_cutoff)
+        report['deleted'][tier] = dropped_rows + delete_in_batches(expiring, batch_size=batch_size, pause=pause)
+
+    if not dry_run and any(report['deleted'].values()):
+        # Cached chart responses may include buckets that no longer exist.
+        device_pks = list(Device.objects.values_list('pk', flat=True))
+        invalidate_devices(device_pks)
+        invalidate_history(device_pks)
+
+    free_after = free_bytes()
+    if free_before is not None and not dry_run:
+        report['reclaimed_bytes'] = max(free_after - free_before, 0)
+    elif dropped_bytes:
+        report['reclaimed_bytes'] = dropped_bytes
+    return report
@@ -0,0 +1,245 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F, FloatField, Max, Min, Sum, Value
+from django.db.models.functions import Greatest, Least
+from .models import SensorData, SensorRollup
+from .aggregation import METRICS, EpochBucket
+from .response_cache import ALL_DEVICES, cached_rows, history_version
+from .routers import replica_snapshot
+
+
+# ===============================
+# Rollups (pre-aggregated buckets) maintained on ingest
+# ===============================
+
+RESOLUTIONS = {label: seconds for seconds, label in SensorRollup.RESOLUTION_CHOICES}
+
+
+def bucket_start(ts, resolution):
+    """Floors an aware datetime to the start of its `resolution`-second bucket."""
+    epoch = int(ts.timestamp()) // resolution * resolution
+    return datetime.fromtimestamp(epoch, tz=dt_timezone.utc)
+
+
+def pick_resolution(bucket_seconds):
+    """
+    Returns the coarsest rollup resolution that evenly divides the requested
+    bucket width, or None if no rollup can serve it.
+    """
+    for resolution in sorted(RESOLUTIONS.values(), reverse=True):
+        if bucket_seconds % resolution == 0:
+            return resolution
+    return None
+
+
+def pick_range_resolution(start_time, end_time, max_points):
+    """
+    Returns the finest rollup resolution that keeps a range under max_points
+    buckets per device (the coarsest one for very long ranges).
+    """
+    span = (end_time - start_time).total_seconds()
+    resolutions = sorted(RESOLUTIONS.values())
+    for resolution in resolutions:
+        if span / resolution <= max_points:
+            return resolution
+    return resolutions[-1]
+
+
+def _partials(readings):
+    """Merges readings per (device, resolution, bucket) into count, sum, min and max partials."""
+    partials = {}
+    for reading in readings:
+        values = {metric: float(getattr(reading, metric)) for metric in METRICS}
+        for resolution in RESOLUTIONS.values():
+            key = (reading.device_id_id, resolution, bucket_start(reading.timestamp, resolution))
+            partial = partials.get(key)
+            if partial is None:
+                partials[key] = partial = {'count': 0}
+                for metric in METRICS:
+                    partial[f'{metric}_sum'] = 0.0
+                    partial[f'{metric}_min'] = values[metric]
+                    partial[f'{metric}_max'] = values[metric]
+            partial['count'] += 1
+            for metric in METRICS:
+                partial[f'{metric}_sum'] += values[metric]
+                partial[f'{metric}_min'] = min(partial[f'{metric}_min'], values[metric])
+                partial[f'{metric}_max'] = max(partial[f'{metric}_max'], values[metric])
+    return partials
+
+
+def apply_readings(readings):
+    """
+    Folds newly stored SensorData objects into the rollups of every resolution.
+    Readings falling into the same bucket are merged first, so a batch costs
+    one upsert per (device, resolution, bucket) rather than per reading.
+    """
+    for (device_pk, resolution, start), partial in _partials(readings).items():
+        _upsert(device_pk, resolution, start, partial)
+
+
+def _upsert(device_pk, resolution, start, partial):
+    rollups = SensorRollup.objects.filter(device_id_id=device_pk, resolution=resolution, start=start)
+    changes = {'count': F('count') + partial['count']}
+    for metric in METRICS:
+        changes[f'{metric}_sum'] = F(f'{metric}_sum') + partial[f'{metric}_sum']
+        changes[f'{metric}_min'] = Least(f'{metric}_min', Value(partial[f'{metric}_min'], output_field=FloatField()))
+        changes[f'{metric}_max'] = Greatest(f'{metric}_max', Value(partial[f'{metric}_max'], output_field=FloatField()))
+    if rollups.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            SensorRollup.objects.create(device_id_id=device_pk, resolution=resolution, start=start, **partial)
+    except IntegrityError:
+        # Another writer created the bucket in the meantime.
+        rollups.update(**changes)
+
+
+def _subtract(device_pk, resolution, start, partial):
+    rollups = SensorRollup.objects.filter(device_id_id=device_pk, resolution=resolution, start=start)
+    changes = {'count': F('count') - partial['count']}
+    for metric in METRICS:
+        changes[f'{metric}_sum'] = F(f'{metric}_sum') - partial[f'{metric}_sum']
+    rollups.update(**changes)
+    rollups.filter(count__lte=0).delete()
+
+
+def amend(removed, added, floor=None):
+    """
+    Updates the rollups after stored readings are edited or deleted: `removed`
+    holds the SensorData objects as they were stored, `added` as they are now.
+    Buckets starting at or after `floor` (see retention.raw_floor) are
+    recomputed from SensorData. Older buckets may have lost their raw rows to
+    retention or the archive, so the readings are subtracted and added
+    instead; their min and max can then only widen.
+    """
+    removed = _partials(removed)
+    added = _partials(added)
+    for key in removed.keys() | added.keys():
+        device_pk, resolution, start = key
+        if floor is None or start >= floor:
+            SensorRollup.objects.filter(device_id_id=device_pk, resolution=resolution, start=start).delete()
+            readings = SensorData.objects.filter(
+                device_id_id=device_pk,
+                timestamp__gte=start,
+                timestamp__lt=start + timedelta(seconds=resolution),
+            )
+            backfill(resolution, readings)
+            continue
+        if key in removed:
+            _subtract(device_pk, resolution, start, removed[key])
+        if key in added:
+            _upsert(device_pk, resolution, start, added[key])
+
+
+def backfill(resolution, readings, batch_size=1000):
+    """
+    Creates the rollups of `resolution` for a SensorData queryset with one
+    GROUP BY query. Existing rollups for the same buckets must be deleted first.
+    Returns the number of rollup rows created.
+    """
+    aggregates = {'n': Count('id')}
+    for metric in METRICS:
+        aggregates[f'{metric}_total'] = Sum(metric)
+        aggregates[f'{metric}_low'] = Min(metric)
+        aggregates[f'{metric}_high'] = Max(metric)
+    rows = (
+        readings
+        .annotate(bucket=EpochBucket('timestamp', resolution))
+        .values('device_id', 'bucket')
+        .annotate(**aggregates)
+        .order_by()
+    )
+
+    created = 0
+    batch = []
+    for row in rows.iterator():
+        rollup = SensorRollup(
+            device_id_id=row['device_id'],
+            resolution=resolution,
+            start=datetime.fromtimestamp(row['bucket'], tz=dt_timezone.utc),
+            count=row['n'],
+        )
+        for metric in METRICS:
+            setattr(rollup, f'{metric}_sum', float(row[f'{metric}_total']))
+            setattr(rollup, f'{metric}_min', float(row[f'{metric}_low']))
+            setattr(rollup, f'{metric}_max', float(row[f'{metric}_high']))
+        batch.append(rollup)
+        if len(batch) >= batch_size:
+            SensorRollup.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    if batch:
+        SensorRollup.objects.bulk_create(batch)
+        created += len(batch)
+    return created
+
+
+def rollup_bucket_rows(rollups, resolution, bucket_seconds, per_device=True):
+    """
+    Re-buckets rollups of one resolution into `bucket_seconds` buckets and
+    returns one row per bucket (and per device if per_device is True) with
+    keys device_id, bucket (epoch seconds), count and <metric>_avg/_min/_max,
+    ordered by device then bucket.
+    """
+    group_by = ['device_id', 'bucket'] if per_device else ['bucket']
+    aggregates = {'n': Sum('count')}
+    for metric in METRICS:
+        aggregates[f'{metric}_total'] = Sum(f'{metric}_sum')
+        aggregates[f'{metric}_low'] = Min(f'{metric}_min')
+        aggregates[f'{metric}_high'] = Max(f'{metric}_max')
+    grouped = (
+        rollups
+        .filter(resolution=resolution)
+        .annotate(bucket=EpochBucket('start', bucket_seconds))
+        .values(*group_by)
+        .annotate(**aggregates)
+        .order_by(*group_by)
+    )
+    for row in grouped:
+        result = {'bucket': row['bucket'], 'count': row['n']}
+        if per_device:
+            result['device_id'] = row['device_id']
+        for metric in METRICS:
+            result[f'{metric}_avg'] = row[f'{metric}_total'] / row['n'] if row['n'] else None
+            result[f'{metric}_min'] = row[f'{metric}_low']
+            result[f'{metric}_max'] = row[f'{metric}_high']
+        yield result
+
+
+def bucketed_rows(start_time, end_time, bucket_minutes, per_device=True, **device_filter):
+    """
+    Chart data for a time range, read from the coarsest rollup that fits the
+    requested bucket width. device_filter is applied to the rollups (e.g.
+    device_id__id=3). Returns rows shaped like rollup_bucket_rows.
+    Closed buckets are read from the read database and cached (see
+    response_cache.cached_rows) per replica snapshot, so the ones computed
+    before a lagging replica caught up are recomputed on its next refresh.
+    Only the still-open last bucket is read on every call, from the primary,
+    where its newest readings are.
+    """
+    bucket_seconds = bucket_minutes * 60
+    resolution = pick_resolution(bucket_seconds)
+    range_start = bucket_start(start_time, bucket_seconds)
+    open_start = bucket_start(end_time, bucket_seconds)
+    rollups = SensorRollup.objects.filter(**device_filter)
+
+    # Late readings of the device (or of any device, without an id filter) expire the closed buckets.
+    history = history_version(device_filter.get('device_id__id', ALL_DEVICES))
+    closed = cached_rows(
+        ('closed', history, replica_snapshot(), per_device, sorted(device_filter.items()), bucket_seconds,
+         range_start, open_start),
+        lambda: rollup_bucket_rows(
+            rollups.filter(start__gte=range_start, start__lt=open_start),
+            resolution, bucket_seconds, per_device=per_device
+        )
+    )
+    current = list(rollup_bucket_rows(
+        rollups.using(router.db_for_write(SensorRollup)).filter(
+            start__gte=max(range_start, open_start), start__lte=end_time
+        ),
+        resolution, bucket_seconds, per_device=per_device
+    ))
+    rows = closed + current
+    if per_device:
+        rows.sort(key=lambda row: (row['device_id'], row['bucket']))
+    return rows
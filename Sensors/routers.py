@@ -0,0 +1,72 @@
+import os
+from contextvars import ContextVar
+from functools import wraps
+from django.conf import settings
+from django.db import connections
+
+
+# ===============================
+# Read replica routing for the aggregation / history endpoints
+# ===============================
+#
+# Only views decorated with @read_replica read from SENSOR_READ_DATABASE; the
+# ingest path (device lookups, rollup upserts) keeps reading the primary, where
+# it writes. Writes always go to the primary.
+
+_use_read_database = ContextVar('sensors_use_read_database', default=False)
+
+
+def read_database():
+    """Alias of the database analytics reads are sent to ('default' if no replica is configured)."""
+    return getattr(settings, 'SENSOR_READ_DATABASE', 'default')
+
+
+def replica_snapshot():
+    """
+    Identifies the copy of the data the read database currently holds: the
+    modification time (ns) of the snapshot file written by snapshot_replica.
+    None when reads see the primary's own data (no replica, or a read-only
+    connection to the primary).
+    """
+    alias = read_database()
+    if alias == 'default':
+        return None
+    name = str(connections[alias].settings_dict['NAME'])
+    if name.startswith('file:'):
+        return None
+    try:
+        return os.stat(name).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def read_replica(view):
+    """Sends the ORM reads made while the view runs to the read database."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _use_read_database.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_read_database.reset(token)
+    return wrapper
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_read_database.get():
+            return read_database()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica is a copy of the primary, never migrated on its own.
+        if db != 'default' and db == read_database():
+            return False
+        return None
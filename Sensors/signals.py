@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .models import Alert, AlertRule, SensorData, User, Device
+from .alerts import alert_engine
+from .device_cache import device_cache
+from .retention import raw_floor
+from .rollups import amend, apply_readings
+from .response_cache import invalidate_history, invalidate_readings
+from .live import broker
+from .middleware import install_query_recorder
+
+
+# Keep the device registry in sync with admin and API edits.
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+def invalidate_cached_device(sender, instance, **kwargs):
+    device_cache.invalidate_device(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_default_user(sender, instance, **kwargs):
+    device_cache.invalidate_default_user()
+
+
+# Keep the rollups, cached responses, live feed and alerts in sync with readings
+# saved or deleted one by one (sensor_data_post, admin).
+# Bulk inserts call apply_readings / invalidate_readings / publish / evaluate themselves.
+@receiver(pre_save, sender=SensorData)
+def remember_stored_reading(sender, instance, **kwargs):
+    # The rollups of an edited reading are updated from its stored version,
+    # which may be in another bucket or device.
+    if instance.pk is not None and not kwargs.get('raw'):
+        instance._stored = SensorData.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=SensorData)
+def reading_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_readings([instance])
+        broker.publish([instance])
+        alert_engine.evaluate([instance])
+    else:
+        stored = getattr(instance, '_stored', None)
+        amend([stored] if stored is not None else [], [instance], floor=raw_floor())
+        if stored is not None and (stored.device_id_id != instance.device_id_id
+                                   or stored.timestamp != instance.timestamp):
+            invalidate_history([stored.device_id_id])
+    invalidate_readings([instance])
+
+
+# Retention and the archive delete readings without signals: their rollups stay.
+@receiver(post_delete, sender=SensorData)
+def reading_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Device):
+        # Deleted with their device, whose rollups go too.
+        return
+    amend([instance], [], floor=raw_floor())
+    invalidate_readings([instance])
+
+
+# Rules and open alerts are cached by the alert engine.
+@receiver(post_save, sender=AlertRule)
+@receiver(post_delete, sender=AlertRule)
+@receiver(post_save, sender=Alert)
+@receiver(post_delete, sender=Alert)
+def invalidate_alert_rules(sender, instance, **kwargs):
+    alert_engine.invalidate()
+
+
+# Per-request query counts (PerformanceMiddleware), whichever thread runs the queries.
+@receiver(connection_created)
+def record_request_queries(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+# Per-connection SQLite tuning (SQLITE_PRAGMAS, set by the production profile).
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if name == 'journal_mode' and 'mode=ro' in str(connection.settings_dict['NAME']):
+                # Read-only connections cannot switch the journal; the primary sets it.
+                continue
+            cursor.execute(f'PRAGMA {name} = {value}')
@@ -1 +1,13 @@
- 
\ No newline at end of file
+// Live readings pushed by the server (api/get/data/stream) instead of polling
+// api/get/data/latest. deviceIds is an optional array of device ids to follow.
+function subscribeReadings(deviceIds, onReading) {
+    let url = '/api/get/data/stream';
+    if (deviceIds && deviceIds.length) {
+        url += '?id=' + deviceIds.join(',');
+    }
+    const source = new EventSource(url);
+    source.addEventListener('reading', function (event) {
+        onReading(JSON.parse(event.data));
+    });
+    return source;
+}
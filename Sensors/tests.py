@@ -1,3 +1,1130 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import math
+import re
+import struct
+import tempfile
+import time
+import unittest
+from unittest import mock
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, router, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count, Max, Min
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from .models import Alert, AlertRule, SensorData, SensorRollup, User, Device
+from .aggregation import METRICS, lttb, minmax, pack_columns
+from . import archive, engine, metrics, partitions, rollups
+from .retention import apply_policy, cutoff
+from .rollups import RESOLUTIONS, backfill
+from .routers import read_replica
+from .line_protocol import parse_line, parse_lines
+from .alerts import AlertEngine, alert_engine
+from .device_cache import DeviceCache, device_cache, get_device
+from .ingest import resolve_devices, store_readings
+from .write_buffer import WriteBuffer
+from .live import Broker, broker, reading_event
 
-# Create your tests here.
+
+@unittest.skipUnless(connection.vendor == 'sqlite', "EXPLAIN QUERY PLAN output is SQLite specific")
+class QueryPlanTests(TestCase):
+    """
+    The read endpoints must be served by the SensorData / SensorRollup indexes.
+    A plain "SCAN <table>" in the plan means a full table scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create(username='owner', password='secret')
+        cls.device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        cls.now = timezone.now()
+
+    def assertNoFullScan(self, queryset):
+        plan = queryset.explain()
+        table = queryset.model._meta.db_table
+        full_scans = re.findall(rf'SCAN {table}\b(?! USING)', plan)
+        self.assertFalse(full_scans, f"Full table scan on {table}:\n{plan}")
+
+    def test_latest_values_per_device(self):
+        # device_latest_value, sensor_data_last_seven
+        self.assertNoFullScan(SensorData.objects.filter(device_id=self.device).order_by('-timestamp')[:7])
+
+    def test_time_range(self):
+        # sensor_data_interval
+        readings = SensorData.objects.filter(
+            timestamp__gte=self.now - timedelta(hours=24), timestamp__lte=self.now
+        ).order_by('timestamp')
+        self.assertNoFullScan(readings)
+
+    def test_device_time_range(self):
+        readings = SensorData.objects.filter(
+            device_id=self.device, timestamp__gte=self.now - timedelta(hours=24), timestamp__lte=self.now
+        )
+        self.assertNoFullScan(readings)
+
+    def test_rollup_time_range(self):
+        # chart_view, sensor_data_get
+        rollups = SensorRollup.objects.filter(
+            resolution=600, start__gte=self.now - timedelta(hours=24), start__lte=self.now
+        )
+        self.assertNoFullScan(rollups)
+        self.assertNoFullScan(rollups.filter(device_id=self.device))
+
+
+class DeviceEndpointQueryCountTests(TestCase):
+    """The device dashboard endpoints must issue a fixed number of queries whatever the fleet size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner', password='secret')
+        cls.now = timezone.now()
+
+    def add_devices(self, count):
+        for i in range(count):
+            device = Device.objects.create(mac_address=f'AA:{i}', owner_id=self.owner, name=f'Sensor {i}', description='')
+            for minutes in range(3):
+                SensorData.objects.create(
+                    device_id=device, temperature=20 + i, humidity=50, pressure=1000,
+                    timestamp=self.now - timedelta(minutes=minutes)
+                )
+
+    def test_device_latest_value(self):
+        self.add_devices(1)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/get/data/latest')
+        self.add_devices(10)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/get/data/latest')
+
+        data = response.json()['data']
+        self.assertEqual(len(data), 11)
+        first = data[0]
+        self.assertEqual(first['current_value']['timestamp'], self.now.strftime('%Y-%m-%d %H:%M:%S'))
+        self.assertEqual(
+            first['previous_value']['timestamp'],
+            (self.now - timedelta(minutes=1)).strftime('%Y-%m-%d %H:%M:%S')
+        )
+
+    def test_device_latest_value_without_readings(self):
+        Device.objects.create(mac_address='CC', owner_id=self.owner, name='Idle', description='')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/get/data/latest')
+        self.assertEqual(response.json()['data'][0]['current_value'], {})
+
+    def test_device_info_get(self):
+        self.add_devices(10)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/get/device')
+        self.assertEqual(response.json()['data'][0]['owner'], 'owner')
+
+
+class DeviceCacheTests(TestCase):
+    """The MAC address registry is a bounded LRU with a TTL, kept in sync by the Device signal handlers."""
+
+    def setUp(self):
+        device_cache.clear()
+        self.addCleanup(device_cache.clear)
+        self.owner = User.objects.create(username='owner', password='secret')
+
+    def device(self, pk, mac_address):
+        return Device(pk=pk, mac_address=mac_address, owner_id=self.owner, name=mac_address, description='')
+
+    def test_lru_eviction_and_counters(self):
+        registry = DeviceCache(max_size=2, ttl=60)
+        for pk, mac_address in enumerate(('AA', 'BB', 'CC'), start=1):
+            if mac_address == 'CC':
+                registry.get('AA')  # Most recently used: BB is evicted instead.
+            registry.set(self.device(pk, mac_address))
+        self.assertIsNone(registry.get('BB'))
+        self.assertEqual(registry.get('AA').pk, 1)
+        self.assertEqual(registry.get('CC').pk, 3)
+        self.assertEqual(registry.stats(), {'size': 2, 'max_size': 2, 'ttl': 60, 'hits': 3, 'misses': 1})
+
+    def test_ttl(self):
+        registry = DeviceCache(ttl=60)
+        with mock.patch('Sensors.device_cache.time.monotonic', return_value=1000):
+            registry.set(self.device(1, 'AA'))
+        with mock.patch('Sensors.device_cache.time.monotonic', return_value=1059):
+            self.assertIsNotNone(registry.get('AA'))
+        with mock.patch('Sensors.device_cache.time.monotonic', return_value=1061):
+            self.assertIsNone(registry.get('AA'))
+        self.assertEqual(registry.stats()['size'], 0)
+
+    def test_signals_invalidate_entries(self):
+        device = Device.objects.create(mac_address='AA:BB', owner_id=self.owner, name='Sensor 1', description='')
+        get_device('AA:BB')
+        with self.assertNumQueries(0):
+            self.assertEqual(get_device('AA:BB').name, 'Sensor 1')
+
+        device.mac_address = 'AA:CC'
+        device.save()
+        with self.assertRaises(Device.DoesNotExist):
+            get_device('AA:BB')
+        self.assertEqual(get_device('AA:CC').pk, device.pk)
+
+        device.delete()
+        with self.assertRaises(Device.DoesNotExist):
+            get_device('AA:CC')
+
+        self.assertEqual(device_cache.get_default_user(), self.owner)
+        self.owner.delete()
+        self.assertIsNone(device_cache.get_default_user())
+
+    def test_created_devices_cached_on_commit(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            resolve_devices(['AA:BB'])
+            raise IntegrityError
+        self.assertIsNone(device_cache.get('AA:BB'))
+        with self.captureOnCommitCallbacks(execute=True):
+            created = resolve_devices(['AA:BB'])['AA:BB']
+            self.assertIsNone(device_cache.get('AA:BB'))
+        self.assertEqual(device_cache.get('AA:BB').pk, created.pk)
+
+
+class BatchIngestTests(TestCase):
+    """post/data/batch stores the valid items of a JSON array or NDJSON body and reports every item."""
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', password='secret')
+        self.device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+
+    def post(self, body, content_type='application/json'):
+        return self.client.post('/api/post/data/batch', body, content_type=content_type)
+
+    def test_mixed_items(self):
+        stamp = (timezone.now() - timedelta(minutes=5)).isoformat()
+        items = [
+            {'mac_address': 'AA:BB', 'temperature': 21.5, 'humidity': 50, 'pressure': 1000, 'timestamp': stamp},
+            {'temperature': 21, 'humidity': 50, 'pressure': 1000},
+            {'mac_address': 'CC:DD', 'temperature': 19, 'humidity': 40, 'pressure': 990},
+            {'mac_address': 'AA:BB', 'temperature': 'warm', 'humidity': 50, 'pressure': 1000},
+            {'mac_address': 'AA:BB', 'humidity': 50, 'pressure': 1000},
+        ]
+        result = self.post(json.dumps(items)).json()
+
+        self.assertEqual((result['stored'], result['duplicates'], result['failed']), (2, 0, 3))
+        self.assertEqual([item['index'] for item in result['results']], [0, 1, 2, 3, 4])
+        self.assertEqual([item['success'] for item in result['results']], [True, False, True, False, False])
+        self.assertEqual(result['results'][1]['message'], 'Missing mac_address')
+        self.assertEqual(result['results'][4]['message'], 'Missing temperature, humidity, or pressure data')
+        created = Device.objects.get(mac_address='CC:DD')
+        reading = SensorData.objects.get(pk=result['results'][2]['id'])
+        self.assertEqual((reading.device_id, reading.temperature), (created, 19))
+
+        # Resending the device-stamped reading only reports it as a duplicate.
+        result = self.post(json.dumps(items[:1])).json()
+        self.assertEqual(result['results'], [{'index': 0, 'success': True, 'duplicate': True}])
+        self.assertEqual(SensorData.objects.count(), 2)
+
+    def test_ndjson(self):
+        body = '\n'.join([
+            json.dumps({'mac_address': 'AA:BB', 'temperature': 20, 'humidity': 50, 'pressure': 1000}),
+            '',
+            '{not json',
+            json.dumps({'mac_address': 'AA:BB', 'temperature': 20.25, 'humidity': 50, 'pressure': 1000}),
+        ])
+        result = self.post(body, content_type='application/x-ndjson').json()
+        self.assertEqual((result['stored'], result['failed']), (2, 1))
+        self.assertEqual(result['results'][1], {'index': 1, 'success': False, 'message': 'Invalid JSON line'})
+        self.assertEqual(sorted(SensorData.objects.values_list('temperature', flat=True)), [20, 20.25])
+
+    def test_non_finite_item(self):
+        body = ('[{"mac_address": "AA:BB", "temperature": 21, "humidity": 50, "pressure": 1000},'
+                ' {"mac_address": "AA:BB", "temperature": NaN, "humidity": 50, "pressure": 1000},'
+                ' {"mac_address": "AA:BB", "temperature": 21, "humidity": "Infinity", "pressure": 1000}]')
+        result = self.post(body).json()
+        self.assertEqual((result['stored'], result['failed']), (1, 2))
+        self.assertEqual(result['results'][1]['message'], 'Invalid value for temperature: nan')
+        self.assertEqual(result['results'][2]['message'], "Invalid value for humidity: 'Infinity'")
+        self.assertEqual(SensorData.objects.count(), 1)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post('[{"mac_address": ').status_code, 400)
+        self.assertEqual(self.client.get('/api/post/data/batch').status_code, 405)
+        self.assertFalse(SensorData.objects.exists())
+
+
+def unpack_series(payload):
+    """Decodes an aggregation.pack_columns payload into {key: {column: [values]}}."""
+    magic, version, column_count = struct.unpack_from('<4sBB', payload, 0)
+    position = 6
+    names = []
+    for _ in range(column_count):
+        length = payload[position]
+        names.append(payload[position + 1:position + 1 + length].decode('ascii'))
+        position += 1 + length
+    (series_count,) = struct.unpack_from('<I', payload, position)
+    position += 4
+    series = {}
+    for _ in range(series_count):
+        (length,) = struct.unpack_from('<H', payload, position)
+        key = payload[position + 2:position + 2 + length].decode('utf-8')
+        position += 2 + length
+        (count,) = struct.unpack_from('<I', payload, position)
+        position += 4
+        columns = {'timestamps': list(struct.unpack_from(f'<{count}I', payload, position))}
+        position += 4 * count
+        for name in names:
+            columns[name] = list(struct.unpack_from(f'<{count}f', payload, position))
+            position += 4 * count
+        series[key] = columns
+    assert position == len(payload)
+    return (magic, version), series
+
+
+class BinaryFormatTests(TestCase):
+    """The ?format=binary payload follows the layout documented on aggregation.pack_columns."""
+
+    def test_layout(self):
+        payload = pack_columns({
+            3: {'timestamps': [60, 120], 'temperature': [20.5, None], 'count': [2, 0]},
+            'Capteur é': {'timestamps': [], 'temperature': [], 'count': []},
+        })
+        self.assertEqual(payload[:24], b'SNSR\x01\x02\x0btemperature\x05count')
+        header, series = unpack_series(payload)
+        self.assertEqual(header, (b'SNSR', 1))
+        self.assertEqual(list(series), ['3', 'Capteur é'])
+        self.assertEqual(series['3']['timestamps'], [60, 120])
+        self.assertEqual(series['3']['temperature'][0], 20.5)
+        self.assertTrue(math.isnan(series['3']['temperature'][1]))
+        self.assertEqual(series['3']['count'], [2, 0])
+        self.assertEqual(series['Capteur é'], {'timestamps': [], 'temperature': [], 'count': []})
+
+    def test_binary_matches_columnar(self):
+        owner = User.objects.create(username='owner', password='secret')
+        device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        now = timezone.now()
+        for minutes in (5, 25, 45, 46):
+            SensorData.objects.create(device_id=device, timestamp=now - timedelta(minutes=minutes),
+                                      temperature=20 + minutes / 4, humidity=50, pressure=1013.25)
+        url = f'/api/get/chart/quellechart?id={device.pk}&stats=1&format='
+        columnar = self.client.get(url + 'columnar').json()['data']
+        response = self.client.get(url + 'binary')
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        _, series = unpack_series(response.content)
+
+        self.assertEqual(series.keys(), columnar.keys())
+        for key, columns in columnar.items():
+            self.assertEqual(series[key].keys(), columns.keys())
+            self.assertEqual(series[key]['timestamps'], columns['timestamps'])
+            for name, values in columns.items():
+                for packed, value in zip(series[key][name], values):
+                    self.assertAlmostEqual(packed, value, places=2)
+
+
+class IntervalPaginationTests(TestCase):
+    """get/data/intervall pages with keyset cursors and streams the same rows as the plain response."""
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create(username='owner', password='secret')
+        devices = [Device.objects.create(mac_address=f'AA:0{i}', owner_id=owner, name=f'Sensor {i}', description='')
+                   for i in range(2)]
+        start = timezone.now().replace(microsecond=0) - timedelta(hours=3)
+        # Both devices share every timestamp: pages must break ties on the id.
+        SensorData.objects.bulk_create([
+            SensorData(device_id=device, timestamp=start + timedelta(minutes=5 * i),
+                       temperature=20 + i, humidity=50, pressure=1000)
+            for i in range(15) for device in devices
+        ])
+
+    def url(self, **params):
+        return '/api/get/data/intervall?' + '&'.join(f'{key}={value}' for key, value in params.items())
+
+    def test_pages_cover_the_range_once(self):
+        rows = self.client.get(self.url()).json()['data']
+        self.assertEqual(len(rows), 30)
+        pages, cursor = [], ''
+        while cursor is not None:
+            page = self.client.get(self.url(limit=7, cursor=cursor)).json()
+            self.assertLessEqual(len(page['data']), 7)
+            pages.extend(page['data'])
+            cursor = page['next_cursor']
+        self.assertEqual(pages, rows)
+        self.assertEqual([row['id'] for row in pages], sorted(row['id'] for row in pages))
+
+    def test_streams(self):
+        rows = self.client.get(self.url()).json()['data']
+        response = self.client.get(self.url(stream='ndjson'))
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], rows)
+        document = json.loads(b''.join(self.client.get(self.url(stream='json')).streaming_content))
+        self.assertEqual(document['data'], rows)
+
+    def test_invalid_parameters(self):
+        for params in ({'stream': 'csv'}, {'limit': 0}, {'limit': 5, 'cursor': 'garbage'}):
+            self.assertEqual(self.client.get(self.url(**params)).status_code, 400, params)
+
+
+class ResponseCacheTests(TestCase):
+    """Chart responses are cached per device, invalidated on ingest and support If-None-Match."""
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create(username='owner', password='secret')
+        self.device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        SensorData.objects.create(device_id=self.device, temperature=20, humidity=50, pressure=1000)
+
+    def post_reading(self, temperature):
+        self.client.post('/api/post/data', json.dumps({
+            'mac_address': 'AA:BB', 'temperature': temperature, 'humidity': 50, 'pressure': 1000,
+        }), content_type='application/json')
+
+    def test_not_modified(self):
+        url = f'/api/get/chart/quellechart?id={self.device.id}'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.post_reading(30)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_invalidated_on_ingest(self):
+        url = f'/api/get/data/latesthistory?id={self.device.id}'
+        self.assertEqual(len(self.client.get(url).json()['data']), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.client.get(url).json()['data']), 1)
+        self.post_reading(30)
+        self.assertEqual(len(self.client.get(url).json()['data']), 2)
+
+
+class FleetChartTests(TestCase):
+    """The fleet chart returns, in one grouped pass, the series chart_view returns per device."""
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create(username='owner', password='secret')
+        self.devices = [
+            Device.objects.create(mac_address=f'AA:0{i}', owner_id=owner, name=f'Sensor {i}', description='')
+            for i in range(3)
+        ]
+        now = timezone.now()
+        for i, device in enumerate(self.devices[:2]):
+            for minutes in (5, 65, 125):
+                SensorData.objects.create(device_id=device, timestamp=now - timedelta(minutes=minutes + i),
+                                          temperature=20 + i, humidity=50, pressure=1000)
+
+    def test_fleet_matches_per_device_charts(self):
+        first, second, idle = self.devices
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/get/chart/fleet?ids={first.pk},{second.pk},{idle.pk}').json()
+        self.assertEqual(response['devices'][str(second.pk)], {'name': 'Sensor 1', 'mac_address': 'AA:01'})
+        for device in (first, second):
+            single = self.client.get(f'/api/get/chart/quellechart?id={device.pk}').json()
+            self.assertEqual(response['data'][str(device.pk)], single['data'][device.name])
+        self.assertEqual(response['data'][str(idle.pk)], {'temperature': {}, 'humidity': {}, 'pressure': {}})
+
+        everything = self.client.get('/api/get/chart/fleet').json()
+        self.assertEqual(everything['data'], response['data'])
+        self.assertEqual(self.client.get('/api/get/chart/fleet?ids=x').status_code, 400)
+        self.assertEqual(self.client.get('/api/get/chart/fleet?ids=999').status_code, 404)
+
+
+class DownsamplingTests(TestCase):
+    """?points=N bounds chart series to N values per metric and keeps their peaks."""
+
+    def test_shape_is_preserved(self):
+        ys = [0.0] * 1000
+        ys[500] = 10.0
+        ys[700] = -10.0
+        for chosen in (lttb(list(range(1000)), ys, 20), minmax(ys, 20)):
+            self.assertLessEqual(len(chosen), 20)
+            self.assertEqual(chosen, sorted(chosen))
+            self.assertIn(500, chosen)
+            self.assertIn(700, chosen)
+
+    def test_chart_points_over_a_custom_range(self):
+        owner = User.objects.create(username='owner', password='secret')
+        device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        end = timezone.now().replace(microsecond=0)
+        SensorData.objects.bulk_create([
+            SensorData(device_id=device, timestamp=end - timedelta(hours=i), temperature=20 + i % 24,
+                       humidity=50, pressure=1000)
+            for i in range(24 * 20)
+        ])
+        for resolution in RESOLUTIONS.values():
+            backfill(resolution, SensorData.objects.all())
+        query = {
+            'id': device.pk, 'points': 40,
+            'start': timezone.localtime(end - timedelta(days=20)).strftime('%Y-%m-%d %H:%M:%S'),
+            'end': timezone.localtime(end).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        # 20 days at about 4 buckets per point: 3-hour buckets, read from the hourly rollups.
+        full = self.client.get('/api/get/chart/quellechart', dict(query, points='', bucket=180)).json()
+        full = full['data']['Sensor 1']['temperature']
+        self.assertGreater(len(full), 150)
+        for method in ('lttb', 'minmax'):
+            data = self.client.get('/api/get/chart/quellechart', dict(query, downsample=method)).json()['data']
+            temperature = data['Sensor 1']['temperature']
+            self.assertLessEqual(len(temperature), 40)
+            self.assertLessEqual(temperature.items(), full.items())
+            self.assertEqual(max(temperature.values()), max(full.values()))
+            self.assertEqual(min(temperature.values()), min(full.values()))
+        response = self.client.get('/api/get/chart/quellechart', dict(query, start=query['end']))
+        self.assertEqual(response.status_code, 400)
+
+
+class ReadReplicaRouterTests(SimpleTestCase):
+    """Only the @read_replica views read from SENSOR_READ_DATABASE; writes stay on the primary."""
+
+    @override_settings(SENSOR_READ_DATABASE='replica')
+    def test_routing(self):
+        view = read_replica(lambda request: (router.db_for_read(SensorData), router.db_for_write(SensorData)))
+        self.assertEqual(view(None), ('replica', 'default'))
+        self.assertEqual(router.db_for_read(SensorData), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'Sensors'))
+
+    @override_settings(SENSOR_READ_DATABASE='replica')
+    def test_bucket_databases(self):
+        # Closed buckets come from the replica, cached per snapshot; the open one from the primary.
+        cache.clear()
+        databases = []
+
+        def chart(snapshot):
+            with mock.patch('Sensors.rollups.replica_snapshot', return_value=snapshot):
+                read_replica(lambda request: rollups.bucketed_rows(end - timedelta(hours=1), end, 10))(None)
+
+        end = timezone.now()
+        with mock.patch('Sensors.rollups.rollup_bucket_rows',
+                        side_effect=lambda queryset, *args, **kwargs: databases.append(queryset.db) or []):
+            chart(1)
+            chart(1)
+            chart(2)
+        self.assertEqual(databases, ['replica', 'default', 'default', 'replica', 'default'])
+
+
+class MetricsTests(TestCase):
+    """PerformanceMiddleware records every request per route; api/metrics exposes the histograms."""
+
+    def setUp(self):
+        metrics.reset()
+
+    def test_request_recorded(self):
+        User.objects.create(username='owner', password='secret')
+        self.client.get('/api/get/user')
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('sensors_http_requests_total{route="api/get/user",method="GET",status="200"} 1', text)
+        self.assertIn('sensors_http_request_db_queries_bucket{route="api/get/user",le="1"} 1', text)
+        self.assertIn('sensors_http_request_db_queries_bucket{route="api/get/user",le="0"} 0', text)
+
+    async def test_request_recorded_under_asgi(self):
+        # Sync views run in a worker thread, with their own database connection.
+        await User.objects.acreate(username='owner', password='secret')
+        await self.async_client.get('/api/get/user')
+        text = (await self.async_client.get('/api/metrics')).content.decode()
+        self.assertIn('sensors_http_request_db_queries_bucket{route="api/get/user",le="0"} 0', text)
+        self.assertIn('sensors_http_request_db_queries_bucket{route="api/get/user",le="1"} 1', text)
+
+
+class WriteBufferTests(TransactionTestCase):
+    """post/data/async queues readings in the write-behind buffer, whose flusher thread stores them."""
+
+    async def test_reading_stamped_on_receipt(self):
+        before = timezone.now()
+        with mock.patch('Sensors.views.write_buffer.offer', return_value=True) as offer:
+            response = await self.async_client.post('/api/post/data/async', json.dumps({
+                'mac_address': 'AA:BB', 'temperature': 21, 'humidity': 50, 'pressure': 1000,
+            }), content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(before <= offer.call_args.args[0]['timestamp'] <= timezone.now())
+
+    async def test_full_buffer_rejects_readings(self):
+        buffer = WriteBuffer(max_size=1, flush_interval=60)
+        # No flusher thread: the first reading stays queued.
+        buffer._thread = mock.Mock()
+        payload = json.dumps({'mac_address': 'AA:BB', 'temperature': 21, 'humidity': 50, 'pressure': 1000})
+        with mock.patch('Sensors.views.write_buffer', buffer):
+            first = await self.async_client.post('/api/post/data/async', payload, content_type='application/json')
+            second = await self.async_client.post('/api/post/data/async', payload, content_type='application/json')
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(second.status_code, 429)
+        self.assertEqual(buffer.stats()['buffered'], 1)
+        self.assertEqual(buffer.stats()['rejected'], 1)
+
+    def test_stop_drains_the_buffer(self):
+        owner = User.objects.create(username='owner', password='secret')
+        device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        device_cache.clear()
+        self.addCleanup(device_cache.clear)
+        start = timezone.now() - timedelta(minutes=10)
+        buffer = WriteBuffer(max_size=10, batch_size=500, flush_interval=60)
+        for minute in range(5):
+            self.assertTrue(buffer.offer({'mac_address': 'AA:BB', 'temperature': 20 + minute, 'humidity': 50,
+                                          'pressure': 1000, 'timestamp': start + timedelta(minutes=minute)}))
+        buffer.offer({'mac_address': 'AA:BB', 'temperature': 20, 'humidity': 50, 'pressure': 1000,
+                      'timestamp': start})
+        buffer.stop()
+        self.assertEqual(SensorData.objects.filter(device_id=device).count(), 5)
+        self.assertEqual(buffer.stats(), {'buffered': 0, 'max_size': 10, 'stored': 5, 'duplicates': 1,
+                                          'dropped': 0, 'rejected': 0})
+
+    def test_failing_reading_only_drops_itself(self):
+        owner = User.objects.create(username='owner', password='secret')
+        Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        device_cache.clear()
+        self.addCleanup(device_cache.clear)
+        response = self.client.post('/api/post/data/async', '{"mac_address": "AA:BB", "temperature": NaN, '
+                                    '"humidity": 50, "pressure": 1000}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        # A reading that fails in store_readings does not take the rest of its batch with it.
+        buffer = WriteBuffer(max_size=10, batch_size=500, flush_interval=60)
+        for mac_address, temperature in (('AA:BB', 21), ('CC:DD', 22), ('AA:BB', Decimal('NaN')), ('CC:DD', 23)):
+            buffer.offer({'mac_address': mac_address, 'temperature': temperature, 'humidity': 50, 'pressure': 1000})
+        buffer.stop()
+        self.assertEqual(sorted(SensorData.objects.values_list('temperature', flat=True)), [21, 22, 23])
+        self.assertEqual((buffer.stats()['stored'], buffer.stats()['dropped']), (3, 1))
+
+
+class LiveFeedTests(TestCase):
+    """The broker fans readings out to every live feed client following their device."""
+
+    def reading(self, device_pk, temperature):
+        device = Device(pk=device_pk, mac_address=f'AA:{device_pk}', name=f'Sensor {device_pk}', description='')
+        return SensorData(device_id=device, temperature=temperature, humidity=50, pressure=1000,
+                          timestamp=timezone.now())
+
+    async def test_fan_out(self):
+        feed = Broker(max_pending=2)
+        every = feed.subscribe()
+        filtered = feed.subscribe({2})
+        feed.publish([self.reading(1, 20), self.reading(2, 21), self.reading(1, 22)])
+        await asyncio.sleep(0)  # Deliveries are scheduled on the loop.
+        self.assertEqual([every.queue.get_nowait()['temperature'] for _ in range(2)], [20, 21])
+        self.assertEqual(every.missed, 1)
+        self.assertEqual(filtered.queue.get_nowait()['esp_name'], 'Sensor 2')
+        self.assertTrue(filtered.queue.empty())
+        feed.unsubscribe(every)
+        self.assertEqual(feed.subscriber_count(), 1)
+
+    async def test_stream_device_filter(self):
+        response = await self.async_client.get('/api/get/data/stream?id=2,3')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = aiter(response.streaming_content)
+        self.assertEqual(await anext(events), b'retry: 3000\n\n')
+        broker.publish([self.reading(1, 20), self.reading(2, 21)])
+        event = await asyncio.wait_for(anext(events), timeout=1)
+        self.assertTrue(event.startswith(b'event: reading\n'))
+        self.assertEqual(json.loads(event.split(b'data: ')[1])['esp_id'], 2)
+        await events.aclose()
+
+        response = await self.async_client.get('/api/get/data/stream?id=2,x')
+        self.assertEqual(response.status_code, 400)
+
+    def test_events_of_every_ingest_path(self):
+        owner = User.objects.create(username='owner', password='secret')
+        Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        stamp = (timezone.now() - timedelta(minutes=5)).replace(microsecond=0)
+        reading = {'mac_address': 'AA:BB', 'temperature': 21.555, 'humidity': '50', 'pressure': 1000}
+        with mock.patch.object(broker, 'publish') as publish:
+            self.client.post('/api/post/data', json.dumps(dict(reading, timestamp=stamp.isoformat())),
+                             content_type='application/json')
+            self.client.post('/api/post/data/batch', json.dumps([dict(reading, timestamp=stamp.timestamp() + 60)]),
+                             content_type='application/json')
+        single, batch = (reading_event(call.args[0][0]) for call in publish.call_args_list)
+        self.assertEqual(json.dumps(dict(single, timestamp=None)), json.dumps(dict(batch, timestamp=None)))
+        self.assertEqual((single['temperature'], single['humidity'], single['pressure']), (21.56, 50.0, 1000.0))
+
+
+class CentiUnitTests(TestCase):
+    """Measurements are stored as integer hundredths and read back as floats."""
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', password='secret')
+        self.device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+
+    def test_round_trip(self):
+        now = timezone.now()
+        reading = SensorData.objects.create(device_id=self.device, temperature=Decimal('24.57'), humidity='50.1',
+                                            pressure=1013.255, timestamp=now)
+        SensorData.objects.create(device_id=self.device, temperature=-3.1, humidity=0, pressure=1000,
+                                  timestamp=now - timedelta(minutes=1))
+        self.assertEqual(
+            list(SensorData.objects.filter(pk=reading.pk).values_list('temperature', 'humidity', 'pressure')),
+            [(24.57, 50.1, 1013.26)]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT temperature, humidity FROM "Sensors_sensordata" WHERE id = %s', [reading.pk])
+            self.assertEqual(cursor.fetchone(), (2457, 5010))
+        self.assertEqual(SensorData.objects.filter(temperature__lt=0).count(), 1)
+        totals = SensorData.objects.aggregate(Min('temperature'), Max('temperature'))
+        self.assertEqual(totals, {'temperature__min': -3.1, 'temperature__max': 24.57})
+        with self.assertRaises(ValueError):
+            SensorData.objects.filter(temperature='warm').count()
+
+
+class CentiUnitMigrationTests(TransactionTestCase):
+    """Migration 0013 converts the stored decimals to hundredths and back."""
+
+    before = [('Sensors', '0012_sensordata_indexes')]
+    after = [('Sensors', '0013_sensordata_centi_units')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_forward_and_back(self):
+        apps = self.migrate(self.before)
+        owner = apps.get_model('Sensors', 'User').objects.create(username='owner', password='secret')
+        device = apps.get_model('Sensors', 'Device').objects.create(owner_id=owner, name='Sensor 1', description='')
+        apps.get_model('Sensors', 'SensorData').objects.create(
+            device_id=device, temperature=Decimal('24.57'), humidity=Decimal('-0.05'), pressure=Decimal('1013.25')
+        )
+
+        apps = self.migrate(self.after)
+        values = ('temperature', 'humidity', 'pressure')
+        self.assertEqual(list(apps.get_model('Sensors', 'SensorData').objects.values_list(*values)),
+                         [(24.57, -0.05, 1013.25)])
+
+        apps = self.migrate(self.before)
+        self.assertEqual(list(apps.get_model('Sensors', 'SensorData').objects.values_list(*values)),
+                         [(Decimal('24.57'), Decimal('-0.05'), Decimal('1013.25'))])
+
+
+class LineProtocolTests(SimpleTestCase):
+    def test_parse_line(self):
+        reading = parse_line(b'4C:11:AE:11:19:0C 23.41\t45.2 1013.25 1741253400\n')
+        self.assertEqual(reading['mac_address'], '4C:11:AE:11:19:0C')
+        self.assertEqual(str(reading['temperature']), '23.41')
+        self.assertEqual(reading['timestamp'].isoformat(), '2025-03-06T09:30:00+00:00')
+        self.assertNotIn('timestamp', parse_line(b'AA 1 2 3'))
+        self.assertIsNone(parse_line(b'# comment'))
+        future = timezone.now() + timedelta(hours=1)
+        for line in (b'AA 1 2', b'AA 1 x 3', b'AA 1 2 nan', b'AA 1 2 3 4 5', b'AA 1 2 3 nan',
+                     b'AA 1 2 3 %d' % future.timestamp()):
+            with self.assertRaises(ValueError):
+                parse_line(line)
+
+    def test_parse_lines(self):
+        readings, rejected = parse_lines(b'AA 1 2 3\n\nbad\nBB 4 5 6\n')
+        self.assertEqual([reading['mac_address'] for reading in readings], ['AA', 'BB'])
+        self.assertEqual(rejected, 1)
+
+
+class RollupTests(TestCase):
+    """The rollups follow the readings as they are stored, edited and deleted."""
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', password='secret')
+        self.device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        self.hour = (timezone.now() - timedelta(hours=5)).replace(minute=0, second=0, microsecond=0)
+
+    def hourly(self):
+        return dict(SensorRollup.objects.filter(resolution=3600).values_list('start', 'count'))
+
+    def test_edit_and_delete_rebuild_buckets(self):
+        reading = SensorData.objects.create(device_id=self.device, timestamp=self.hour,
+                                            temperature=20, humidity=50, pressure=1000)
+        SensorData.objects.create(device_id=self.device, timestamp=self.hour + timedelta(minutes=5),
+                                  temperature=22, humidity=50, pressure=1000)
+        self.assertEqual(self.hourly(), {self.hour: 2})
+
+        # Moved to the next hour: both the old and the new bucket are rebuilt.
+        reading.timestamp = self.hour + timedelta(hours=1)
+        reading.save()
+        self.assertEqual(self.hourly(), {self.hour: 1, self.hour + timedelta(hours=1): 1})
+
+        reading.delete()
+        self.assertEqual(self.hourly(), {self.hour: 1})
+        rollup = SensorRollup.objects.get(resolution=3600)
+        self.assertEqual(rollup.temperature_sum, 22)
+
+        # Deleted with the device, the readings leave no rollup behind.
+        self.device.delete()
+        self.assertFalse(SensorRollup.objects.exists())
+
+    def rollup_values(self):
+        return sorted(SensorRollup.objects.values_list(
+            'device_id', 'resolution', 'start', 'count', 'temperature_sum', 'temperature_min', 'temperature_max',
+            'humidity_sum', 'pressure_max',
+        ))
+
+    def test_incremental_rollups_match_backfill(self):
+        def post_batch(minutes, temperature):
+            self.client.post('/api/post/data/batch', json.dumps([
+                {'mac_address': 'AA:BB', 'temperature': temperature + i * 0.5, 'humidity': 50 - i,
+                 'pressure': 1000 + i, 'timestamp': (self.hour + timedelta(minutes=minute)).isoformat()}
+                for i, minute in enumerate(minutes)
+            ]), content_type='application/json')
+
+        post_batch([0, 5, 59, 61], 20)
+        # A second batch into the same buckets is merged into the existing rows.
+        post_batch([6, 62], 25)
+        SensorData.objects.create(device_id=self.device, timestamp=self.hour + timedelta(minutes=30),
+                                  temperature=18, humidity=60, pressure=1020)
+        self.assertEqual(self.hourly(), {self.hour: 5, self.hour + timedelta(hours=1): 2})
+        first = SensorRollup.objects.get(resolution=3600, start=self.hour)
+        self.assertEqual((first.temperature_min, first.temperature_max), (18, 25))
+        self.assertAlmostEqual(first.temperature_sum, 20 + 20.5 + 21 + 25 + 18)
+
+        incremental = self.rollup_values()
+        per_resolution = dict(SensorRollup.objects.values('resolution').annotate(rows=Count('id'))
+                              .values_list('resolution', 'rows'))
+        self.assertEqual((per_resolution[60], per_resolution[600]), (7, 4))
+        call_command('backfill_rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollup_values(), incremental)
+
+    def test_backfill_command_options(self):
+        other = Device.objects.create(mac_address='CC:DD', owner_id=self.device.owner_id, name='Sensor 2',
+                                      description='')
+        # Imported without signals: no rollups yet.
+        SensorData.objects.bulk_create([
+            SensorData(device_id=device, timestamp=self.hour + timedelta(minutes=minute),
+                       temperature=20, humidity=50, pressure=1000)
+            for device in (self.device, other) for minute in (0, 1, 70)
+        ])
+        output = io.StringIO()
+        call_command('backfill_rollups', '--resolution', '1h', '--device', self.device.pk, stdout=output)
+        self.assertIn('1h: 2 rollup rows created', output.getvalue())
+        self.assertEqual(set(SensorRollup.objects.values_list('device_id', 'resolution')), {(self.device.pk, 3600)})
+        self.assertEqual(self.hourly(), {self.hour: 2, self.hour + timedelta(hours=1): 1})
+
+
+class LateReadingTests(TestCase):
+    """Device timestamps: resent readings are deduplicated, late ones update rollups and cached buckets."""
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create(username='owner', password='secret')
+        self.device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        SensorData.objects.create(device_id=self.device, temperature=20, humidity=50, pressure=1000)
+
+    def post_batch(self, readings):
+        return self.client.post('/api/post/data/batch', json.dumps([
+            dict(reading, mac_address='AA:BB', humidity=50, pressure=1000) for reading in readings
+        ]), content_type='application/json').json()
+
+    def test_resent_batch_is_deduplicated(self):
+        stamp = (timezone.now() - timedelta(hours=3)).replace(microsecond=0)
+        batch = [{'temperature': 21, 'timestamp': stamp.isoformat()},
+                 {'temperature': 22, 'timestamp': stamp.timestamp() + 60}]
+        self.assertEqual(self.post_batch(batch)['stored'], 2)
+        rollups = SensorRollup.objects.filter(device_id=self.device, resolution=86400)
+        totals = list(rollups.values_list('count', flat=True))
+
+        result = self.post_batch(batch + [batch[0]])
+        self.assertEqual((result['stored'], result['duplicates']), (0, 3))
+        self.assertEqual(SensorData.objects.count(), 3)
+        self.assertEqual(list(rollups.values_list('count', flat=True)), totals)
+
+    def test_reading_stored_concurrently(self):
+        stamp = (timezone.now() - timedelta(hours=3)).replace(second=0, microsecond=0)
+        readings = [{'mac_address': 'AA:BB', 'temperature': 21, 'humidity': 50, 'pressure': 1000,
+                     'timestamp': stamp + timedelta(seconds=seconds)} for seconds in (0, 10)]
+
+        def store_first_meanwhile(device_pk, timestamps):
+            # Another request stores the first reading right after the duplicate check.
+            SensorData.objects.create(device_id=self.device, temperature=21, humidity=50, pressure=1000,
+                                      timestamp=stamp)
+            return []
+
+        with mock.patch('Sensors.ingest.archive.contains', side_effect=store_first_meanwhile), \
+                mock.patch('Sensors.ingest.broker.publish') as publish:
+            objects = store_readings(readings)
+        self.assertIsNone(objects[0])
+        self.assertIsNotNone(objects[1].pk)
+        self.assertEqual(publish.call_args.args[0], [objects[1]])
+        self.assertEqual(SensorRollup.objects.get(device_id=self.device, resolution=60, start=stamp).count, 2)
+
+    def test_late_reading_updates_cached_chart(self):
+        url = f'/api/get/chart/quellechart?id={self.device.id}&bucket=60'
+        late = timezone.now() - timedelta(hours=2)
+        label = late.replace(minute=0).strftime('%Y-%m-%d %H:%M')
+        self.assertNotIn(label, self.client.get(url).json()['data']['Sensor 1']['temperature'])
+
+        self.post_batch([{'temperature': 30, 'timestamp': late.isoformat()}])
+        self.assertEqual(self.client.get(url).json()['data']['Sensor 1']['temperature'][label], 30)
+
+
+class AlertTests(TestCase):
+    """Alert rules fire and resolve as readings are stored, from the engine's rolling state."""
+
+    def setUp(self):
+        alert_engine.clear()
+        self.addCleanup(alert_engine.clear)
+        owner = User.objects.create(username='owner', password='secret')
+        self.device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=2)
+
+    def post_batch(self, temperatures, first_minute=0):
+        self.client.post('/api/post/data/batch', json.dumps([
+            {'mac_address': 'AA:BB', 'temperature': temperature, 'humidity': 50, 'pressure': 1000,
+             'timestamp': (self.start + timedelta(minutes=first_minute + i)).isoformat()}
+            for i, temperature in enumerate(temperatures)
+        ]), content_type='application/json')
+
+    def test_threshold_rate_and_anomaly(self):
+        AlertRule.objects.create(name='Too hot', kind='threshold', metric='temperature', max_value=30)
+        AlertRule.objects.create(name='Jump', kind='rate', metric='temperature', max_rate=5, device_id=self.device)
+        AlertRule.objects.create(name='Odd', kind='anomaly', metric='temperature', z_score=4)
+
+        self.post_batch([20 + i % 2 * 0.5 for i in range(40)])
+        self.assertFalse(Alert.objects.exists())
+
+        # Rules and rolling state are in memory: a quiet reading costs no query.
+        quiet = SensorData(device_id=self.device, timestamp=self.start + timedelta(minutes=39, seconds=30),
+                           temperature=20.5, humidity=50, pressure=1000)
+        with self.assertNumQueries(0):
+            self.assertEqual(alert_engine.evaluate([quiet]), [])
+        # Fired by the spike, each rule resolves once the readings are back to normal.
+        self.post_batch([31, 32, 29, 25, 21] + [20] * 20, first_minute=40)
+        alerts = self.client.get('/api/get/alerts').json()['data']
+        self.assertEqual(sorted(alert['rule']['name'] for alert in alerts), ['Jump', 'Odd', 'Too hot'])
+        self.assertFalse(self.client.get('/api/get/alerts?active=1').json()['data'])
+
+        # A single reading stored by sensor_data_post goes through the same rules.
+        self.client.post('/api/post/data', json.dumps({
+            'mac_address': 'AA:BB', 'temperature': 35, 'humidity': 50, 'pressure': 1000,
+        }), content_type='application/json')
+        active = self.client.get(f'/api/get/alerts?active=1&id={self.device.pk}').json()['data']
+        self.assertIn('Too hot', [alert['rule']['name'] for alert in active])
+
+    def test_missing_data(self):
+        AlertRule.objects.create(name='Silent', kind='missing', timeout=600)
+        self.post_batch([20])
+        self.assertEqual(len(alert_engine.check_missing()), 1)
+        self.assertEqual(alert_engine.check_missing(), [])
+        self.post_batch([20], first_minute=5)
+        self.assertIsNotNone(Alert.objects.get().resolved_at)
+
+    def test_alerts_of_other_processes(self):
+        AlertRule.objects.create(name='Silent', kind='missing', timeout=600)
+        self.post_batch([20])
+        # check_alerts runs in its own process, with its own engine.
+        self.assertEqual(len(AlertEngine().check_missing()), 1)
+        self.post_batch([20], first_minute=5)
+        self.assertIsNone(Alert.objects.get().resolved_at)
+        # Once the cached open alerts expire, the next reading resolves it.
+        later = time.monotonic() + alert_engine.ttl + 1
+        with mock.patch('Sensors.alerts.time.monotonic', return_value=later):
+            self.post_batch([20], first_minute=6)
+        self.assertIsNotNone(Alert.objects.get().resolved_at)
+
+    def test_rate_of_readings_stamped_on_receipt(self):
+        AlertRule.objects.create(name='Jump', kind='rate', metric='temperature', max_rate=5)
+        # No timestamps: the readings are stamped microseconds apart on receipt.
+        self.client.post('/api/post/data/batch', json.dumps([
+            {'mac_address': 'AA:BB', 'temperature': temperature, 'humidity': 50, 'pressure': 1000}
+            for temperature in (20, 20.1)
+        ]), content_type='application/json')
+        self.assertEqual(SensorData.objects.count(), 2)
+        self.assertFalse(Alert.objects.exists())
+
+    def test_rule_without_metric(self):
+        rule = AlertRule(name='Broken', kind='threshold', max_value=30)
+        with self.assertRaises(ValidationError):
+            rule.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            rule.save()
+        # A metric the engine does not know is skipped instead of failing the ingest.
+        AlertRule.objects.create(name='Broken', kind='threshold', metric='temperature', max_value=30)
+        AlertRule.objects.update(metric='voltage')
+        self.post_batch([35])
+        self.assertEqual(SensorData.objects.count(), 1)
+        self.assertFalse(Alert.objects.exists())
+
+
+class RetentionTests(TestCase):
+    """Expired raw readings are folded into the rollups that outlive them, then deleted."""
+
+    def setUp(self):
+        owner = User.objects.create(username='owner', password='secret')
+        self.device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        self.now = timezone.now()
+
+    def test_prune_keeps_long_lived_rollups(self):
+        old = (self.now - timedelta(days=10)).replace(minute=0, second=0, microsecond=0)
+        SensorData.objects.create(device_id=self.device, timestamp=old, temperature=20, humidity=50, pressure=1000)
+        SensorData.objects.create(device_id=self.device, timestamp=self.now, temperature=22, humidity=50, pressure=1000)
+        # Imported without going through the rollups: downsampling must pick it up.
+        SensorData.objects.bulk_create([
+            SensorData(device_id=self.device, timestamp=old + timedelta(minutes=1),
+                       temperature=30, humidity=50, pressure=1000)
+        ])
+
+        with self.settings(SENSOR_RETENTION_DAYS={'raw': 7, '1m': 7, '10m': 90, '1h': None, '1d': None}):
+            report = apply_policy(now=self.now)
+
+        self.assertEqual(report['deleted']['raw'], 2)
+        self.assertEqual(report['deleted']['1m'], 1)
+        self.assertEqual(SensorData.objects.count(), 1)
+        hourly = SensorRollup.objects.get(resolution=3600, start=old)
+        self.assertEqual(hourly.count, 2)
+        self.assertEqual(hourly.temperature_sum, 50)
+
+    def test_edits_keep_pruned_rollups(self):
+        day = cutoff(10, self.now)
+        for hour in range(3):
+            SensorData.objects.create(device_id=self.device, timestamp=day + timedelta(hours=hour),
+                                      temperature=20, humidity=50, pressure=1000)
+        apply_policy(now=self.now)
+        self.assertFalse(SensorData.objects.exists())
+        daily = SensorRollup.objects.filter(resolution=86400, start=day)
+
+        # A late reading of the pruned day, edited then deleted: the other three stay counted.
+        late = SensorData.objects.create(device_id=self.device, timestamp=day + timedelta(hours=5),
+                                         temperature=24, humidity=50, pressure=1000)
+        late.temperature = 28
+        late.save()
+        self.assertEqual(daily.values_list('count', 'temperature_sum', 'temperature_max').get(), (4, 88, 28))
+        late.delete()
+        self.assertEqual(daily.values_list('count', 'temperature_sum').get(), (3, 60))
+        self.assertFalse(SensorRollup.objects.filter(resolution=3600, start=late.timestamp).exists())
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "SensorData is only partitioned on PostgreSQL")
+class PartitionTests(TestCase):
+    """
+    Range reads must only scan the monthly partitions overlapping the range,
+    and retention drops expired months whole. Run by CI with DJANGO_DB_PROFILE=postgresql.
+    """
+
+    def test_migration_partitions_by_month(self):
+        now = timezone.now()
+        names = [name for name, _, _ in partitions.partitions()]
+        self.assertIn(partitions.partition_name(partitions.month_start(now)), names)
+        owner = User.objects.create(username='owner', password='secret')
+        device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        reading = SensorData.objects.create(device_id=device, timestamp=now, temperature=20, humidity=50, pressure=1000)
+        self.assertEqual(SensorData.objects.get(pk=reading.pk).temperature, 20)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            SensorData.objects.create(device_id=device, timestamp=now, temperature=21, humidity=50, pressure=1000)
+
+    def test_retention_drops_expired_partitions(self):
+        now = timezone.now()
+        old = now - timedelta(days=100)
+        partitions.ensure_partitions(old, months_ahead=0)
+        owner = User.objects.create(username='owner', password='secret')
+        device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        SensorData.objects.create(device_id=device, timestamp=old, temperature=20, humidity=50, pressure=1000)
+        SensorData.objects.create(device_id=device, timestamp=now, temperature=22, humidity=50, pressure=1000)
+
+        with self.settings(SENSOR_RETENTION_DAYS={'raw': 30, '1m': 30, '10m': None, '1h': None, '1d': None}):
+            report = apply_policy(now=now)
+
+        self.assertEqual(report['deleted']['raw'], 1)
+        self.assertGreater(report['reclaimed_bytes'], 0)
+        self.assertNotIn(partitions.partition_name(partitions.month_start(old)),
+                         [name for name, _, _ in partitions.partitions()])
+        self.assertEqual(SensorData.objects.count(), 1)
+
+    def test_range_read_prunes_partitions(self):
+        now = timezone.now()
+        partitions.ensure_partitions(now - timedelta(days=93), months_ahead=4)
+        start, end = now - timedelta(hours=24), now
+        plan = SensorData.objects.filter(timestamp__gte=start, timestamp__lte=end).explain()
+        scanned = set(re.findall(rf'\b({re.escape(partitions.TABLE)}_\w+)', plan))
+        self.assertTrue(scanned)
+        self.assertLessEqual(scanned, set(partitions.partitions_for_range(start, end)))
+
+
+@unittest.skipUnless(archive.available(), "NumPy is not installed")
+class ArchiveTests(TestCase):
+    """Archived days are served from the columnar files, with the same responses as before."""
+
+    def setUp(self):
+        cache.clear()
+        owner = User.objects.create(username='owner', password='secret')
+        self.device = Device.objects.create(mac_address='AA:BB', owner_id=owner, name='Sensor 1', description='')
+        self.now = timezone.now().replace(microsecond=0)
+        SensorData.objects.bulk_create([
+            SensorData(device_id=self.device, timestamp=self.now - timedelta(minutes=30 * i, microseconds=i),
+                       temperature=20 + i % 7 * 0.25, humidity=50 - i % 5, pressure=1013.25)
+            for i in range(150)
+        ])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = self.settings(SENSOR_ARCHIVE_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def responses(self):
+        cache.clear()
+        start = timezone.localtime(self.now - timedelta(days=4)).strftime('%Y-%m-%d %H:%M:%S')
+        end = timezone.localtime(self.now).strftime('%Y-%m-%d %H:%M:%S')
+        interval = f'/api/get/data/intervall?start={start}&end={end}'
+        pages, cursor = [], ''
+        while cursor is not None:
+            page = self.client.get(f'{interval}&limit=40&cursor={cursor}').json()
+            pages.extend(page['data'])
+            cursor = page['next_cursor']
+        return (
+            self.client.get(interval).json()['data'],
+            pages,
+            self.client.get(f'/api/get/chart/quellechart?id={self.device.pk}&agg=median').json(),
+        )
+
+    def test_archived_history_is_transparent(self):
+        before = self.responses()
+        report = archive.archive_before(cutoff(0, self.now))
+
+        self.assertGreater(report['rows'], 0)
+        self.assertEqual(SensorData.objects.count(), 150 - report['rows'])
+        self.assertFalse(SensorData.objects.filter(timestamp__lt=archive.archived_until()).exists())
+        self.assertEqual(self.responses(), before)
+        self.assertEqual(len(before[1]), 150)
+
+    def test_resent_archived_reading_is_skipped(self):
+        timestamp = self.now - timedelta(days=3, microseconds=250)
+        reading = {'mac_address': 'AA:BB', 'temperature': 21, 'humidity': 50, 'pressure': 1000,
+                   'timestamp': timestamp.isoformat()}
+        self.client.post('/api/post/data/batch', json.dumps([reading]), content_type='application/json')
+        archive.archive_before(cutoff(0, self.now))
+        stored = SensorData.objects.count()
+
+        response = self.client.post('/api/post/data/batch', json.dumps([reading]), content_type='application/json')
+        self.assertEqual(response.json()['results'][0].get('duplicate'), True)
+        response = self.client.post('/api/post/data', json.dumps(reading), content_type='application/json')
+        self.assertTrue(response.json()['duplicate'])
+        self.assertEqual(SensorData.objects.count(), stored)
+
+        # Folded in by a later run, a reading stored twice would be archived once anyway.
+        SensorData.objects.bulk_create([SensorData(device_id=self.device, timestamp=timestamp,
+                                                   temperature=21, humidity=50, pressure=1000)])
+        archive.archive_before(cutoff(0, self.now))
+        cache.clear()
+        start = timezone.localtime(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+        end = timezone.localtime(timestamp + timedelta(seconds=1)).strftime('%Y-%m-%d %H:%M:%S')
+        rows = self.client.get(f'/api/get/data/intervall?start={start}&end={end}').json()['data']
+        self.assertEqual(len([row for row in rows if row['pressure'] == 1000]), 1)
+
+
+@unittest.skipUnless(engine.available(), "NumPy is not installed")
+class EngineTests(SimpleTestCase):
+    """The vectorized reductions must match NumPy's own per-group results."""
+
+    def test_grouped_reductions(self):
+        np = engine.np
+        rng = np.random.default_rng(0)
+        dtype = [('device_id', np.int64), ('epoch', np.int64)] + [(metric, np.float64) for metric in METRICS]
+        columns = np.zeros(500, dtype=dtype)
+        columns['device_id'] = rng.integers(1, 4, 500)
+        columns['epoch'] = rng.integers(0, 3600, 500)
+        for metric in METRICS:
+            columns[metric] = rng.normal(20, 5, 500)
+
+        for agg, expected in (('median', np.median), ('p95', lambda v: np.percentile(v, 95)), ('std', np.std)):
+            for row in engine.aggregate(columns, 600, agg):
+                group = columns[(columns['device_id'] == row['device_id']) & (columns['epoch'] // 600 * 600 == row['bucket'])]
+                self.assertEqual(row['count'], len(group))
+                self.assertAlmostEqual(row[f'temperature_{agg}'], expected(group['temperature']))
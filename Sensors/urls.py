@@ -1,13 +1,19 @@
 from django.urls import path
-from .views import sensor_data_get, sensor_data_post, user_info_get, device_info_get,  device_latest_value, sensor_data_interval, sensor_data_last_seven, chart_view
+from .views import sensor_data_get, sensor_data_post, sensor_data_post_batch, sensor_data_post_async, user_info_get, device_info_get,  device_latest_value, sensor_data_interval, sensor_data_last_seven, chart_view, chart_fleet, sensor_data_stream, alerts_get, metrics_get
 urlpatterns = [
     path('get/data', sensor_data_get, name='sensor_data_get'),
     path('post/data', sensor_data_post, name='sensor_data_post'),
+    path('post/data/batch', sensor_data_post_batch, name='sensor_data_post_batch'),
+    path('post/data/async', sensor_data_post_async, name='sensor_data_post_async'),
     path('get/user', user_info_get , name='user_info_get'),
     path('get/device', device_info_get , name='device_info_get'),
     path('get/data/latest', device_latest_value, name='device_info_get'),
     path('get/data/intervall', sensor_data_interval , name='sensor_data_interval'),
     path('get/data/latesthistory', sensor_data_last_seven, name='sensor_data_last_seven'),
     path('get/chart/quellechart', chart_view, name='chart_view'),
+    path('get/chart/fleet', chart_fleet, name='chart_fleet'),
+    path('get/data/stream', sensor_data_stream, name='sensor_data_stream'),
+    path('get/alerts', alerts_get, name='alerts_get'),
+    path('metrics', metrics_get, name='metrics_get'),
 
 ]
\ No newline at end of file
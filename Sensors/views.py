@@ -1,9 +1,32 @@
+import asyncio
+import base64
+import binascii
+import itertools
 import json
-from django.http import JsonResponse
+import time
+from django.http import HttpResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import OuterRef, Q, Subquery
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.hashers import make_password
-from .models import SensorData, User, Device
+from .models import Alert, SensorData, SensorRollup, User, Device
+from .ingest import clean_reading, parse_timestamp, store_readings
+from .device_cache import device_cache, get_device
+from .response_cache import cache_response
+from .routers import read_replica
+from .metrics import JsonResponse, serialization
+from . import metrics
+from .write_buffer import write_buffer
+from .live import broker
+from . import archive, engine
+from .aggregation import (
+    DOWNSAMPLE_METHODS, METRICS, SERIES_FORMATS, columns_from_rows, display_bucket_minutes, downsample_rows,
+    pack_columns, parse_bucket_minutes, series_from_rows,
+)
+from .rollups import RESOLUTIONS, bucket_start, bucketed_rows, pick_range_resolution
 from django.utils import timezone
+from django.conf import settings
 from django.shortcuts import render
 from datetime import timedelta
 from datetime import datetime
@@ -22,6 +45,9 @@ def sensor_data_post(request):
     """
     POST endpoint: Receives sensor data in JSON format and creates a SensorData record.
     If the device (by mac_address) does not exist, it is created only the first time.
+    An optional "timestamp" (Unix seconds or ISO 8601) dates the reading; it
+    defaults to the time of receipt. Resending a reading with the same device
+    and timestamp stores nothing and answers "duplicate": true.
     """
     if request.method == 'POST':
         try:
@@ -40,11 +66,12 @@ def sensor_data_post(request):
                 }, status=200)
             
             # Look up the device by its MAC address. If not found, create it.
+            # Known devices are served from the process-local registry.
             try:
-                device = Device.objects.get(mac_address=mac_address)
+                device = get_device(mac_address)
             except Device.DoesNotExist:
                 # Create a new device record with the provided mac_address.
-                default_user = User.objects.first()  # Assumes a default user exists.
+                default_user = device_cache.get_default_user()  # Assumes a default user exists.
                 if not default_user:
                     return JsonResponse({
                         'success': False,
@@ -58,17 +85,39 @@ def sensor_data_post(request):
                     is_active=1
                 )
             
-            # Create a new sensor reading entry.
-            reading = SensorData.objects.create(
-                temperature=temperature,
-                humidity=humidity,
-                pressure=pressure,
-                device_id=device
-            )
+            # Optional device timestamp (Unix seconds or ISO 8601) of a reading
+            # buffered on the device; a reading already stored is not stored twice.
+            timestamp = parse_timestamp(data.get('timestamp'))
+            reading = None
+            if timestamp is not None:
+                reading = SensorData.objects.filter(device_id=device, timestamp=timestamp).first()
+                if reading is None and archive.contains(device.pk, [timestamp]):
+                    # Resent after its day was archived: answer with the values sent.
+                    reading = SensorData(device_id=device, timestamp=timestamp, temperature=temperature,
+                                         humidity=humidity, pressure=pressure)
+            duplicate = reading is not None
+
+            if not duplicate:
+                # Create a new sensor reading entry.
+                fields = {'timestamp': timestamp} if timestamp is not None else {}
+                try:
+                    with transaction.atomic():
+                        reading = SensorData.objects.create(
+                            temperature=temperature,
+                            humidity=humidity,
+                            pressure=pressure,
+                            device_id=device,
+                            **fields
+                        )
+                except IntegrityError:
+                    # Stored by a concurrent request in the meantime.
+                    reading = SensorData.objects.get(device_id=device, timestamp=timestamp)
+                    duplicate = True
             
             # Return a JSON response with the stored data.
             return JsonResponse({
                 'success': True,
+                'duplicate': duplicate,
                 'data': {
                     'timestamp': reading.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
                     'temperature': reading.temperature,
@@ -91,12 +140,306 @@ def sensor_data_post(request):
             'message': 'Only POST requests are allowed'
         }, status=200)
 
-# Make sure you have a function that buckets a timestamp into a 10-minute interval.
-def bucket_timestamp(ts):
-    # Example implementation: Round down to the nearest 10 minutes.
-    minute = (ts.minute // 10) * 10
-    return ts.replace(minute=minute, second=0, microsecond=0)
+def parse_batch_body(body):
+    """
+    Splits a batch request body into items. The body is either a JSON array
+    of readings or NDJSON (one JSON reading per line). Lines that are not
+    valid JSON are returned as ValueError instances so they can be reported per item.
+    """
+    text = body.decode('utf-8').strip()
+    if text.startswith('['):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError('Body must be a JSON array or NDJSON')
+        return items
+    items = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError:
+            items.append(ValueError('Invalid JSON line'))
+    return items
+
+@csrf_exempt
+def sensor_data_post_batch(request):
+    """
+    POST endpoint: Receives many sensor readings at once, as a JSON array or as
+    NDJSON, possibly from different devices. Each reading has the same fields
+    as for sensor_data_post (temperature, humidity, pressure, mac_address and
+    the optional device timestamp).
+    All devices are resolved in one query (unknown ones are created in bulk)
+    and all valid readings are stored with a single bulk insert. Readings
+    already stored for the same device and timestamp are reported as
+    duplicates, so a device can safely resend a batch.
+
+    The response reports the outcome of every item, in input order:
+
+    {
+      "success": true,
+      "stored": 2,
+      "duplicates": 1,
+      "failed": 1,
+      "results": [
+        {"index": 0, "success": true, "id": 41},
+        {"index": 1, "success": false, "message": "Missing mac_address"},
+        {"index": 2, "success": true, "id": 42},
+        {"index": 3, "success": true, "duplicate": true}
+      ]
+    }
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'success': False,
+            'message': 'Only POST requests are allowed'
+        }, status=405)
+
+    try:
+        items = parse_batch_body(request.body)
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'message': f'Invalid batch body: {e}'
+        }, status=400)
+
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        try:
+            if isinstance(item, Exception):
+                raise item
+            valid.append((index, clean_reading(item)))
+        except ValueError as e:
+            results.append({'index': index, 'success': False, 'message': str(e)})
+
+    try:
+        created = store_readings([reading for _, reading in valid])
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=200)
+
+    stored = duplicates = 0
+    for (index, _), reading in zip(valid, created):
+        if reading is None:
+            duplicates += 1
+            results.append({'index': index, 'success': True, 'duplicate': True})
+        else:
+            stored += 1
+            results.append({'index': index, 'success': True, 'id': reading.pk})
+    results.sort(key=lambda result: result['index'])
 
+    return JsonResponse({
+        'success': True,
+        'stored': stored,
+        'duplicates': duplicates,
+        'failed': len(results) - len(created),
+        'results': results,
+    })
+
+async def sensor_data_post_async(request):
+    """
+    Async POST endpoint: same payload as sensor_data_post, but the reading is
+    only validated and queued in the in-process write-behind buffer; a
+    background flusher stores queued readings in batches (see write_buffer.py).
+    Responds 202 once queued, or 429 when the buffer is full so the device
+    retries later. The response does not include the stored record.
+    A reading without a timestamp is dated on receipt, not when it is flushed.
+    """
+    if request.method != 'POST':
+        return JsonResponse({
+            'success': False,
+            'message': 'Only POST requests are allowed'
+        }, status=405)
+
+    try:
+        reading = clean_reading(json.loads(request.body.decode('utf-8')))
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'message': str(e)
+        }, status=400)
+
+    if 'timestamp' not in reading:
+        reading['timestamp'] = timezone.now()
+    if not write_buffer.offer(reading):
+        return JsonResponse({
+            'success': False,
+            'message': 'Ingest buffer is full, retry later.'
+        }, status=429)
+
+    return JsonResponse({
+        'success': True,
+        'message': 'Reading queued.'
+    }, status=202)
+
+# csrf_exempt hides coroutine functions from Django 4.2, mark the view directly.
+sensor_data_post_async.csrf_exempt = True
+
+LIVE_KEEPALIVE = 15        # Seconds between keepalive comments on idle live feeds.
+LIVE_MAX_DURATION = 3600   # Seconds before a live feed connection is recycled.
+
+async def sensor_data_stream(request):
+    """
+    GET endpoint (server-sent events): pushes every new reading as it is stored,
+    instead of polling get/data/latest. Needs the ASGI server (djangoo.asgi).
+    Optional query parameter:
+      - id: Comma separated device ids to follow (e.g. ?id=2,3); all devices by default.
+
+    Each event is a "reading" event whose data is a JSON object:
+    {"esp_id": 2, "esp_name": "Sensor 1", "timestamp": "2025-03-06 09:30:00",
+     "temperature": 24.0, "humidity": 50.0, "pressure": 1000.0}
+    """
+    if request.method != 'GET':
+        return JsonResponse({
+            'success': False,
+            'message': 'Only GET requests are allowed'
+        }, status=405)
+
+    device_ids = None
+    if request.GET.get('id'):
+        try:
+            device_ids = {int(value) for value in request.GET['id'].split(',')}
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'message': 'Invalid device id list.'
+            }, status=400)
+
+    subscription = broker.subscribe(device_ids)
+
+    async def events():
+        # Connections are recycled after LIVE_MAX_DURATION: Django 4.2 does not
+        # notice client disconnects while streaming, EventSource reconnects on its own.
+        deadline = time.monotonic() + LIVE_MAX_DURATION
+        try:
+            yield 'retry: 3000\n\n'
+            while time.monotonic() < deadline:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=LIVE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Comment line, keeps proxies from closing an idle connection.
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'event: reading\ndata: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n'
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def parse_time_range(request, default_span):
+    """
+    Parses the optional start / end query parameters of the chart endpoints
+    ('YYYY-MM-DD HH:MM:SS', like sensor_data_interval). The range ends now and
+    spans `default_span` unless given. Raises ValueError with a message for the client.
+    """
+    try:
+        start_time, end_time = (
+            timezone.make_aware(datetime.strptime(request.GET[name], '%Y-%m-%d %H:%M:%S'))
+            if request.GET.get(name) else None
+            for name in ('start', 'end')
+        )
+    except ValueError:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD HH:MM:SS")
+    end_time = end_time or timezone.now()
+    start_time = start_time or end_time - default_span
+    if start_time >= end_time:
+        raise ValueError("start must be before end.")
+    return start_time, end_time
+
+def parse_series_options(request, span=None):
+    """
+    Parses the query parameters shared by the bucketed endpoints (bucket, stats,
+    format, agg, fill, points, downsample). With ?points= and no ?bucket=, the
+    buckets are widened to fit the `span` (timedelta) of the requested range.
+    Raises ValueError with a message for the client.
+    """
+    try:
+        bucket_minutes = parse_bucket_minutes(request.GET.get('bucket'))
+    except ValueError:
+        raise ValueError("Invalid bucket width. Use a positive number of minutes.")
+    points = request.GET.get('points')
+    if points:
+        try:
+            points = int(points)
+            if points < 2:
+                raise ValueError
+        except ValueError:
+            raise ValueError("Invalid points. Use a number of at least 2.")
+        if span is not None and not request.GET.get('bucket'):
+            bucket_minutes = display_bucket_minutes(span, points, minimum=bucket_minutes)
+    downsample = request.GET.get('downsample', 'lttb')
+    if downsample not in DOWNSAMPLE_METHODS:
+        raise ValueError("Invalid downsample. Use lttb or minmax.")
+    series_format = request.GET.get('format')
+    if series_format and series_format not in SERIES_FORMATS:
+        raise ValueError("Invalid format. Use columnar or binary.")
+    try:
+        agg = engine.parse_agg(request.GET.get('agg'))
+    except ValueError:
+        raise ValueError("Invalid agg. Use avg, sum, min, max, count, median, std, first, last or pNN (e.g. p95).")
+    fill = request.GET.get('fill')
+    if fill and fill not in engine.FILL_METHODS:
+        raise ValueError("Invalid fill. Use null or previous.")
+    use_engine = bool(fill) or agg not in (None, 'avg')
+    if use_engine and not engine.available():
+        raise ValueError("The agg and fill parameters need NumPy, which is not installed.")
+    return {
+        'bucket_minutes': bucket_minutes,
+        'stats': request.GET.get('stats') in ('1', 'true') and not use_engine,
+        'format': series_format,
+        'agg': agg or 'avg',
+        'fill': fill,
+        'engine': use_engine,
+        'points': points or None,
+        'downsample': downsample,
+    }
+
+def series_rows(options, start_time, end_time, per_device=True, metrics=METRICS, **device_filter):
+    """Bucket rows from the rollups (averages), or from the NumPy engine for other aggregates."""
+    if options['engine']:
+        return engine.engine_rows(
+            start_time, end_time, options['bucket_minutes'], options['agg'], fill=options['fill'],
+            per_device=per_device, metrics=metrics, **device_filter
+        )
+    return bucketed_rows(start_time, end_time, options['bucket_minutes'], per_device=per_device, **device_filter)
+
+def series_response(rows_by_key, options, metrics=METRICS, extra=None):
+    """
+    Renders bucket rows grouped by series key (device id or name) as the
+    default nested layout, the columnar layout (?format=columnar) or the packed
+    binary layout (?format=binary, see aggregation.pack_columns). `extra` holds
+    additional top-level fields of the JSON layouts. With ?points=N every
+    series is downsampled to at most N values per metric.
+    """
+    if options['points']:
+        rows_by_key = {
+            key: downsample_rows(rows, options['points'], options['downsample'], metrics=metrics, value=options['agg'])
+            for key, rows in rows_by_key.items()
+        }
+    layout = {'stats': options['stats'], 'metrics': metrics, 'value': options['agg']}
+    if options['format'] in SERIES_FORMATS:
+        data = {key: columns_from_rows(rows, **layout) for key, rows in rows_by_key.items()}
+        if options['format'] == 'binary':
+            with serialization():
+                body = pack_columns(data)
+            return HttpResponse(body, content_type='application/octet-stream')
+    else:
+        data = {key: series_from_rows(rows, **layout) for key, rows in rows_by_key.items()}
+    return JsonResponse({
+        "success": True,
+        **(extra or {}),
+        "data": data
+    })
+
+@cache_response('sensor_data_get', 'mac_address')
+@read_replica
 def sensor_data_get(request):
     """
     GET endpoint: Retrieves sensor readings from the past 2 hours, buckets them
@@ -122,55 +465,46 @@ def sensor_data_get(request):
          <other_device_id>: { ... }
       }
     }
+
+    Optional query parameters:
+      - mac_address: Only return readings of that device.
+      - bucket: Bucket width in minutes (default 10).
+      - stats: If 1, each bucket holds {"avg", "min", "max", "count"} instead of the average.
+      - format: columnar returns, per device, one "timestamps" array (bucket start,
+        epoch seconds) and one array per metric; binary returns the same columns
+        packed as little-endian float32 (see aggregation.pack_columns).
+      - agg: Reduction per bucket computed from the raw readings with the NumPy
+        engine: avg (default, served from the rollups), sum, min, max, count,
+        median, std, first, last or a percentile such as p95.
+      - fill: null or previous. Adds the empty buckets of the range (engine only).
+      - points: Downsample every series to at most N values per metric.
+      - downsample: lttb (default, Largest-Triangle-Three-Buckets) or minmax
+        (lowest and highest value of every N/2 slice).
     """
     if request.method == 'GET':
+        try:
+            options = parse_series_options(request, span=timedelta(hours=2))
+        except ValueError as e:
+            return JsonResponse({
+                "success": False,
+                "message": str(e)
+            }, status=400)
+
         now = timezone.now()
         start_time = now - timedelta(hours=2)
 
         # Optionally filter by device using GET parameter (e.g., ?mac_address=xx:xx:xx)
         mac_address = request.GET.get('mac_address')
-        sensor_readings = SensorData.objects.filter(timestamp__gte=start_time, timestamp__lte=now)
+        device_filter = {}
         if mac_address:
-            sensor_readings = sensor_readings.filter(device_id__mac_address=mac_address)
-
-        # Group sensor readings by device id and then by bucket timestamp.
-        device_data = defaultdict(lambda: defaultdict(lambda: {
-            'temperature': [],
-            'humidity': [],
-            'pressure': []
-        }))
-
-        for reading in sensor_readings:
-            device_key = reading.device_id.id  # Using device id as the key.
-            bucket_dt = bucket_timestamp(reading.timestamp)
-            bucket_key = bucket_dt.strftime('%Y-%m-%d %H:%M')
-            device_data[device_key][bucket_key]['temperature'].append(reading.temperature)
-            device_data[device_key][bucket_key]['humidity'].append(reading.humidity)
-            device_data[device_key][bucket_key]['pressure'].append(reading.pressure)
-
-        # Compute the average for each bucket for each device.
-        data = {}
-        for device_key, buckets in device_data.items():
-            temperature_data = {}
-            humidity_data = {}
-            pressure_data = {}
-            for bucket_key, measurements in buckets.items():
-                if measurements['temperature']:
-                    temperature_data[bucket_key] = sum(measurements['temperature']) / len(measurements['temperature'])
-                if measurements['humidity']:
-                    humidity_data[bucket_key] = sum(measurements['humidity']) / len(measurements['humidity'])
-                if measurements['pressure']:
-                    pressure_data[bucket_key] = sum(measurements['pressure']) / len(measurements['pressure'])
-            data[device_key] = {
-                "temperature": temperature_data,
-                "humidity": humidity_data,
-                "pressure": pressure_data,
-            }
+            device_filter['device_id__mac_address'] = mac_address
 
-        return JsonResponse({
-            "success": True,
-            "data": data
-        })
+        # One GROUP BY (device, bucket) query on the rollups, or the NumPy engine for ?agg=.
+        rows_by_device = defaultdict(list)
+        for row in series_rows(options, start_time, now, **device_filter):
+            rows_by_device[row['device_id']].append(row)
+
+        return series_response(rows_by_device, options)
     else:
         return JsonResponse({
             "success": False,
@@ -220,7 +554,7 @@ def device_info_get(request):
         device_id = request.GET.get('id')  # Get the 'id' parameter from the URL
         if device_id:
             # Fetch the specific device. If not found, return a 404 error.
-            device = get_object_or_404(Device, id=device_id)
+            device = get_object_or_404(Device.objects.select_related('owner_id'), id=device_id)
             device_info = {
                 'id': device.id,
                 'mac_address': device.mac_address,
@@ -230,8 +564,8 @@ def device_info_get(request):
                 'is_active': device.is_active,
             }
         else:
-            # If no id is provided, retrieve all devices.
-            devices = Device.objects.all()
+            # If no id is provided, retrieve all devices (owners joined in the same query).
+            devices = Device.objects.select_related('owner_id')
             device_info = [
                 {
                     'id': device.id,
@@ -275,23 +609,36 @@ def device_latest_value(request):
         else:
             devices = Device.objects.all()
 
+        # Find the ids of the two most recent readings of every device in the
+        # devices query itself (index lookups on (device_id, timestamp)), then
+        # fetch those readings with one more query, whatever the fleet size.
+        latest = SensorData.objects.filter(device_id=OuterRef('pk')).order_by('-timestamp')
+        devices = list(devices.annotate(
+            current_id=Subquery(latest.values('id')[:1]),
+            previous_id=Subquery(latest.values('id')[1:2]),
+        ))
+        reading_ids = [
+            reading_id
+            for device in devices
+            for reading_id in (device.current_id, device.previous_id)
+            if reading_id is not None
+        ]
+        readings = {reading.id: reading for reading in SensorData.objects.filter(id__in=reading_ids)} if reading_ids else {}
+
         result = []
         for device in devices:
-            # Fetch the two most recent sensor readings for this device.
-            readings = SensorData.objects.filter(device_id=device).order_by('-timestamp')[:2]
-
             current_value = {}
             previous_value = {}
-            if readings:
-                current = readings[0]
+            current = readings.get(device.current_id)
+            if current:
                 current_value = {
                     "timestamp": current.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
                     "temperature": current.temperature,
                     "humidity": current.humidity,
                     "pressure": current.pressure,
                 }
-                if len(readings) > 1:
-                    previous = readings[1]
+                previous = readings.get(device.previous_id)
+                if previous:
                     previous_value = {
                         "timestamp": previous.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
                         "temperature": previous.temperature,
@@ -323,6 +670,55 @@ def device_latest_value(request):
 
 
 
+INTERVAL_FIELDS = (
+    'id', 'timestamp', 'temperature', 'humidity', 'pressure',
+    'device_id__mac_address', 'device_id__name',
+)
+DEFAULT_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 2000
+
+def interval_row(values):
+    """Formats one SensorData .values(*INTERVAL_FIELDS) row for sensor_data_interval."""
+    return {
+        'id': values['id'],
+        'timestamp': values['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+        'temperature': values['temperature'],
+        'humidity': values['humidity'],
+        'pressure': values['pressure'],
+        'device': {
+            'mac_address': values['device_id__mac_address'],
+            'name': values['device_id__name'],
+        }
+    }
+
+def encode_cursor(values):
+    """Opaque keyset cursor pointing after the given (timestamp, id) row."""
+    raw = f"{values['timestamp'].isoformat()}|{values['id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, reading_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(reading_id)
+    except (binascii.Error, UnicodeError) as e:
+        raise ValueError(str(e))
+
+def stream_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+def stream_json(rows, time_interval):
+    """Yields the same document as the non-streaming response, one row at a time."""
+    yield '{"success": true, "time_interval": %s, "data": [' % json.dumps(time_interval)
+    separator = ''
+    for row in rows:
+        yield separator + json.dumps(row, cls=DjangoJSONEncoder)
+        separator = ', '
+    yield ']}'
+
+@read_replica
 def sensor_data_interval(request):
     """
     GET endpoint: Retrieves sensor data readings within a specified time interval.
@@ -330,7 +726,19 @@ def sensor_data_interval(request):
     Optional query parameters:
       - start: The start time in 'YYYY-MM-DD HH:MM:SS' format.
       - end: The end time in 'YYYY-MM-DD HH:MM:SS' format.
+      - resolution: Return rollup buckets instead of raw readings. One of 1m, 10m,
+        1h, 1d, or auto to pick the finest rollup keeping at most ROLLUP_MAX_POINTS
+        buckets per device. Each item then holds the bucket start, the number of
+        readings and the average temperature, humidity and pressure.
+      - limit: Page size for keyset pagination. The response then includes a
+        'next_cursor' to pass as ?cursor= for the next page (null on the last page).
+      - cursor: Resume after the row a previous page ended with.
+      - stream: ndjson or json. Streams every reading of the range (one JSON
+        object per line, or the usual JSON document) with flat memory use.
     
+    Readings moved to the columnar archive (see Sensors/archive.py) are read
+    from it and precede the rows still in the database.
+
     Returns a JSON response containing sensor readings ordered by timestamp,
     along with the time interval used.
     """
@@ -342,8 +750,8 @@ def sensor_data_interval(request):
         # Use provided parameters if available; otherwise default to the last 24 hours.
         if start_time_str and end_time_str:
             try:
-                start_time = datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S')
-                end_time = datetime.strptime(end_time_str, '%Y-%m-%d %H:%M:%S')
+                start_time = timezone.make_aware(datetime.strptime(start_time_str, '%Y-%m-%d %H:%M:%S'))
+                end_time = timezone.make_aware(datetime.strptime(end_time_str, '%Y-%m-%d %H:%M:%S'))
             except ValueError:
                 return JsonResponse({
                     'success': False,
@@ -354,30 +762,127 @@ def sensor_data_interval(request):
             end_time = timezone.now()
             start_time = end_time - timedelta(hours=24)
         
-        # Retrieve sensor readings within the specified time interval.
-        sensor_readings = SensorData.objects.filter(timestamp__gte=start_time, timestamp__lte=end_time).order_by('timestamp')
-        
-        data = [
-            {
-                'id': reading.id,
-                'timestamp': reading.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                'temperature': reading.temperature,
-                'humidity': reading.humidity,
-                'pressure': reading.pressure,
-                'device': {
-                    'mac_address': reading.device_id.mac_address,
-                    'name': reading.device_id.name,
+        # Serve pre-aggregated buckets when a resolution is requested.
+        resolution_label = request.GET.get('resolution')
+        if resolution_label:
+            if resolution_label == 'auto':
+                max_points = getattr(settings, 'ROLLUP_MAX_POINTS', 500)
+                resolution = pick_range_resolution(start_time, end_time, max_points)
+            elif resolution_label in RESOLUTIONS:
+                resolution = RESOLUTIONS[resolution_label]
+            else:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Invalid resolution. Use 1m, 10m, 1h, 1d or auto.'
+                }, status=400)
+
+            rollups = SensorRollup.objects.filter(
+                resolution=resolution,
+                start__gte=bucket_start(start_time, resolution),
+                start__lte=end_time
+            ).select_related('device_id').order_by('start', 'device_id')
+
+            data = [
+                {
+                    'timestamp': rollup.start.strftime('%Y-%m-%d %H:%M:%S'),
+                    'count': rollup.count,
+                    'temperature': round(rollup.temperature_sum / rollup.count, 2),
+                    'humidity': round(rollup.humidity_sum / rollup.count, 2),
+                    'pressure': round(rollup.pressure_sum / rollup.count, 2),
+                    'device': {
+                        'mac_address': rollup.device_id.mac_address,
+                        'name': rollup.device_id.name,
+                    }
                 }
-            }
-            for reading in sensor_readings
-        ]
+                for rollup in rollups
+                if rollup.count
+            ]
+
+            return JsonResponse({
+                'success': True,
+                'time_interval': {
+                    'start': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+                    'end': end_time.strftime('%Y-%m-%d %H:%M:%S'),
+                },
+                'resolution': dict(SensorRollup.RESOLUTION_CHOICES)[resolution],
+                'data': data,
+            })
+
+        # Retrieve sensor readings within the specified time interval.
+        # Only the needed columns, device fields joined in the same query.
+        sensor_readings = (
+            SensorData.objects
+            .filter(timestamp__gte=start_time, timestamp__lte=end_time)
+            .order_by('timestamp', 'id')
+            .values(*INTERVAL_FIELDS)
+        )
+        time_interval = {
+            'start': start_time.strftime('%Y-%m-%d %H:%M:%S'),
+            'end': end_time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+        # The part of the range before the archive watermark is only read from the archive.
+        archived_until = archive.archived_until()
+        archived = archived_until is not None and archived_until > start_time
+        if archived:
+            sensor_readings = sensor_readings.filter(timestamp__gte=archived_until)
+
+        def archived_rows(after=None):
+            if not archived:
+                return ()
+            return archive.rows(start_time, min(end_time, archived_until), after)
+
+        # Stream the whole range without materializing it.
+        stream = request.GET.get('stream')
+        if stream:
+            if stream not in ('ndjson', 'json'):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Invalid stream format. Use ndjson or json.'
+                }, status=400)
+            # The rows are fetched after the view returns: pin the read database now.
+            sensor_readings = sensor_readings.using(sensor_readings.db)
+            readings = itertools.chain(archived_rows(), sensor_readings.iterator(chunk_size=STREAM_CHUNK_SIZE))
+            rows = (interval_row(values) for values in readings)
+            if stream == 'ndjson':
+                return StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+            return StreamingHttpResponse(stream_json(rows, time_interval), content_type='application/json')
+
+        # Keyset pagination: ?limit=N, then ?cursor=<next_cursor> for the following pages.
+        limit = request.GET.get('limit')
+        cursor = request.GET.get('cursor')
+        if limit or cursor:
+            try:
+                limit = int(limit or DEFAULT_PAGE_SIZE)
+                if limit <= 0:
+                    raise ValueError
+                after = None
+                if cursor:
+                    after = cursor_timestamp, cursor_id = decode_cursor(cursor)
+                    sensor_readings = sensor_readings.filter(
+                        Q(timestamp__gt=cursor_timestamp) | Q(timestamp=cursor_timestamp, id__gt=cursor_id)
+                    )
+            except ValueError:
+                return JsonResponse({
+                    'success': False,
+                    'message': 'Invalid limit or cursor.'
+                }, status=400)
+
+            # The database is only queried once the archived rows are exhausted.
+            page = list(itertools.islice(itertools.chain(archived_rows(after), sensor_readings[:limit + 1]), limit + 1))
+            next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+            return JsonResponse({
+                'success': True,
+                'time_interval': time_interval,
+                'data': [interval_row(values) for values in page[:limit]],
+                'next_cursor': next_cursor,
+            })
+
+        data = [interval_row(values) for values in itertools.chain(archived_rows(), sensor_readings)]
         
         return JsonResponse({
             'success': True,
-             'time_interval': {
-                'start': start_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'end': end_time.strftime('%Y-%m-%d %H:%M:%S'),
-            },
+            'time_interval': time_interval,
             'data': data,
         })
     else:
@@ -386,6 +891,8 @@ def sensor_data_interval(request):
             'message': 'Only GET requests are allowed'
         }, status=200)
 
+@cache_response('sensor_data_last_seven', 'id', windowed=False)
+@read_replica
 def sensor_data_last_seven(request):
     """
     GET endpoint: Returns the last seven sensor data records for a device whose
@@ -407,15 +914,10 @@ def sensor_data_last_seven(request):
         # Filter sensor data for the device and order by descending timestamp
         sensor_records = SensorData.objects.filter(device_id=device).order_by('-timestamp')[:7]
         
-        # Convert the QuerySet to a list of dictionaries with the required fields
+        # Convert the QuerySet to a list of dictionaries with the required fields.
+        # Values are stored in hundredths, so they already have two decimals.
         data = list(sensor_records.values('temperature', 'humidity', 'pressure', 'timestamp'))
         
-        # Round numeric values to two decimal places
-        for record in data:
-            record['temperature'] = round(record['temperature'], 2)
-            record['humidity'] = round(record['humidity'], 2)
-            record['pressure'] = round(record['pressure'], 2)
-        
         return JsonResponse({
             'success': True,
             'data': data
@@ -426,17 +928,29 @@ def sensor_data_last_seven(request):
             'message': 'Only GET requests are allowed'
         }, status=405)
 
-# Assuming you have imported your SensorData model from your app's models.
-# from yourapp.models import SensorData
+MEASUREMENTS = {
+    'temp': 'temperature',
+    'temperature': 'temperature',
+    'hum': 'humidity',
+    'humidity': 'humidity',
+    'press': 'pressure',
+    'pressure': 'pressure'
+}
 
-def bucket_timestamp(ts):
+def parse_measurement(value):
     """
-    Floors a datetime object to the nearest 10 minutes.
-    For example, 09:34 becomes 09:30.
+    Parses the ?data= query parameter of the chart endpoints into the tuple of
+    metrics to return (all of them when absent). Raises ValueError otherwise.
     """
-    floored_minute = (ts.minute // 10) * 10
-    return ts.replace(minute=floored_minute, second=0, microsecond=0)
+    if not value:
+        return METRICS
+    metric = MEASUREMENTS.get(value.lower())
+    if metric is None:
+        raise ValueError("Invalid measurement type provided. Use temp, humidity, or pressure.")
+    return (metric,)
 
+@cache_response('chart_view', 'id')
+@read_replica
 def chart_view(request):
     """
     GET endpoint that returns sensor readings in 10-minute buckets over the past 24 hours.
@@ -444,6 +958,14 @@ def chart_view(request):
     Optional query parameters:
       - id: Device ID to filter sensor readings (e.g., ?id=2)
       - data: Measurement type to return (e.g., ?data=temp, ?data=humidity, ?data=pressure)
+      - bucket: Bucket width in minutes (default 10)
+      - stats: If 1, each bucket holds {"avg", "min", "max", "count"} instead of the average
+      - format: columnar or binary, same layouts as sensor_data_get
+      - agg, fill: Per-bucket reduction and gap filling, as for sensor_data_get
+      - start, end: Time range in 'YYYY-MM-DD HH:MM:SS' format (default: the last 24 hours)
+      - points, downsample: Downsampling to at most N values per metric, as for
+        sensor_data_get. Without a bucket parameter, the buckets are widened to
+        about four per point, so long ranges are read from the coarser rollups.
     
     The JSON response is structured as follows:
     
@@ -470,84 +992,242 @@ def chart_view(request):
             "message": "Only GET requests are allowed."
         }, status=405)
     
-    now = timezone.now()
-    # Change the default time range to the last 24 hours.
-    start_time = now - timedelta(hours=24)
-    
-    # Retrieve sensor readings from the past 24 hours.
-    sensor_readings = SensorData.objects.filter(timestamp__gte=start_time, timestamp__lte=now)
+    try:
+        # The time range defaults to the last 24 hours.
+        start_time, end_time = parse_time_range(request, timedelta(hours=24))
+        options = parse_series_options(request, span=end_time - start_time)
+        # Optionally filter which measurement type is returned.
+        metrics = parse_measurement(request.GET.get('data'))
+    except ValueError as e:
+        return JsonResponse({
+            "success": False,
+            "message": str(e)
+        }, status=400)
     
     # Filter by device id if provided (using device's primary key).
     device_id = request.GET.get('id')
+    device_filter = {}
     if device_id:
-        sensor_readings = sensor_readings.filter(device_id__id=device_id)
+        device_filter['device_id__id'] = device_id
     
+    # Determine the device name from the first rollup of the range.
+    rollups = SensorRollup.objects.filter(
+        start__gte=bucket_start(start_time, options['bucket_minutes'] * 60),
+        start__lte=end_time,
+        **device_filter
+    )
+    first_rollup = rollups.select_related('device_id').order_by('start', 'device_id').first()
+
     # If no readings found, return an error.
-    if not sensor_readings.exists():
+    if first_rollup is None:
         return JsonResponse({
             "success": False,
             "message": "No sensor readings found for the given filter."
         }, status=404)
     
-    # Determine the device name from the first reading.
-    device_name = sensor_readings.first().device_id.name
+    device_name = first_rollup.device_id.name
     
-    # Bucket readings into 10-minute intervals.
-    buckets = {}
-    for reading in sensor_readings:
-        bucket_dt = bucket_timestamp(reading.timestamp)
-        bucket_key = bucket_dt.strftime('%Y-%m-%d %H:%M')
-        if bucket_key not in buckets:
-            buckets[bucket_key] = {
-                'temperature': [],
-                'humidity': [],
-                'pressure': []
-            }
-        buckets[bucket_key]['temperature'].append(reading.temperature)
-        buckets[bucket_key]['humidity'].append(reading.humidity)
-        buckets[bucket_key]['pressure'].append(reading.pressure)
+    # One GROUP BY bucket query on the rollups, or the NumPy engine for ?agg=.
+    rows = series_rows(options, start_time, end_time, per_device=False, metrics=metrics, **device_filter)
     
-    # Calculate average values for each bucket.
-    aggregated = {
-        "temperature": {},
-        "humidity": {},
-        "pressure": {}
+    # Build final response data using the device name as the key.
+    return series_response({device_name: list(rows)}, options, metrics=metrics)
+
+
+@cache_response('chart_fleet', None)
+@read_replica
+def chart_fleet(request):
+    """
+    GET endpoint: 10-minute buckets over the past 24 hours for several devices
+    (or the whole fleet) at once, computed in one pass grouped by device and
+    bucket instead of one chart_view call per device.
+
+    Optional query parameters:
+      - ids: Comma-separated device ids (e.g. ?ids=2,5). All devices by default.
+      - data, bucket, stats, format, agg, fill, start, end, points, downsample: As for chart_view.
+
+    The JSON response is keyed by device id; every selected device is listed
+    in "devices", with empty series when it has no readings in the range:
+
+    {
+      "success": true,
+      "devices": {
+        "2": {"name": "Device 4C:11:AE:11:19:0C", "mac_address": "4C:11:AE:11:19:0C"},
+        ...
+      },
+      "data": {
+        "2": {
+          "temperature": {"2025-03-06 09:30": 24, ...},
+          "humidity": { ... },
+          "pressure": { ... }
+        },
+        ...
+      }
     }
-    for bucket_key, values in buckets.items():
-        if values['temperature']:
-            aggregated["temperature"][bucket_key] = sum(values['temperature']) / len(values['temperature'])
-        if values['humidity']:
-            aggregated["humidity"][bucket_key] = sum(values['humidity']) / len(values['humidity'])
-        if values['pressure']:
-            aggregated["pressure"][bucket_key] = sum(values['pressure']) / len(values['pressure'])
-    
-    # Optionally filter which measurement type is returned.
-    measurement_filter = request.GET.get('data')
-    if measurement_filter:
-        measurement_filter = measurement_filter.lower()
-        mapping = {
-            'temp': 'temperature',
-            'temperature': 'temperature',
-            'hum': 'humidity',
-            'humidity': 'humidity',
-            'press': 'pressure',
-            'pressure': 'pressure'
-        }
-        if measurement_filter in mapping:
-            key = mapping[measurement_filter]
-            aggregated = { key: aggregated.get(key, {}) }
-        else:
+
+    With format=binary the payload only holds the series, keyed by device id.
+    """
+    if request.method != 'GET':
+        return JsonResponse({
+            "success": False,
+            "message": "Only GET requests are allowed."
+        }, status=405)
+
+    try:
+        start_time, end_time = parse_time_range(request, timedelta(hours=24))
+        options = parse_series_options(request, span=end_time - start_time)
+        metrics = parse_measurement(request.GET.get('data'))
+    except ValueError as e:
+        return JsonResponse({
+            "success": False,
+            "message": str(e)
+        }, status=400)
+
+    devices = Device.objects.order_by('id')
+    device_filter = {}
+    ids = request.GET.get('ids')
+    if ids:
+        try:
+            device_ids = [int(device_id) for device_id in ids.split(',')]
+        except ValueError:
             return JsonResponse({
                 "success": False,
-                "message": "Invalid measurement type provided. Use temp, humidity, or pressure."
+                "message": "Invalid ids. Use comma-separated device ids, e.g. ?ids=2,5"
             }, status=400)
-    
-    # Build final response data using the device name as the key.
-    data = {
-        device_name: aggregated
+        devices = devices.filter(id__in=device_ids)
+        device_filter['device_id__id__in'] = device_ids
+
+    device_info = {
+        device['id']: {'name': device['name'], 'mac_address': device['mac_address']}
+        for device in devices.values('id', 'name', 'mac_address')
     }
-    
+    if not device_info:
+        return JsonResponse({
+            "success": False,
+            "message": "No devices found for the given ids."
+        }, status=404)
+
+    # One GROUP BY (device, bucket) query on the rollups, or the NumPy engine for ?agg=.
+    rows_by_device = {device_id: [] for device_id in device_info}
+    for row in series_rows(options, start_time, end_time, metrics=metrics, **device_filter):
+        if row['device_id'] in rows_by_device:
+            rows_by_device[row['device_id']].append(row)
+
+    return series_response(rows_by_device, options, metrics=metrics, extra={"devices": device_info})
+
+
+# ===============================
+# Alerts Endpoint
+# ===============================
+
+DEFAULT_ALERT_LIMIT = 100
+
+def alerts_get(request):
+    """
+    GET endpoint: Alerts fired by the alert rules (see Sensors/alerts.py),
+    newest first.
+    Optional query parameters:
+      - id: Only the alerts of that device.
+      - active: If 1, only the alerts that are not resolved yet.
+      - limit: Maximum number of alerts (default 100).
+
+    {
+      "success": true,
+      "data": [
+        {
+          "id": 12,
+          "rule": {"id": 1, "name": "Too hot", "kind": "threshold", "metric": "temperature"},
+          "device": {"id": 2, "mac_address": "4C:11:AE:11:19:0C", "name": "Device 4C:11:AE:11:19:0C"},
+          "value": 41.5,
+          "message": "Too hot: temperature 41.5 above 40",
+          "triggered_at": "2025-03-06 09:30:00",
+          "resolved_at": null
+        },
+        ...
+      ]
+    }
+    """
+    if request.method != 'GET':
+        return JsonResponse({
+            'success': False,
+            'message': 'Only GET requests are allowed'
+        }, status=405)
+
+    try:
+        limit = int(request.GET.get('limit') or DEFAULT_ALERT_LIMIT)
+        if limit <= 0:
+            raise ValueError
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'Invalid limit.'
+        }, status=400)
+
+    alerts = Alert.objects.select_related('rule_id', 'device_id').order_by('-triggered_at', '-id')
+    device_id = request.GET.get('id')
+    if device_id:
+        alerts = alerts.filter(device_id=device_id)
+    if request.GET.get('active') in ('1', 'true'):
+        alerts = alerts.filter(resolved_at__isnull=True)
+
+    data = [
+        {
+            'id': alert.id,
+            'rule': {
+                'id': alert.rule_id.id,
+                'name': alert.rule_id.name,
+                'kind': alert.rule_id.kind,
+                'metric': alert.rule_id.metric,
+            },
+            'device': {
+                'id': alert.device_id.id,
+                'mac_address': alert.device_id.mac_address,
+                'name': alert.device_id.name,
+            },
+            'value': alert.value,
+            'message': alert.message,
+            'triggered_at': alert.triggered_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'resolved_at': alert.resolved_at.strftime('%Y-%m-%d %H:%M:%S') if alert.resolved_at else None,
+        }
+        for alert in alerts[:limit]
+    ]
     return JsonResponse({
-        "success": True,
-        "data": data
+        'success': True,
+        'data': data
     })
+
+
+# ===============================
+# Metrics Endpoint
+# ===============================
+
+def metrics_get(request):
+    """
+    GET endpoint: Per-route request metrics recorded by PerformanceMiddleware
+    (latency, queries, DB time, serialization time, response size) and the
+    state of the ingest buffer, device cache and live feed, in the Prometheus
+    text format.
+    """
+    if request.method != 'GET':
+        return JsonResponse({
+            'success': False,
+            'message': 'Only GET requests are allowed'
+        }, status=405)
+
+    buffer_stats = write_buffer.stats()
+    cache_stats = device_cache.stats()
+    gauges = {
+        'sensors_ingest_buffer_queued': buffer_stats['buffered'],
+        'sensors_ingest_buffer_stored_total': buffer_stats['stored'],
+        'sensors_ingest_buffer_dropped_total': buffer_stats['dropped'],
+        'sensors_ingest_buffer_rejected_total': buffer_stats['rejected'],
+        'sensors_device_cache_entries': cache_stats['size'],
+        'sensors_device_cache_hits_total': cache_stats['hits'],
+        'sensors_device_cache_misses_total': cache_stats['misses'],
+        'sensors_live_subscribers': broker.subscriber_count(),
+    }
+    extra = []
+    for name, value in gauges.items():
+        extra.append(f'# TYPE {name} {"counter" if name.endswith("_total") else "gauge"}')
+        extra.append(f'{name} {value}')
+    return HttpResponse(metrics.render(extra), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,144 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections
+from .ingest import store_readings
+
+logger = logging.getLogger(__name__)
+
+
+# ===============================
+# Write-behind buffer for the async ingest endpoint
+# ===============================
+
+class WriteBuffer:
+    """
+    Bounded in-process queue of cleaned readings (see ingest.clean_reading).
+    A background thread stores them with ingest.store_readings in batches of
+    up to `batch_size`, or every `flush_interval` seconds, whichever comes
+    first. offer() never blocks: it returns False when the buffer is full so
+    the caller can apply backpressure.
+    """
+
+    def __init__(self, max_size=10000, batch_size=500, flush_interval=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stored = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def offer(self, reading):
+        """Enqueues a reading, starting the flusher on first use. Returns False if the buffer is full."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(reading)
+        except queue.Full:
+            self.rejected += 1
+            return False
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name='sensors-write-buffer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+        # Drain whatever is left on shutdown.
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch:
+                break
+            self._flush(batch)
+
+    def _next_batch(self):
+        """Waits for a first reading, then collects more until the batch is full or the interval is over."""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _take(self, count):
+        batch = []
+        while len(batch) < count:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _flush(self, batch):
+        close_old_connections()
+        try:
+            self._store(batch)
+        except Exception:
+            # The batch is rolled back as a whole: store the readings one by
+            # one so that only the failing ones are dropped.
+            logger.warning("Storing %d buffered readings failed, retrying them one by one", len(batch))
+            for reading in batch:
+                try:
+                    self._store([reading])
+                except Exception:
+                    self.dropped += 1
+                    logger.exception("Dropped buffered reading %r", reading)
+        finally:
+            close_old_connections()
+
+    def _store(self, batch):
+        created = store_readings(batch)
+        stored = sum(1 for reading in created if reading is not None)
+        self.stored += stored
+        self.duplicates += len(batch) - stored
+
+    def stop(self, timeout=10):
+        """Stops the flusher after it has written every buffered reading."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {
+            'buffered': self._queue.qsize(),
+            'max_size': self._queue.maxsize,
+            'stored': self.stored,
+            'duplicates': self.duplicates,
+            'dropped': self.dropped,
+            'rejected': self.rejected,
+        }
+
+
+write_buffer = WriteBuffer(
+    max_size=getattr(settings, 'INGEST_BUFFER_SIZE', 10000),
+    batch_size=getattr(settings, 'INGEST_BATCH_SIZE', 500),
+    flush_interval=getattr(settings, 'INGEST_FLUSH_INTERVAL', 1.0),
+)
+
+# Drain the buffer when the server process exits cleanly.
+atexit.register(write_buffer.stop)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Sensors.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.security.SecurityMiddleware',
@@ -83,6 +85,61 @@ DATABASES = {
     }
 }
 
+# Production SQLite profile, enabled with DJANGO_DB_PROFILE=production.
+# WAL lets readers run alongside a writer, synchronous=NORMAL is durable in WAL
+# mode except on power loss, writers wait up to 20 s for the lock instead of
+# failing with "database is locked", and connections are kept between requests.
+SQLITE_PRODUCTION_DATABASE = {
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {'timeout': 20},
+}
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,        # Milliseconds.
+    'mmap_size': 268435456,       # 256 MiB of the file memory-mapped.
+    'cache_size': -65536,         # 64 MiB page cache per connection.
+    'temp_store': 'MEMORY',
+}
+
+# PRAGMA statements run on every new SQLite connection (see Sensors/signals.py).
+SQLITE_PRAGMAS = {}
+
+if os.environ.get('DJANGO_DB_PROFILE') == 'production':
+    DATABASES['default'].update(SQLITE_PRODUCTION_DATABASE)
+    SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS
+
+# PostgreSQL, enabled with DJANGO_DB_PROFILE=postgresql. SensorData is then
+# partitioned by month (Sensors/partitions.py). Host, user and password come
+# from the libpq environment variables (PGHOST, PGUSER, PGPASSWORD...); CI
+# runs the tests on both SQLite and PostgreSQL (.github/workflows/tests.yml).
+if os.environ.get('DJANGO_DB_PROFILE') == 'postgresql':
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('PGDATABASE', 'sensors'),
+    }
+
+# Read replica of the aggregation / history endpoints (see Sensors/routers.py).
+#   DJANGO_READ_REPLICA=readonly: a second, read-only connection to db.sqlite3.
+#     Use it with the production profile: in WAL mode long reads never block ingest.
+#   DJANGO_READ_REPLICA=/path/to/replica.sqlite3: a snapshot of the primary,
+#     refreshed with `manage.py snapshot_replica --every 60`. Cached responses
+#     and closed chart buckets are keyed by the snapshot; the open bucket is
+#     read from the primary.
+DATABASE_ROUTERS = ['Sensors.routers.ReadReplicaRouter']
+SENSOR_READ_DATABASE = 'default'
+
+READ_REPLICA = os.environ.get('DJANGO_READ_REPLICA')
+if READ_REPLICA:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f"file:{DATABASES['default']['NAME']}?mode=ro" if READ_REPLICA == 'readonly' else READ_REPLICA,
+        'CONN_MAX_AGE': DATABASES['default'].get('CONN_MAX_AGE', 0),
+        'TEST': {'MIRROR': 'default'},
+    }
+    SENSOR_READ_DATABASE = 'replica'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -125,4 +182,52 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True
+
+# Sensors: process-local MAC -> Device registry used on the ingest path.
+DEVICE_CACHE_SIZE = 1024  # Maximum number of cached devices (LRU eviction).
+DEVICE_CACHE_TTL = 300    # Seconds before a cached device is re-read from the database.
+
+# Sensors: maximum number of buckets per device returned by ?resolution=auto.
+ROLLUP_MAX_POINTS = 500
+
+# Sensors: response cache of the chart / history endpoints (Django cache framework).
+# Use a shared backend (Redis, Memcached) when running several workers, so that
+# ingest in one process invalidates the responses cached by the others.
+SENSOR_CACHE_TTL = 60             # Seconds a cached response is kept.
+SENSOR_CLOSED_BUCKETS_TTL = 3600  # Seconds closed (finished) buckets are kept.
+
+# Sensors: write-behind buffer of the async ingest endpoint (api/post/data/async).
+INGEST_BUFFER_SIZE = 10000    # Queued readings before requests get a 429.
+INGEST_BATCH_SIZE = 500       # Readings per bulk insert.
+INGEST_FLUSH_INTERVAL = 1.0   # Seconds before a partial batch is written.
+SENSOR_MAX_CLOCK_SKEW = 300   # Seconds a device timestamp may be ahead of the server clock.
+
+# Sensors: retention policy applied by `manage.py prune_sensor_data`, in days per
+# storage tier ('raw' readings and the rollup resolutions); None keeps forever.
+# Raw readings are folded into the longer-lived rollups before being deleted.
+SENSOR_RETENTION_DAYS = {
+    'raw': 7,
+    '1m': 30,
+    '10m': 90,
+    '1h': None,
+    '1d': None,
+}
+# On PostgreSQL, SensorData is partitioned by month (Sensors/partitions.py): run
+# `manage.py sensor_partitions` monthly so partitions exist ahead of the data.
+
+# Sensors: columnar archive of closed days (Sensors/archive.py, needs NumPy).
+# Run `manage.py archive_sensor_data` daily, before prune_sensor_data, to move
+# raw readings there instead of deleting them. Unset disables the archive.
+SENSOR_ARCHIVE_DIR = os.environ.get('SENSOR_ARCHIVE_DIR')
+
+# Sensors: alert rules evaluated on ingest (Sensors/alerts.py). 'missing' rules
+# are checked by `manage.py check_alerts --every 60`.
+SENSOR_ALERT_EWMA_ALPHA = 0.1   # Weight of a new reading in the moving average / variance.
+SENSOR_ALERT_WARMUP = 30        # Readings of a series before anomaly rules apply.
+SENSOR_ALERT_RULES_TTL = 60     # Seconds a worker caches the rules (edits in-process apply at once).
+SENSOR_ALERT_RATE_INTERVAL = 1  # Minimum seconds between the two readings a rate is computed from.
+
+# Sensors: per-request metrics (Sensors.middleware.PerformanceMiddleware, exposed on api/metrics).
+SENSOR_SLOW_REQUEST_SECONDS = 0.5      # Requests slower than this are logged with their SQL...
+SENSOR_SLOW_REQUEST_SAMPLE_RATE = 1.0  # ...with this probability.